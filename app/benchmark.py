@@ -0,0 +1,250 @@
+"""
+Benchmark module measuring the latency of the generation pipeline.
+This module runs process_input -> generate_music -> save_output on synthetic
+audio, plus batched generation through the GenerationService, and writes a
+JSON report that can be diffed between releases.
+
+Usage:
+    python -m app.benchmark --model debug --durations 1 5 --batch-sizes 1 4 --output report.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import torch
+
+from .input_processing import process_input
+from .model_registry import ModelKey, get_model_registry
+from .music_generation import generate_music
+from .output_handling import AudioOutputHandler
+from .service import GenerationService
+
+REPORT_VERSION = 1
+
+
+def _current_rss() -> Optional[int]:
+    """Resident set size of this process in bytes, None where /proc is not available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StageTimer:
+    """
+    Records wall time, CPU time and peak RSS of named pipeline stages.
+    RSS is sampled from a background thread while a stage runs. Peak RSS is
+    None on systems without /proc, where the current RSS cannot be read.
+    """
+
+    def __init__(self, sample_interval: float = 0.005):
+        """
+        Initialize the timer.
+
+        Args:
+            sample_interval (float): Seconds between two RSS samples
+        """
+        self.sample_interval = sample_interval
+        self.stages: Dict[str, Dict[str, Optional[float]]] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Measure the enclosed block as stage `name`.
+        """
+        rss = _current_rss()
+        peak = [rss]
+        done = threading.Event()
+
+        def _sample():
+            while not done.wait(self.sample_interval):
+                peak[0] = max(peak[0], _current_rss() or 0)
+
+        sampler = threading.Thread(target=_sample, daemon=True)
+        if rss is not None:
+            sampler.start()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            if rss is not None:
+                done.set()
+                sampler.join()
+                peak[0] = max(peak[0], _current_rss() or 0)
+            self.stages[name] = {
+                'wall_s': round(wall, 6),
+                'cpu_s': round(cpu, 6),
+                'peak_rss_mb': None if rss is None else round(peak[0] / 2 ** 20, 2),
+            }
+
+
+def synthetic_take(duration: float, sample_rate: int = 44100, seed: int = 0) -> Dict[str, np.ndarray]:
+    """
+    Create synthetic drum and guitar takes.
+
+    Args:
+        duration (float): Take duration in seconds
+        sample_rate (int): Audio sample rate
+        seed (int): Random seed of the drum noise
+
+    Returns:
+        Dict[str, np.ndarray]: 'drums' (120 BPM kick/hi-hat pattern) and 'guitar' (plucked A3) audio
+    """
+    rng = np.random.RandomState(seed)
+    n = int(duration * sample_rate)
+    t = np.arange(n) / sample_rate
+    drums = np.zeros(n, dtype=np.float32)
+    hit = np.arange(int(0.1 * sample_rate)) / sample_rate
+    kick = np.sin(2 * np.pi * 60 * hit) * np.exp(-hit * 30)
+    hihat = np.diff(rng.randn(len(hit) + 3), n=3) / 4 * np.exp(-hit * 60)
+    for i, start in enumerate(np.arange(0, duration, 0.25)):
+        s = int(start * sample_rate)
+        sound = (kick if i % 2 == 0 else hihat)[:n - s]
+        drums[s:s + len(sound)] += sound
+    guitar = (0.3 * np.sin(2 * np.pi * 220 * t) * np.exp(-(t % 1.0) * 3)).astype(np.float32)
+    return {'drums': drums, 'guitar': guitar}
+
+
+def benchmark_pipeline(model: str, duration: float, output_dir: str) -> Dict:
+    """
+    Time one request through process_input, generate_music and save_output.
+    """
+    timer = StageTimer()
+    take = synthetic_take(duration)
+    with timer.stage('process_input'):
+        processed = process_input(drum_input=take['drums'], guitar_input=take['guitar'])
+    with timer.stage('generate_music'):
+        mix = generate_music(
+            processed, model_size=model, duration=duration, seed=0,
+            use_cache=False, audio_model_name=model
+        )
+    with timer.stage('save_output'):
+        AudioOutputHandler(output_dir).save_wav(mix, 'benchmark.wav')
+
+    with get_model_registry().lease(ModelKey('musicgen', model, _device())) as music_model:
+        steps = int(duration * music_model.frame_rate)
+    return {
+        'duration': duration,
+        'stages': timer.stages,
+        'total_wall_s': round(sum(stage['wall_s'] for stage in timer.stages.values()), 6),
+        'tokens_per_sec': round(steps / timer.stages['generate_music']['wall_s'], 2),
+    }
+
+
+def benchmark_batched(model: str, duration: float, batch_size: int) -> Dict:
+    """
+    Time a micro-batch of identical jobs through the generation service.
+    """
+    timer = StageTimer()
+    with GenerationService(
+        model, max_queue_size=batch_size, max_batch_size=batch_size, max_duration=duration
+    ) as service:
+        jobs = [service.submit(f"benchmark prompt {i}", duration=duration) for i in range(batch_size)]
+        with timer.stage('generate'):
+            while any(job.status in ('queued', 'running') for job in jobs):
+                time.sleep(0.001)
+        failed = [job.error for job in jobs if job.status != 'done']
+        if failed:
+            raise RuntimeError(f"Benchmark generation failed: {failed[0]}")
+        steps = int(duration * service._model.frame_rate)
+    return {
+        'duration': duration,
+        'batch_size': batch_size,
+        'stages': timer.stages,
+        'tokens_per_sec': round(batch_size * steps / timer.stages['generate']['wall_s'], 2),
+    }
+
+
+def _device() -> str:
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(
+    model: str = 'debug',
+    durations: List[float] = (1.0, 5.0),
+    batch_sizes: List[int] = (1, 4),
+    repeats: int = 1
+) -> Dict:
+    """
+    Run the pipeline and batched generation benchmarks.
+
+    Args:
+        model (str): MusicGen model, also used for AudioGen ('debug' for both by default)
+        durations (List[float]): Generated durations in seconds
+        batch_sizes (List[int]): Batch sizes of the batched generation benchmark
+        repeats (int): Measurements per configuration, the fastest one is reported
+
+    Returns:
+        Dict: Benchmark report
+    """
+    report = {
+        'version': REPORT_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'model': model,
+            'device': _device(),
+            'torch': torch.__version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'git_revision': _git_revision(),
+        },
+        'pipeline': [],
+        'batched_generation': [],
+    }
+    with tempfile.TemporaryDirectory() as output_dir:
+        # Load models once so that load time is not attributed to the first stage
+        benchmark_pipeline(model, min(durations), output_dir)
+        for duration in durations:
+            runs = [benchmark_pipeline(model, duration, output_dir) for _ in range(repeats)]
+            report['pipeline'].append(min(runs, key=lambda run: run['total_wall_s']))
+    for duration in durations:
+        for batch_size in batch_sizes:
+            runs = [benchmark_batched(model, duration, batch_size) for _ in range(repeats)]
+            report['batched_generation'].append(min(runs, key=lambda run: run['stages']['generate']['wall_s']))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the AutoMusic generation pipeline.")
+    parser.add_argument("--model", default="debug", help="MusicGen/AudioGen model to benchmark.")
+    parser.add_argument("--durations", type=float, nargs="+", default=[1.0, 5.0], help="Durations in seconds.")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4], help="Batch sizes to measure.")
+    parser.add_argument("--repeats", type=int, default=1, help="Runs per configuration, the fastest is kept.")
+    parser.add_argument("--output", default="benchmark_report.json", help="Path of the JSON report.")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.model, args.durations, args.batch_sizes, args.repeats)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    for run in report['pipeline']:
+        stages = ', '.join(f"{name} {stage['wall_s']:.3f}s" for name, stage in run['stages'].items())
+        print(f"{run['duration']:>6.1f}s pipeline: {stages} ({run['tokens_per_sec']:.1f} tokens/s)")
+    for run in report['batched_generation']:
+        print(f"{run['duration']:>6.1f}s batch {run['batch_size']:>3d}: {run['tokens_per_sec']:.1f} tokens/s")
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,312 @@ This module provides functionality to process and normalize audio inputs
 from different instruments including electronic drums and guitar.
 """
 
+import asyncio
+import threading
+import time
 import numpy as np
-from typing import Dict, Optional, Tuple, Union
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, Optional, Tuple, Union
 import librosa
-import sounddevice as sd
+from .live_analysis import IncrementalGuitarAnalyzer, IncrementalOnsetAnalyzer
+
+
+class RingBuffer:
+    """
+    Preallocated single-producer/single-consumer ring buffer of audio chunks.
+    The producer (an audio callback) and the consumer only ever advance their
+    own counter, so no lock is needed on the data path. When the consumer
+    falls behind by a full buffer, incoming chunks are dropped and counted
+    as overruns instead of overwriting unread audio.
+    """
+    
+    def __init__(self, chunk_size: int, capacity: int = 64):
+        """
+        Initialize the ring buffer.
+        
+        Args:
+            chunk_size (int): Maximum number of samples per chunk
+            capacity (int): Number of chunks the buffer can hold
+        """
+        self.chunk_size = chunk_size
+        self.capacity = capacity
+        self._data = np.zeros((capacity, chunk_size), dtype=np.float32)
+        self._lengths = np.zeros(capacity, dtype=np.int64)
+        self._written = 0
+        self._read = 0
+        self.overruns = 0
+    
+    def write(self, block: np.ndarray):
+        """
+        Write a block of samples, splitting it into chunks if needed.
+        
+        Args:
+            block (np.ndarray): Mono audio samples
+        """
+        for start in range(0, len(block), self.chunk_size):
+            piece = block[start:start + self.chunk_size]
+            if self._written - self._read >= self.capacity:
+                self.overruns += 1
+                continue
+            slot = self._written % self.capacity
+            self._data[slot, :len(piece)] = piece
+            self._lengths[slot] = len(piece)
+            # Publish the chunk only once its data is in place
+            self._written += 1
+    
+    def read(self) -> Optional[np.ndarray]:
+        """
+        Read the oldest unread chunk.
+        
+        Returns:
+            Optional[np.ndarray]: Copy of the chunk, or None if the buffer is empty
+        """
+        if self._read == self._written:
+            return None
+        slot = self._read % self.capacity
+        chunk = self._data[slot, :self._lengths[slot]].copy()
+        self._read += 1
+        return chunk
+    
+    def __len__(self) -> int:
+        return self._written - self._read
+
+
+class SoundDeviceSource:
+    """
+    Audio source capturing from the default sound card input.
+    """
+    
+    def __init__(self, sample_rate: int, chunk_size: int, channels: int = 1):
+        """
+        Initialize the sound card source.
+        
+        Args:
+            sample_rate (int): Audio sampling rate in Hz
+            chunk_size (int): Number of frames delivered per callback
+            channels (int): Number of input channels, mixed down to mono
+        """
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+        self.channels = channels
+        self._stream = None
+    
+    def start(self, callback: Callable[[np.ndarray], None], on_end: Optional[Callable[[], None]] = None):
+        """
+        Start delivering audio blocks to `callback`. A sound card never ends on its own.
+        """
+        import sounddevice as sd
+        
+        def _callback(indata, frames, time_info, status):
+            callback(indata.mean(axis=1) if self.channels > 1 else indata[:, 0])
+        
+        self._stream = sd.InputStream(
+            samplerate=self.sample_rate,
+            blocksize=self.chunk_size,
+            channels=self.channels,
+            dtype='float32',
+            callback=_callback
+        )
+        self._stream.start()
+    
+    def stop(self):
+        """
+        Stop capturing audio.
+        """
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+
+class IterableSource:
+    """
+    Audio source replaying blocks from an iterable, e.g. a file or a synthetic generator.
+    Blocks are delivered from a background thread, just like a sound card callback.
+    """
+    
+    def __init__(self, blocks: Iterable[np.ndarray], sample_rate: Optional[int] = None, realtime: bool = False):
+        """
+        Initialize the iterable source.
+        
+        Args:
+            blocks (Iterable[np.ndarray]): Mono audio blocks to deliver
+            sample_rate (Optional[int]): Sampling rate, required when `realtime` is set
+            realtime (bool): Pace delivery to the duration of each block
+        """
+        if realtime and sample_rate is None:
+            raise ValueError("sample_rate is required for realtime delivery")
+        self.blocks = blocks
+        self.sample_rate = sample_rate
+        self.realtime = realtime
+        self._thread = None
+        self._stopped = threading.Event()
+    
+    @classmethod
+    def from_array(cls, audio: np.ndarray, chunk_size: int, **kwargs) -> 'IterableSource':
+        """
+        Create a source delivering an array in `chunk_size` blocks.
+        """
+        blocks = (audio[start:start + chunk_size] for start in range(0, len(audio), chunk_size))
+        return cls(blocks, **kwargs)
+    
+    @classmethod
+    def from_file(cls, path: str, sample_rate: int, chunk_size: int, **kwargs) -> 'IterableSource':
+        """
+        Create a source delivering the content of an audio file.
+        """
+        audio, _ = librosa.load(path, sr=sample_rate, mono=True)
+        return cls.from_array(audio, chunk_size, sample_rate=sample_rate, **kwargs)
+    
+    def start(self, callback: Callable[[np.ndarray], None], on_end: Optional[Callable[[], None]] = None):
+        """
+        Start delivering audio blocks to `callback`, calling `on_end` once exhausted.
+        """
+        def _run():
+            for block in self.blocks:
+                if self._stopped.is_set():
+                    break
+                callback(np.asarray(block, dtype=np.float32))
+                if self.realtime:
+                    time.sleep(len(block) / self.sample_rate)
+            if on_end is not None:
+                on_end()
+        
+        self._thread = threading.Thread(target=_run, daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """
+        Stop delivering audio.
+        """
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+
+class AudioStream:
+    """
+    Streaming capture session.
+    The source callback writes into a RingBuffer and consumers iterate over
+    chunks as they arrive, so processing can start before the take finishes.
+    """
+    
+    def __init__(
+        self,
+        source,
+        sample_rate: int,
+        chunk_size: int,
+        duration: Optional[float] = None,
+        buffer_chunks: int = 64,
+        poll_interval: float = 0.005
+    ):
+        """
+        Initialize the capture session.
+        
+        Args:
+            source: Audio source exposing `start(callback, on_end)` and `stop()`
+            sample_rate (int): Audio sampling rate in Hz
+            chunk_size (int): Number of samples per chunk
+            duration (Optional[float]): Stop after this many seconds, None to capture until stopped
+            buffer_chunks (int): Capacity of the ring buffer in chunks
+            poll_interval (float): Seconds to wait between checks for new chunks
+        """
+        self.source = source
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+        self.max_frames = None if duration is None else int(sample_rate * duration)
+        self.buffer = RingBuffer(chunk_size, buffer_chunks)
+        self.poll_interval = poll_interval
+        self.frames_captured = 0
+        self._finished = threading.Event()
+        self._data_ready = threading.Event()
+    
+    @property
+    def finished(self) -> bool:
+        """Whether the capture has ended."""
+        return self._finished.is_set()
+    
+    def _on_block(self, block: np.ndarray):
+        if self._finished.is_set():
+            return
+        if self.max_frames is not None:
+            block = block[:self.max_frames - self.frames_captured]
+        self.buffer.write(block)
+        self.frames_captured += len(block)
+        self._data_ready.set()
+        if self.max_frames is not None and self.frames_captured >= self.max_frames:
+            self._finish()
+    
+    def _finish(self):
+        self._finished.set()
+        self._data_ready.set()
+    
+    def start(self) -> 'AudioStream':
+        """
+        Start capturing audio.
+        """
+        self.source.start(self._on_block, on_end=self._finish)
+        return self
+    
+    def stop(self):
+        """
+        Stop capturing audio. Chunks already captured can still be read.
+        """
+        self._finish()
+        self.source.stop()
+    
+    def __enter__(self) -> 'AudioStream':
+        return self.start()
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+    
+    def __iter__(self) -> Iterator[np.ndarray]:
+        """
+        Iterate over captured chunks, blocking until new audio arrives.
+        """
+        while True:
+            self._data_ready.clear()
+            chunk = self.buffer.read()
+            if chunk is not None:
+                yield chunk
+            elif self.finished:
+                # Drain anything written just before the capture ended
+                chunk = self.buffer.read()
+                if chunk is None:
+                    return
+                yield chunk
+            else:
+                self._data_ready.wait(self.poll_interval)
+    
+    async def __aiter__(self) -> AsyncIterator[np.ndarray]:
+        """
+        Asynchronously iterate over captured chunks.
+        """
+        while True:
+            chunk = self.buffer.read()
+            if chunk is not None:
+                yield chunk
+            elif self.finished:
+                chunk = self.buffer.read()
+                if chunk is None:
+                    return
+                yield chunk
+            else:
+                await asyncio.sleep(self.poll_interval)
+
+
+# Drum components recognised by AudioInputProcessor.process_drums
+DRUM_COMPONENTS = ['kick', 'snare', 'hihat']
+
+# Spectrogram and band-energy settings of the drum classifier
+DRUM_N_FFT = 2048
+DRUM_HOP_LENGTH = 512
+DRUM_HIT_FRAMES = 4  # Frames analysed after each onset (~46 ms at 44.1 kHz)
+DRUM_LOW_CUTOFF = 150.0  # Hz, upper edge of the kick band
+DRUM_HIGH_CUTOFF = 5000.0  # Hz, lower edge of the hi-hat band
+DRUM_KICK_LOW_RATIO = 0.5  # Share of energy below DRUM_LOW_CUTOFF for a kick
+DRUM_HIHAT_HIGH_RATIO = 0.7  # Share of energy above DRUM_HIGH_CUTOFF for a hi-hat
+
 
 class AudioInputProcessor:
     """
@@ -37,41 +339,132 @@ class AudioInputProcessor:
         Returns:
             np.ndarray: Recorded audio data
         """
+        import sounddevice as sd
+        
         frames = int(self.sample_rate * duration)
         audio_data = sd.rec(frames, samplerate=self.sample_rate, channels=1)
         sd.wait()
         return audio_data.flatten()
     
+    def stream_recording(
+        self,
+        duration: Optional[float] = None,
+        source=None,
+        buffer_chunks: int = 64
+    ) -> AudioStream:
+        """
+        Create a streaming capture session delivering `chunk_size` blocks.
+        
+        Args:
+            duration (Optional[float]): Recording duration in seconds, None to record until stopped
+            source: Audio source, defaults to the sound card input
+            buffer_chunks (int): Number of chunks buffered before overruns occur
+            
+        Returns:
+            AudioStream: Capture session, to be started or used as a context manager
+        """
+        if source is None:
+            source = SoundDeviceSource(self.sample_rate, self.chunk_size)
+        return AudioStream(source, self.sample_rate, self.chunk_size, duration, buffer_chunks)
+    
+    def create_live_analyzer(self, **kwargs) -> IncrementalOnsetAnalyzer:
+        """
+        Create an incremental onset and tempo analyzer for streamed input.
+        Feed it the chunks of `stream_recording` to get onsets while playing.
+        
+        Args:
+            **kwargs: Extra IncrementalOnsetAnalyzer parameters
+            
+        Returns:
+            IncrementalOnsetAnalyzer: Analyzer matching this processor's sample rate
+        """
+        return IncrementalOnsetAnalyzer(sample_rate=self.sample_rate, **kwargs)
+    
+    def create_live_guitar_analyzer(self, **kwargs) -> IncrementalGuitarAnalyzer:
+        """
+        Create an incremental onset, tempo and pitch analyzer for streamed guitar input.
+        The streaming counterpart of `process_guitar`.
+        
+        Args:
+            **kwargs: Extra IncrementalGuitarAnalyzer parameters
+            
+        Returns:
+            IncrementalGuitarAnalyzer: Analyzer matching this processor's sample rate
+        """
+        return IncrementalGuitarAnalyzer(sample_rate=self.sample_rate, **kwargs)
+    
     def process_drums(self, audio_data: np.ndarray) -> Dict[str, np.ndarray]:
         """
         Process electronic drum input.
         Detects and classifies different drum components (kick, snare, hi-hat, etc.).
+        A single spectrogram is shared by onset detection and classification.
         
         Args:
             audio_data (np.ndarray): Raw audio data from drums
             
         Returns:
-            Dict[str, np.ndarray]: Processed drum patterns for each component
+            Dict[str, np.ndarray]: Onset times in seconds for each component
         """
+        # Power spectrogram of the whole take
+        power = np.abs(librosa.stft(audio_data, n_fft=DRUM_N_FFT, hop_length=DRUM_HOP_LENGTH)) ** 2
+        
         # Extract onset envelope
-        onset_env = librosa.onset.onset_strength(y=audio_data, sr=self.sample_rate)
+        mel = librosa.feature.melspectrogram(S=power, sr=self.sample_rate)
+        onset_env = librosa.onset.onset_strength(S=librosa.power_to_db(mel, ref=np.max), sr=self.sample_rate)
         
         # Detect onset times
         onset_frames = librosa.onset.onset_detect(
             onset_envelope=onset_env,
-            sr=self.sample_rate
+            sr=self.sample_rate,
+            hop_length=DRUM_HOP_LENGTH
         )
         
-        # Classify drum components (basic implementation)
-        # TODO: Implement more sophisticated drum classification
+        # Classify drum components
+        labels = self.classify_drum_hits(power, onset_frames)
+        onset_times = librosa.frames_to_time(onset_frames, sr=self.sample_rate, hop_length=DRUM_HOP_LENGTH)
         components = {
-            'kick': [],
-            'snare': [],
-            'hihat': []
+            component: onset_times[labels == index]
+            for index, component in enumerate(DRUM_COMPONENTS)
         }
         
         return components
     
+    def classify_drum_hits(self, power: np.ndarray, onset_frames: np.ndarray) -> np.ndarray:
+        """
+        Classify every drum hit at once from its band energies.
+        Energy is summed per band for the whole take, then gathered for all
+        onsets with a single indexing operation.
+        
+        Args:
+            power (np.ndarray): Power spectrogram of the take, shape [bins, frames]
+            onset_frames (np.ndarray): Frame index of each onset
+            
+        Returns:
+            np.ndarray: Index into DRUM_COMPONENTS for each onset
+        """
+        onset_frames = np.asarray(onset_frames, dtype=np.int64)
+        if len(onset_frames) == 0:
+            return np.zeros(0, dtype=np.int64)
+        
+        # Energy of the low, mid and high bands for every frame: [3, frames]
+        freqs = librosa.fft_frequencies(sr=self.sample_rate, n_fft=2 * (power.shape[0] - 1))
+        edges = [0.0, DRUM_LOW_CUTOFF, DRUM_HIGH_CUTOFF, np.inf]
+        bands = np.stack([(freqs >= lo) & (freqs < hi) for lo, hi in zip(edges[:-1], edges[1:])])
+        band_energy = bands.astype(power.dtype) @ power
+        
+        # Sum the frames following each onset: [3, onsets]
+        window = np.arange(DRUM_HIT_FRAMES)
+        frames = np.clip(onset_frames[:, None] + window, 0, power.shape[1] - 1)
+        hit_energy = band_energy[:, frames].sum(axis=-1)
+        fractions = hit_energy / np.maximum(hit_energy.sum(axis=0), 1e-12)
+        low, high = fractions[0], fractions[2]
+        
+        return np.select(
+            [low >= DRUM_KICK_LOW_RATIO, high >= DRUM_HIHAT_HIGH_RATIO],
+            [DRUM_COMPONENTS.index('kick'), DRUM_COMPONENTS.index('hihat')],
+            default=DRUM_COMPONENTS.index('snare')
+        )
+    
     def process_guitar(self, audio_data: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
         """
         Process guitar input.
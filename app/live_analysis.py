@@ -0,0 +1,258 @@
+"""
+Live analysis module for incremental onset, tempo and pitch tracking.
+This module analyses audio chunk by chunk as it is captured, keeping just
+enough spectral and onset-envelope state to process new frames only.
+"""
+
+import numpy as np
+from collections import deque
+from typing import Deque, List
+import librosa
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class IncrementalOnsetAnalyzer:
+    """
+    Incremental onset detector and tempo estimator.
+    Mirrors librosa's mel spectral-flux onset strength and peak picking, but
+    only computes STFT frames for newly received samples. Memory use is bounded
+    by the tempo analysis window and the number of recent onsets kept, whatever
+    the session length.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 44100,
+        n_fft: int = 2048,
+        hop_length: int = 512,
+        n_mels: int = 128,
+        top_db: float = 80.0,
+        delta: float = 0.07,
+        wait: float = 0.03,
+        pre_max: float = 0.03,
+        pre_avg: float = 0.1,
+        tempo_window: float = 8.0,
+        tempo_interval: float = 1.0,
+        start_bpm: float = 120.0,
+        min_bpm: float = 30.0,
+        max_bpm: float = 300.0,
+        max_onsets: int = 1024
+    ):
+        """
+        Initialize the analyzer.
+
+        Args:
+            sample_rate (int): Audio sampling rate in Hz
+            n_fft (int): STFT window size
+            hop_length (int): Number of samples between frames
+            n_mels (int): Number of mel bands of the onset strength
+            top_db (float): Dynamic range kept below the loudest mel bin seen so far
+            delta (float): Peak threshold relative to the strongest onset seen so far
+            wait (float): Minimum seconds between two onsets
+            pre_max (float): Seconds before a peak it must dominate
+            pre_avg (float): Seconds before a peak used for the local average
+            tempo_window (float): Seconds of onset envelope used to estimate tempo
+            tempo_interval (float): Seconds between two tempo updates
+            start_bpm (float): Prior tempo in beats per minute
+            min_bpm (float): Lowest tempo considered
+            max_bpm (float): Highest tempo considered
+            max_onsets (int): Number of recent onset times kept in `onset_times`
+        """
+        self.sample_rate = sample_rate
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.frame_rate = sample_rate / hop_length
+        self.top_db = top_db
+        self.delta = delta
+        self.wait = max(1, int(round(wait * self.frame_rate)))
+        self.pre_max = max(1, int(round(pre_max * self.frame_rate)))
+        self.pre_avg = max(1, int(round(pre_avg * self.frame_rate)))
+        self.tempo_interval = max(1, int(round(tempo_interval * self.frame_rate)))
+        self.start_bpm = start_bpm
+        self.min_lag = max(1, int(np.floor(60.0 * self.frame_rate / max_bpm)))
+        self.max_lag = int(np.ceil(60.0 * self.frame_rate / min_bpm))
+        self.max_onsets = max_onsets
+
+        self._window = librosa.filters.get_window('hann', n_fft, fftbins=True).astype(np.float32)
+        self._mel_basis = librosa.filters.mel(sr=sample_rate, n_fft=n_fft, n_mels=n_mels)
+        # Envelope history, sized for both peak picking and tempo estimation
+        history = max(int(tempo_window * self.frame_rate), self.pre_avg + 2, self.max_lag + 1)
+        self._envelope = np.zeros(history, dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        """
+        Clear all state to start a new take.
+        """
+        # Pad the start like a centered STFT so frame t is centered on t * hop_length
+        self._pending = np.zeros(self.n_fft // 2, dtype=np.float32)
+        self._previous_db = None
+        self._max_db = -np.inf
+        self._envelope[:] = 0
+        self._envelope_max = 0.0
+        self._next_candidate = 0
+        self._last_onset = -self.wait - 1
+        self._last_tempo_update = 0
+        self.n_frames = 0
+        self.onset_times: Deque[float] = deque(maxlen=self.max_onsets)
+        self.tempo = 0.0
+
+    def process(self, chunk: np.ndarray) -> List[float]:
+        """
+        Analyse a new chunk of audio.
+
+        Args:
+            chunk (np.ndarray): Mono audio samples following the previous chunk
+
+        Returns:
+            List[float]: Times in seconds of onsets confirmed by this chunk
+        """
+        samples = np.concatenate([self._pending, np.asarray(chunk, dtype=np.float32)])
+        n_new = 0
+        if len(samples) >= self.n_fft:
+            n_new = 1 + (len(samples) - self.n_fft) // self.hop_length
+        # Frames are pushed in blocks the envelope history holds until their peaks are picked
+        block = len(self._envelope) - self.pre_avg - 2
+        onsets = []
+        for first in range(0, n_new, block):
+            count = min(block, n_new - first)
+            start = first * self.hop_length
+            self._push_frames(samples[start:start + (count - 1) * self.hop_length + self.n_fft], count)
+            onsets.extend(self._pick_peaks())
+        self._pending = samples[n_new * self.hop_length:]
+
+        if self.n_frames - self._last_tempo_update >= self.tempo_interval:
+            self._update_tempo()
+        return onsets
+
+    def _push_frames(self, samples: np.ndarray, n_new: int):
+        """Compute the onset strength of `n_new` frames and append it to the envelope."""
+        frames = sliding_window_view(samples, self.n_fft)[::self.hop_length]
+        magnitude = np.abs(np.fft.rfft(frames * self._window, axis=1))
+        self._analyse_spectrum(magnitude)
+        spectrum = magnitude ** 2
+        mel_db = 10.0 * np.log10(np.maximum(spectrum @ self._mel_basis.T, 1e-10))
+        # Running equivalent of power_to_db(ref=np.max, top_db=top_db), up to a constant offset
+        running_max = np.maximum.accumulate(np.maximum(mel_db.max(axis=1), self._max_db))
+        self._max_db = float(running_max[-1])
+        mel_db = np.maximum(mel_db, running_max[:, None] - self.top_db)
+        if self._previous_db is None:
+            self._previous_db = mel_db[:1]
+        flux = np.maximum(0.0, np.diff(np.concatenate([self._previous_db, mel_db]), axis=0))
+        strength = flux.mean(axis=1)
+        self._previous_db = mel_db[-1:]
+
+        positions = np.arange(self.n_frames, self.n_frames + n_new) % len(self._envelope)
+        self._envelope[positions] = strength
+        self._envelope_max = max(self._envelope_max, float(strength.max()))
+        self.n_frames += n_new
+
+    def _analyse_spectrum(self, magnitude: np.ndarray):
+        """Hook for subclasses analysing the [frames, bins] magnitude spectrum of new frames."""
+
+    def _recent(self, start: int, stop: int) -> np.ndarray:
+        """Envelope values of frames [start, stop)."""
+        start = max(start, self.n_frames - len(self._envelope), 0)
+        return self._envelope[np.arange(start, stop) % len(self._envelope)]
+
+    def _pick_peaks(self) -> List[float]:
+        """Confirm onsets for frames that have one frame of look-ahead."""
+        onsets = []
+        for frame in range(self._next_candidate, self.n_frames - 1):
+            value = self._envelope[frame % len(self._envelope)]
+            if value <= 0 or frame - self._last_onset <= self.wait:
+                continue
+            if value < self._recent(frame - self.pre_max, frame + 2).max():
+                continue
+            threshold = self._recent(frame - self.pre_avg, frame + 2).mean()
+            if value >= threshold + self.delta * self._envelope_max:
+                self._last_onset = frame
+                onsets.append(frame / self.frame_rate)
+        self._next_candidate = max(self._next_candidate, self.n_frames - 1)
+        self.onset_times.extend(onsets)
+        return onsets
+
+    def _update_tempo(self):
+        """Estimate the tempo from the autocorrelation of the recent onset envelope."""
+        self._last_tempo_update = self.n_frames
+        envelope = self._recent(0, self.n_frames)
+        if len(envelope) <= 2 * self.min_lag:
+            return
+        envelope = envelope - envelope.mean()
+        spectrum = np.fft.rfft(envelope, 2 * len(envelope))
+        autocorr = np.fft.irfft(np.abs(spectrum) ** 2)[:len(envelope)]
+
+        lags = np.arange(self.min_lag, min(self.max_lag, len(envelope) - 1) + 1)
+        bpms = 60.0 * self.frame_rate / lags
+        # Log-normal prior around start_bpm, as in librosa's tempo estimator
+        prior = np.exp(-0.5 * (np.log2(bpms) - np.log2(self.start_bpm)) ** 2)
+        scores = autocorr[lags] * prior
+        if scores.max() > 0:
+            self.tempo = float(bpms[np.argmax(scores)])
+
+
+class IncrementalGuitarAnalyzer(IncrementalOnsetAnalyzer):
+    """
+    Incremental onset, tempo and pitch tracker for guitar.
+    Applies librosa's piptrack to the STFT frames already computed for the
+    onset strength, so each chunk only adds the pitch of its new frames.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 44100,
+        fmin: float = 150.0,
+        fmax: float = 4000.0,
+        threshold: float = 0.1,
+        **kwargs
+    ):
+        """
+        Initialize the analyzer.
+
+        Args:
+            sample_rate (int): Audio sampling rate in Hz
+            fmin (float): Lowest pitch considered in Hz
+            fmax (float): Highest pitch considered in Hz
+            threshold (float): Peak threshold relative to the loudest bin of each frame
+            **kwargs: Extra IncrementalOnsetAnalyzer parameters
+        """
+        self.fmin = fmin
+        self.fmax = fmax
+        self.threshold = threshold
+        super().__init__(sample_rate=sample_rate, **kwargs)
+
+    def reset(self):
+        """
+        Clear all state to start a new take.
+        """
+        super().reset()
+        self.frame_pitches = np.zeros(0, dtype=np.float32)
+        self.pitch = 0.0
+
+    def process(self, chunk: np.ndarray) -> List[float]:
+        """
+        Analyse a new chunk of audio.
+        The pitch of each frame completed by the chunk is left in `frame_pitches`.
+
+        Args:
+            chunk (np.ndarray): Mono audio samples following the previous chunk
+
+        Returns:
+            List[float]: Times in seconds of onsets confirmed by this chunk
+        """
+        self.frame_pitches = np.zeros(0, dtype=np.float32)
+        return super().process(chunk)
+
+    def _analyse_spectrum(self, magnitude: np.ndarray):
+        """Estimate the strongest pitch of each new frame, 0 where none is found."""
+        pitches, magnitudes = librosa.piptrack(
+            S=magnitude.T, sr=self.sample_rate, n_fft=self.n_fft,
+            fmin=self.fmin, fmax=self.fmax, threshold=self.threshold
+        )
+        strongest = magnitudes.argmax(axis=0)
+        frames = np.arange(magnitude.shape[0])
+        new_pitches = pitches[strongest, frames].astype(np.float32)
+        self.frame_pitches = np.concatenate([self.frame_pitches, new_pitches])
+        voiced = new_pitches[new_pitches > 0]
+        if len(voiced):
+            self.pitch = float(voiced[-1])
@@ -1,8 +1,22 @@
-from input_processing import process_input
-from music_generation import generate_music
-from output_handling import save_output
+import argparse
+
+from .input_processing import process_input
+from .music_generation import generate_music
+from .output_handling import save_output
+from .service import serve
 
 def main():
+    parser = argparse.ArgumentParser(description="Generate music from instrument inputs.")
+    parser.add_argument("--serve", action="store_true", help="Run the generation service instead of a one-shot generation.")
+    parser.add_argument("--model", default="medium", help="MusicGen model to use ('debug' for tests).")
+    parser.add_argument("--host", default="127.0.0.1", help="Service interface to listen on.")
+    parser.add_argument("--port", type=int, default=5000, help="Service port to listen on.")
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.model, args.host, args.port)
+        return
+
     # Example input, replace with actual user input handling
     drum_input = "example_drum_input"
     piano_input = "example_piano_input"
@@ -12,7 +26,7 @@ def main():
     processed_input = process_input(drum_input, piano_input, guitar_input)
 
     # Generate music based on processed inputs
-    generated_music = generate_music(processed_input)
+    generated_music = generate_music(processed_input, model_size=args.model)
 
     # Save or output the generated music
     save_output(generated_music)
@@ -0,0 +1,185 @@
+"""
+Mixing module for combining generated stems.
+This module resamples stems of different sample rates to a common rate and
+mixes them block by block into a preallocated buffer, so long renders only
+need memory for the output and one block of temporaries.
+"""
+
+import math
+from functools import lru_cache
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+from scipy.signal import firwin, resample_poly
+
+
+@lru_cache(maxsize=32)
+def _resample_filter(up: int, down: int) -> np.ndarray:
+    """
+    Low-pass FIR filter used to resample by `up / down`.
+    This is the Kaiser-windowed design of scipy's resample_poly, computed
+    once per rate pair instead of on every call.
+    """
+    max_rate = max(up, down)
+    taps = firwin(2 * 10 * max_rate + 1, 1.0 / max_rate, window=('kaiser', 5.0))
+    taps.setflags(write=False)
+    return taps
+
+
+def _rate_ratio(sample_rate: int, target_rate: int) -> Tuple[int, int]:
+    """Reduced upsampling and downsampling factors between two rates."""
+    g = math.gcd(sample_rate, target_rate)
+    return target_rate // g, sample_rate // g
+
+
+def resample(audio: np.ndarray, sample_rate: int, target_rate: int) -> np.ndarray:
+    """
+    Resample audio along its last axis with a cached polyphase filter.
+
+    Args:
+        audio (np.ndarray): Audio data, time on the last axis
+        sample_rate (int): Sample rate of `audio`
+        target_rate (int): Sample rate to convert to
+
+    Returns:
+        np.ndarray: Resampled audio
+    """
+    up, down = _rate_ratio(sample_rate, target_rate)
+    if up == down:
+        return audio
+    return resample_poly(audio, up, down, axis=-1, window=_resample_filter(up, down))
+
+
+def _as_channels(audio: np.ndarray) -> np.ndarray:
+    """View audio as [channels, frames], dropping leading batch dimensions of size one."""
+    audio = np.asarray(audio)
+    while audio.ndim > 2 and audio.shape[0] == 1:
+        audio = audio[0]
+    if audio.ndim == 1:
+        audio = audio[None]
+    if audio.ndim != 2:
+        raise ValueError(f"Expected audio of shape [frames] or [channels, frames], got {audio.shape}")
+    return audio
+
+
+class _Stem:
+    """A stem scheduled for mixing, resampled lazily one block at a time."""
+
+    def __init__(self, audio: np.ndarray, sample_rate: int, target_rate: int, gain: float):
+        self.audio = _as_channels(audio)
+        self.gain = gain
+        self.up, self.down = _rate_ratio(sample_rate, target_rate)
+        n_in = self.audio.shape[-1]
+        self.length = -(-n_in * self.up // self.down)
+        # Input samples of context needed on each side of a block, a multiple of `down`
+        context = 10 * max(self.up, self.down) // self.up + 2
+        self.context = -(-context // self.down) * self.down
+
+    def render(self, start: int, stop: int) -> np.ndarray:
+        """Resampled frames [start, stop) of the stem, identical to resampling it whole."""
+        if self.up == self.down:
+            return self.audio[:, start:stop].astype(np.float32)
+        # Align the output range on multiples of `up` so it maps to whole input samples
+        aligned_start = start // self.up * self.up
+        aligned_stop = -(-stop // self.up) * self.up
+        in_start = aligned_start // self.up * self.down
+        in_stop = aligned_stop // self.up * self.down
+        lo = max(0, in_start - self.context)
+        hi = min(self.audio.shape[-1], in_stop + self.context)
+        segment = resample_poly(
+            self.audio[:, lo:hi], self.up, self.down, axis=-1,
+            window=_resample_filter(self.up, self.down)
+        )
+        offset = (in_start - lo) // self.down * self.up + (start - aligned_start)
+        return segment[:, offset:offset + stop - start].astype(np.float32)
+
+
+class Mixer:
+    """
+    Block-based mixer of stems with different sample rates and lengths.
+    Stems are resampled to the mixer rate, padded or trimmed to the output
+    length and summed with their gain, one block at a time.
+    """
+
+    def __init__(self, sample_rate: int = 44100, channels: int = 1, block_size: int = 65536):
+        """
+        Initialize the mixer.
+
+        Args:
+            sample_rate (int): Output sample rate
+            channels (int): Output channels; mono stems are spread, multichannel stems downmixed to mono
+            block_size (int): Output frames processed at once
+        """
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block_size = block_size
+        self.stems: List[_Stem] = []
+
+    def add(self, audio: np.ndarray, sample_rate: int, gain: float = 1.0) -> 'Mixer':
+        """
+        Schedule a stem for mixing. The audio is not copied.
+
+        Args:
+            audio (np.ndarray): Stem of shape [frames], [channels, frames] or [1, channels, frames]
+            sample_rate (int): Sample rate of the stem
+            gain (float): Linear gain applied to the stem
+        """
+        self.stems.append(_Stem(audio, sample_rate, self.sample_rate, gain))
+        return self
+
+    @property
+    def length(self) -> int:
+        """Output frames needed to hold the longest stem."""
+        return max((stem.length for stem in self.stems), default=0)
+
+    def blocks(self, length: Optional[int] = None) -> Iterator[np.ndarray]:
+        """
+        Render the mix block by block.
+
+        Args:
+            length (Optional[int]): Output frames, defaults to the longest stem
+
+        Yields:
+            np.ndarray: Mixed block of shape [channels, frames]
+        """
+        length = self.length if length is None else length
+        block = np.zeros((self.channels, self.block_size), dtype=np.float32)
+        for start in range(0, length, self.block_size):
+            stop = min(start + self.block_size, length)
+            out = block[:, :stop - start]
+            out.fill(0.0)
+            self._mix_into(out, start, stop)
+            yield out
+
+    def mix(self, length: Optional[int] = None, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Render the whole mix into a preallocated buffer.
+
+        Args:
+            length (Optional[int]): Output frames, defaults to the longest stem
+            out (Optional[np.ndarray]): Buffer of shape [channels, length] to write into
+
+        Returns:
+            np.ndarray: Mixed audio of shape [channels, frames]
+        """
+        length = self.length if length is None else length
+        if out is None:
+            out = np.zeros((self.channels, length), dtype=np.float32)
+        else:
+            out.fill(0.0)
+        for start in range(0, length, self.block_size):
+            stop = min(start + self.block_size, length)
+            self._mix_into(out[:, start:stop], start, stop)
+        return out
+
+    def _mix_into(self, out: np.ndarray, start: int, stop: int):
+        """Add every stem's frames [start, stop) to `out` in place."""
+        for stem in self.stems:
+            stop_in_stem = min(stop, stem.length)
+            if stop_in_stem <= start:
+                continue
+            frames = stem.render(start, stop_in_stem)
+            if frames.shape[0] != self.channels:
+                frames = frames.mean(axis=0, keepdims=True)
+            frames *= stem.gain
+            out[:, :stop_in_stem - start] += frames
@@ -0,0 +1,242 @@
+"""
+Model registry module for keeping generation models resident in memory.
+This module provides a process-wide cache of pretrained AudioCraft models so
+that repeated generation requests do not pay the model loading cost.
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, Optional
+from contextlib import contextmanager
+
+import torch
+from audiocraft.models import MusicGen, AudioGen
+
+
+# Loaders used to materialise a model of a given kind on a device
+DEFAULT_LOADERS: Dict[str, Callable[[str, str], Any]] = {
+    'musicgen': lambda name, device: MusicGen.get_pretrained(name, device=device),
+    'audiogen': lambda name, device: AudioGen.get_pretrained(name, device=device),
+}
+
+
+@dataclass(frozen=True)
+class ModelKey:
+    """
+    Identifies a resident model.
+
+    Args:
+        kind (str): Model family, one of the registry loader names ('musicgen', 'audiogen')
+        name (str): Pretrained model name passed to the loader
+        device (str): Device the model lives on
+        dtype (Optional[torch.dtype]): Dtype of the language model, None keeps the loaded dtype
+    """
+    kind: str
+    name: str
+    device: str = 'cpu'
+    dtype: Optional[torch.dtype] = None
+
+
+class _Entry:
+    """Bookkeeping for a single resident model."""
+
+    def __init__(self):
+        self.model: Any = None
+        self.nbytes = 0
+        self.refcount = 0
+        self.lock = threading.Lock()
+
+
+def model_nbytes(model: Any) -> int:
+    """
+    Estimate the memory held by a generation model.
+
+    Args:
+        model (Any): Model exposing `lm` and `compression_model` modules
+
+    Returns:
+        int: Number of bytes used by parameters and buffers
+    """
+    total = 0
+    for module_name in ('lm', 'compression_model'):
+        module = getattr(model, module_name, None)
+        if not isinstance(module, torch.nn.Module):
+            continue
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class ModelRegistry:
+    """
+    Thread-safe registry of loaded models.
+    Models are loaded lazily on first acquisition, reference counted while in
+    use, and evicted in least-recently-used order once the memory budget is
+    exceeded. Models that are currently acquired are never evicted.
+    """
+
+    def __init__(
+        self,
+        memory_budget_bytes: Optional[int] = None,
+        loaders: Optional[Dict[str, Callable[[str, str], Any]]] = None
+    ):
+        """
+        Initialize the model registry.
+
+        Args:
+            memory_budget_bytes (Optional[int]): Maximum bytes of resident models, None for no limit
+            loaders (Optional[Dict]): Mapping of model kind to a `loader(name, device)` callable
+        """
+        self.memory_budget_bytes = memory_budget_bytes
+        self.loaders = dict(DEFAULT_LOADERS if loaders is None else loaders)
+        self._entries: 'OrderedDict[ModelKey, _Entry]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: ModelKey) -> Any:
+        """
+        Get a model from the registry, loading it if it is not resident.
+        Every call must be balanced by a call to `release`.
+
+        Args:
+            key (ModelKey): Model to acquire
+
+        Returns:
+            Any: The loaded model
+        """
+        if key.kind not in self.loaders:
+            raise ValueError(f"Unsupported model kind: {key.kind}")
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _Entry()
+                self._entries[key] = entry
+            entry.refcount += 1
+            self._entries.move_to_end(key)
+
+        # Load outside of the registry lock so other models stay available
+        try:
+            with entry.lock:
+                if entry.model is None:
+                    # Loading must not disturb the RNG state of seeded generations
+                    devices = [torch.device(key.device)] if key.device.startswith('cuda') else []
+                    with torch.random.fork_rng(devices=devices):
+                        model = self.loaders[key.kind](key.name, key.device)
+                    if key.dtype is not None:
+                        model.lm.to(key.dtype)
+                    entry.model = model
+                    entry.nbytes = model_nbytes(model)
+        except Exception:
+            with self._lock:
+                entry.refcount -= 1
+                if entry.refcount == 0 and entry.model is None:
+                    self._entries.pop(key, None)
+            raise
+
+        with self._lock:
+            self._evict()
+        return entry.model
+
+    def release(self, key: ModelKey):
+        """
+        Release a model previously obtained with `acquire`.
+
+        Args:
+            key (ModelKey): Model to release
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.refcount == 0:
+                raise KeyError(f"Model {key} is not acquired")
+            entry.refcount -= 1
+            self._evict()
+
+    @contextmanager
+    def lease(self, key: ModelKey) -> Iterator[Any]:
+        """
+        Context manager acquiring a model for the duration of a block.
+
+        Args:
+            key (ModelKey): Model to acquire
+        """
+        model = self.acquire(key)
+        try:
+            yield model
+        finally:
+            self.release(key)
+
+    def clear(self):
+        """
+        Drop every model that is not currently acquired.
+        """
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if e.refcount == 0]:
+                self._drop(key)
+
+    @property
+    def resident_bytes(self) -> int:
+        """Total bytes used by resident models."""
+        with self._lock:
+            return sum(entry.nbytes for entry in self._entries.values())
+
+    def __contains__(self, key: ModelKey) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry.model is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(1 for entry in self._entries.values() if entry.model is not None)
+
+    def _evict(self):
+        """Evict least recently used idle models until within budget. Caller holds the lock."""
+        if self.memory_budget_bytes is None:
+            return
+        total = sum(entry.nbytes for entry in self._entries.values())
+        for key in list(self._entries.keys()):
+            if total <= self.memory_budget_bytes:
+                break
+            entry = self._entries[key]
+            if entry.refcount > 0 or entry.model is None:
+                continue
+            total -= entry.nbytes
+            self._drop(key)
+
+    def _drop(self, key: ModelKey):
+        """Remove a model from the registry. Caller holds the lock."""
+        entry = self._entries.pop(key)
+        on_cuda = key.device.startswith('cuda')
+        entry.model = None
+        if on_cuda and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+_default_registry: Optional[ModelRegistry] = None
+_default_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    """
+    Get the process-wide model registry.
+
+    Returns:
+        ModelRegistry: Shared registry instance
+    """
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = ModelRegistry()
+        return _default_registry
+
+
+def set_model_registry(registry: ModelRegistry):
+    """
+    Replace the process-wide model registry, e.g. to configure a memory budget.
+
+    Args:
+        registry (ModelRegistry): Registry to use for subsequent requests
+    """
+    global _default_registry
+    with _default_registry_lock:
+        _default_registry = registry
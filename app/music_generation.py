@@ -5,46 +5,106 @@ This module handles the AI-powered music generation and processing.
 
 import torch
 import torchaudio
-from typing import Dict, Optional, Union, List
+from typing import Dict, Optional, Union, List, Tuple
 import numpy as np
 from audiocraft.models import MusicGen, AudioGen
 from audiocraft.data.audio import audio_write
+from .model_registry import ModelKey, ModelRegistry, get_model_registry
+from .mixing import Mixer
+from .result_cache import get_result_cache, request_digest
+
+# Accompaniment stems generated by default
+DEFAULT_STEMS = ['drums', 'bass']
+
+# Model and description template used for each accompaniment stem
+STEM_PROMPTS = {
+    'drums': ('audiogen', "Generate {style} style drum pattern"),
+    'bass': ('musicgen', "Generate {style} style bass line"),
+}
+DEFAULT_STEM_PROMPT = "Generate {style} style {stem} part"
 
 class MusicGenerator:
     """
     Handles music generation using AudioCraft's models.
     Supports both MusicGen and AudioGen for different audio generation tasks.
+    Models are obtained lazily from a shared ModelRegistry and released on `close`.
     """
     
-    def __init__(self, model_size: str = 'medium'):
+    def __init__(
+        self,
+        model_size: str = 'medium',
+        audio_model_name: str = 'facebook/audiogen-medium',
+        dtype: Optional[torch.dtype] = None,
+        registry: Optional[ModelRegistry] = None
+    ):
         """
         Initialize the music generator with specified model.
         
         Args:
             model_size (str): Size of the model to use ('small', 'medium', 'large')
+            audio_model_name (str): AudioGen model used for drum accompaniment
+            dtype (Optional[torch.dtype]): Dtype of the language models, None keeps the default
+            registry (Optional[ModelRegistry]): Registry to load models from, defaults to the process-wide one
         """
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        self.music_model = MusicGen.get_pretrained(model_size).to(self.device)
-        self.audio_model = AudioGen.get_pretrained('base').to(self.device)
+        self.registry = registry if registry is not None else get_model_registry()
+        self.music_key = ModelKey('musicgen', model_size, str(self.device), dtype)
+        self.audio_key = ModelKey('audiogen', audio_model_name, str(self.device), dtype)
+        self._models: Dict[ModelKey, Union[MusicGen, AudioGen]] = {}
+    
+    @property
+    def music_model(self) -> MusicGen:
+        """MusicGen model, loaded on first use."""
+        return self._acquire(self.music_key)
+    
+    @property
+    def audio_model(self) -> AudioGen:
+        """AudioGen model, loaded on first use."""
+        return self._acquire(self.audio_key)
+    
+    def _acquire(self, key: ModelKey):
+        if key not in self._models:
+            self._models[key] = self.registry.acquire(key)
+        return self._models[key]
+    
+    def close(self):
+        """
+        Release the models held by this generator back to the registry.
+        """
+        for key in list(self._models):
+            del self._models[key]
+            self.registry.release(key)
+    
+    def __enter__(self) -> 'MusicGenerator':
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
         
     def generate_from_audio(
         self,
         input_audio: np.ndarray,
         duration: float = 30.0,
         prompt: Optional[str] = None,
-        temperature: float = 1.0
-    ) -> np.ndarray:
+        temperature: float = 1.0,
+        sample_rate: int = 44100,
+        return_tokens: bool = False
+    ) -> Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
         """
         Generate music based on input audio and optional text prompt.
+        Melody conditioning is used when the model supports it, otherwise the
+        input audio is continued.
         
         Args:
             input_audio (np.ndarray): Input audio array
             duration (float): Duration of generated music in seconds
             prompt (Optional[str]): Text description for music generation
             temperature (float): Sampling temperature (higher = more random)
+            sample_rate (int): Sample rate of the input audio
+            return_tokens (bool): Also return the generated tokens
             
         Returns:
-            np.ndarray: Generated audio data
+            np.ndarray: Generated audio data, with the tokens if `return_tokens` is set
         """
         # Convert numpy array to tensor
         audio_tensor = torch.from_numpy(input_audio).float().to(self.device)
@@ -56,19 +116,36 @@ class MusicGenerator:
         )
         
         # Generate music
-        if prompt:
+        supports_melody = 'self_wav' in self.music_model.lm.condition_provider.conditioners
+        if len(input_audio) == 0:
+            output = self.music_model.generate(
+                descriptions=[prompt],
+                progress=True,
+                return_tokens=True
+            )
+        elif prompt and supports_melody:
             output = self.music_model.generate_with_chroma(
                 descriptions=[prompt],
                 melody_wavs=audio_tensor.unsqueeze(0),
-                progress=True
+                melody_sample_rate=sample_rate,
+                progress=True,
+                return_tokens=True
             )
         else:
+            # The continuation prompt must be shorter than the generated audio
+            max_prompt = int(min(duration, self.music_model.max_duration) * sample_rate * 0.5)
             output = self.music_model.generate_continuation(
-                prompt=audio_tensor.unsqueeze(0),
-                progress=True
+                prompt=audio_tensor[-max_prompt:].unsqueeze(0),
+                prompt_sample_rate=sample_rate,
+                descriptions=[prompt],
+                progress=True,
+                return_tokens=True
             )
         
-        return output.cpu().numpy()
+        audio, tokens = output
+        if return_tokens:
+            return audio.cpu().numpy(), tokens.cpu().numpy()
+        return audio.cpu().numpy()
     
     def enhance_audio(
         self,
@@ -95,74 +172,171 @@ class MusicGenerator:
         
         return enhanced.cpu().numpy()
     
+    def stem_sample_rate(self, stem: str) -> int:
+        """
+        Sample rate of a generated accompaniment stem.
+        
+        Args:
+            stem (str): Stem name
+            
+        Returns:
+            int: Sample rate of the model generating the stem
+        """
+        kind, _ = STEM_PROMPTS.get(stem, ('musicgen', DEFAULT_STEM_PROMPT))
+        model = self.audio_model if kind == 'audiogen' else self.music_model
+        return model.sample_rate
+    
     def generate_accompaniment(
         self,
         processed_input: Dict[str, Union[np.ndarray, Dict]],
         style: str = 'rock',
-        duration: float = 30.0
+        duration: float = 30.0,
+        stems: Optional[List[str]] = None
     ) -> Dict[str, np.ndarray]:
         """
         Generate accompaniment for processed instrument inputs.
+        All stems are generated in a single batched call per model.
         
         Args:
             processed_input (Dict): Processed input from different instruments
             style (str): Music style to generate
             duration (float): Duration of generated music
+            stems (Optional[List[str]]): Stems to generate, defaults to drums and bass
             
         Returns:
             Dict[str, np.ndarray]: Generated accompaniment tracks
         """
-        accompaniment = {}
+        return self.generate_accompaniment_batch(
+            [processed_input], [style], duration, stems
+        )[0]
+    
+    def generate_accompaniment_batch(
+        self,
+        processed_inputs: List[Dict[str, Union[np.ndarray, Dict]]],
+        styles: List[str],
+        duration: float = 30.0,
+        stems: Optional[List[str]] = None
+    ) -> List[Dict[str, np.ndarray]]:
+        """
+        Generate accompaniment for several requests at once.
+        Stems of every request are grouped by model so that each model runs a
+        single autoregressive pass with one description per row.
+        
+        Args:
+            processed_inputs (List[Dict]): Processed input of each request
+            styles (List[str]): Music style of each request
+            duration (float): Duration of generated music
+            stems (Optional[List[str]]): Stems to generate, defaults to drums and bass
+            
+        Returns:
+            List[Dict[str, np.ndarray]]: Generated accompaniment tracks of each request
+        """
+        if len(processed_inputs) != len(styles):
+            raise ValueError("Number of inputs and styles doesn't match")
+        stems = list(DEFAULT_STEMS if stems is None else stems)
         
-        # Generate drum accompaniment if needed
-        if 'drums' not in processed_input:
-            prompt = f"Generate {style} style drum pattern"
-            drums = self.audio_model.generate([prompt], duration=duration)
-            accompaniment['drums'] = drums.cpu().numpy()
+        # Collect (request index, stem, description) rows for each model
+        rows: Dict[str, List[Tuple[int, str, str]]] = {'audiogen': [], 'musicgen': []}
+        for index, (processed_input, style) in enumerate(zip(processed_inputs, styles)):
+            for stem in stems:
+                # Do not generate a stem the user already played
+                if stem in processed_input:
+                    continue
+                kind, template = STEM_PROMPTS.get(stem, ('musicgen', DEFAULT_STEM_PROMPT))
+                rows[kind].append((index, stem, template.format(style=style, stem=stem)))
         
-        # Generate bass line
-        bass_prompt = f"Generate {style} style bass line"
-        bass = self.music_model.generate([bass_prompt], duration=duration)
-        accompaniment['bass'] = bass.cpu().numpy()
+        accompaniments: List[Dict[str, np.ndarray]] = [{} for _ in processed_inputs]
+        for kind, model_rows in rows.items():
+            if not model_rows:
+                continue
+            model = self.audio_model if kind == 'audiogen' else self.music_model
+            model.set_generation_params(duration=duration)
+            output = model.generate([description for _, _, description in model_rows])
+            output = output.cpu().numpy()
+            for row, (index, stem, _) in enumerate(model_rows):
+                accompaniments[index][stem] = output[row:row + 1]
         
-        return accompaniment
+        return accompaniments
 
-def generate_music(processed_input: Dict[str, Union[np.ndarray, Dict]]) -> np.ndarray:
+def generate_music(
+    processed_input: Dict[str, Union[np.ndarray, Dict]],
+    model_size: str = 'medium',
+    prompt: str = "Create a full arrangement based on the input",
+    duration: float = 60.0,
+    seed: Optional[int] = None,
+    use_cache: bool = True,
+    sample_rate: int = 44100,
+    audio_model_name: str = 'facebook/audiogen-medium'
+) -> np.ndarray:
     """
     Main function to generate music from processed inputs.
+    Models stay resident in the process-wide registry between calls. With a
+    fixed seed, results are stored in the result cache and identical requests
+    are served from it without generating again.
     
     Args:
         processed_input (Dict): Processed input from different instruments
+        model_size (str): MusicGen model to use
+        prompt (str): Text description for music generation
+        duration (float): Duration of generated music in seconds
+        seed (Optional[int]): Random seed making the generation reproducible
+        use_cache (bool): Look up and store seeded results in the result cache
+        sample_rate (int): Sample rate of the input audio and of the returned mix
+        audio_model_name (str): AudioGen model used for drum accompaniment
         
     Returns:
-        np.ndarray: Generated music data
+        np.ndarray: Generated music data of shape [channels, frames]
     """
-    generator = MusicGenerator()
-    
-    # Combine all input audio
-    combined_input = np.zeros(0)
-    for instrument, data in processed_input.items():
-        if isinstance(data, np.ndarray):
-            combined_input = np.concatenate([combined_input, data])
-        elif isinstance(data, dict) and 'audio' in data:
-            combined_input = np.concatenate([combined_input, data['audio']])
-    
-    # Generate main music track
-    generated_music = generator.generate_from_audio(
-        combined_input,
-        prompt="Create a full arrangement based on the input",
-        duration=60.0
-    )
-    
-    # Generate accompaniment
-    accompaniment = generator.generate_accompaniment(processed_input)
-    
-    # Mix all tracks (simple mixing)
-    final_mix = generated_music * 0.7  # Main track
-    for track in accompaniment.values():
-        final_mix += track * 0.3  # Accompaniment tracks
-    
-    # Normalize the final mix
-    final_mix = final_mix / np.max(np.abs(final_mix))
+    cache, cache_key = None, None
+    if use_cache and seed is not None:
+        cache = get_result_cache()
+        request = {
+            'model': model_size, 'prompt': prompt, 'duration': duration,
+            'seed': seed, 'sample_rate': sample_rate, 'audio_model': audio_model_name,
+        }
+        cache_key = request_digest(processed_input, **request)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached['audio']
+    
+    if seed is not None:
+        torch.manual_seed(seed)
+        np.random.seed(seed)
+    
+    with MusicGenerator(model_size, audio_model_name) as generator:
+        # Combine all input audio with a single copy
+        parts = []
+        for instrument, data in processed_input.items():
+            if isinstance(data, np.ndarray):
+                parts.append(data)
+            elif isinstance(data, dict) and 'audio' in data:
+                parts.append(data['audio'])
+        combined_input = np.concatenate(parts) if parts else np.zeros(0)
+    
+        # Generate main music track
+        generated_music, tokens = generator.generate_from_audio(
+            combined_input,
+            prompt=prompt,
+            duration=duration,
+            sample_rate=sample_rate,
+            return_tokens=True
+        )
+    
+        # Generate accompaniment
+        accompaniment = generator.generate_accompaniment(processed_input, duration=duration)
+    
+        # Resample every track to the output rate and mix them in place
+        mixer = Mixer(sample_rate, channels=generator.music_model.audio_channels)
+        mixer.add(generated_music, generator.music_model.sample_rate, gain=0.7)  # Main track
+        for stem, track in accompaniment.items():
+            mixer.add(track, generator.stem_sample_rate(stem), gain=0.3)  # Accompaniment tracks
+        final_mix = mixer.mix(length=int(duration * sample_rate))
+    
+        # Normalize the final mix
+        peak = np.max(np.abs(final_mix))
+        if peak > 0:
+            final_mix /= peak
     
+    if cache is not None:
+        cache.put(cache_key, final_mix, tokens, metadata=request)
     return final_mix
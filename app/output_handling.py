@@ -3,12 +3,126 @@ Output handling module for saving and exporting generated music.
 Supports multiple output formats and quality settings.
 """
 
+import io
+import os
+import uuid
 import numpy as np
 import soundfile as sf
-from typing import Optional
-import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
 from datetime import datetime
 
+# soundfile container and subtype used for each supported audio format
+AUDIO_FORMATS = {
+    'wav': ('WAV', 'PCM_16'),
+    'flac': ('FLAC', 'PCM_16'),
+    'ogg': ('OGG', 'VORBIS'),
+    'mp3': ('MP3', 'MPEG_LAYER_III'),
+}
+
+def _to_frames(audio_data: np.ndarray) -> np.ndarray:
+    """
+    Convert generated audio to the [frames, channels] layout expected by encoders.
+    Leading batch dimensions of size one are dropped and [channels, frames]
+    arrays, as produced by AudioCraft models, are transposed.
+    """
+    audio = np.asarray(audio_data, dtype=np.float32)
+    while audio.ndim > 2 and audio.shape[0] == 1:
+        audio = audio[0]
+    if audio.ndim == 2 and audio.shape[0] < audio.shape[1]:
+        audio = audio.T
+    if audio.ndim == 2 and audio.shape[1] == 1:
+        audio = audio[:, 0]
+    return audio
+
+
+def _mp3_compression_level(bitrate: str) -> float:
+    """Map a bitrate such as "320k" to libsndfile's 0 (best) to 1 (smallest) scale."""
+    kbps = float(bitrate.lower().rstrip('k'))
+    return float(np.clip((320.0 - kbps) / (320.0 - 32.0), 0.0, 1.0))
+
+
+def encode_audio(
+    audio_data: np.ndarray,
+    format: str,
+    sample_rate: int = 44100,
+    bitrate: str = "320k"
+) -> bytes:
+    """
+    Encode audio data in memory.
+    
+    Args:
+        audio_data (np.ndarray): Audio data to encode
+        format (str): Output format ("wav", "flac", "ogg" or "mp3")
+        sample_rate (int): Audio sample rate
+        bitrate (str): MP3 bitrate
+        
+    Returns:
+        bytes: Encoded audio file content
+    """
+    format = format.lower()
+    if format not in AUDIO_FORMATS:
+        raise ValueError(f"Unsupported format: {format}")
+    audio = _to_frames(audio_data)
+    container, subtype = AUDIO_FORMATS[format]
+    
+    if format == 'mp3' and container not in sf.available_formats():
+        # libsndfile < 1.1 has no MP3 support, encode in memory with pydub instead
+        from pydub import AudioSegment
+        pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+        segment = AudioSegment(
+            pcm.tobytes(),
+            frame_rate=sample_rate,
+            sample_width=2,
+            channels=1 if pcm.ndim == 1 else pcm.shape[1]
+        )
+        buffer = io.BytesIO()
+        segment.export(buffer, format="mp3", bitrate=bitrate)
+        return buffer.getvalue()
+    
+    options = {}
+    if format == 'mp3':
+        options = {'compression_level': _mp3_compression_level(bitrate), 'bitrate_mode': 'CONSTANT'}
+    buffer = io.BytesIO()
+    sf.write(buffer, audio, sample_rate, subtype=subtype, format=container, **options)
+    return buffer.getvalue()
+
+
+def write_atomic(filepath: str, data: bytes):
+    """
+    Write a file atomically.
+    Data goes to a uniquely named temporary file in the same directory which is
+    then renamed over the destination, so readers and concurrent writers never
+    observe a partial file. The file keeps the mode of the file it replaces, or
+    gets the mode a plain open() would give it.
+    
+    Args:
+        filepath (str): Destination path
+        data (bytes): File content
+    """
+    directory = os.path.dirname(filepath) or '.'
+    temp_path = os.path.join(directory, f'.tmp_{uuid.uuid4().hex}{os.path.splitext(filepath)[1]}')
+    # Created like open() would, so the process umask applies to a new file
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            try:
+                os.fchmod(f.fileno(), os.stat(filepath).st_mode & 0o7777)
+            except FileNotFoundError:
+                pass
+            f.write(data)
+        os.replace(temp_path, filepath)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def _default_filename(extension: str) -> str:
+    """Timestamped filename, made unique for concurrent requests."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"generated_{timestamp}_{uuid.uuid4().hex[:8]}.{extension}"
+
+
 class AudioOutputHandler:
     """
     Handles the saving and exporting of generated audio in various formats.
@@ -41,13 +155,7 @@ class AudioOutputHandler:
         Returns:
             str: Path to saved file
         """
-        if filename is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"generated_{timestamp}.wav"
-        
-        filepath = os.path.join(self.output_dir, filename)
-        sf.write(filepath, audio_data, sample_rate)
-        return filepath
+        return self.save_audio(audio_data, "wav", filename, sample_rate)
     
     def save_mp3(
         self,
@@ -68,24 +176,75 @@ class AudioOutputHandler:
         Returns:
             str: Path to saved file
         """
-        if filename is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"generated_{timestamp}.mp3"
+        # Encode in memory, no intermediate WAV file
+        return self.save_audio(audio_data, "mp3", filename, sample_rate, bitrate)
+    
+    def save_audio(
+        self,
+        audio_data: np.ndarray,
+        format: str,
+        filename: Optional[str] = None,
+        sample_rate: int = 44100,
+        bitrate: str = "320k"
+    ) -> str:
+        """
+        Encode audio data in memory and write it atomically.
         
-        # First save as WAV
-        wav_path = self.save_wav(audio_data, "temp.wav", sample_rate)
+        Args:
+            audio_data (np.ndarray): Audio data to save
+            format (str): Output format ("wav", "flac", "ogg" or "mp3")
+            filename (Optional[str]): Output filename
+            sample_rate (int): Audio sample rate
+            bitrate (str): MP3 bitrate
+            
+        Returns:
+            str: Path to saved file
+        """
+        if filename is None:
+            filename = _default_filename(format.lower())
         
-        # Convert to MP3 using pydub
-        from pydub import AudioSegment
-        audio = AudioSegment.from_wav(wav_path)
+        filepath = os.path.join(self.output_dir, filename)
+        write_atomic(filepath, encode_audio(audio_data, format, sample_rate, bitrate))
+        return filepath
+    
+    def save_formats(
+        self,
+        audio_data: np.ndarray,
+        formats: List[str],
+        basename: Optional[str] = None,
+        sample_rate: int = 44100,
+        bitrate: str = "320k",
+        max_workers: Optional[int] = None
+    ) -> Dict[str, str]:
+        """
+        Save the same render in several formats, encoding them in parallel threads.
         
-        mp3_path = os.path.join(self.output_dir, filename)
-        audio.export(mp3_path, format="mp3", bitrate=bitrate)
+        Args:
+            audio_data (np.ndarray): Audio data to save
+            formats (List[str]): Output formats ("wav", "flac", "ogg", "mp3")
+            basename (Optional[str]): Output filename without extension
+            sample_rate (int): Audio sample rate
+            bitrate (str): MP3 bitrate
+            max_workers (Optional[int]): Number of encoder threads, defaults to one per format
+            
+        Returns:
+            Dict[str, str]: Path to the saved file for each format
+        """
+        if basename is None:
+            basename = os.path.splitext(_default_filename("wav"))[0]
+        formats = [format.lower() for format in formats]
+        for format in formats:
+            if format not in AUDIO_FORMATS:
+                raise ValueError(f"Unsupported format: {format}")
+        # Convert once, every encoder thread shares the read-only array
+        audio = _to_frames(audio_data)
         
-        # Clean up temporary WAV file
-        os.remove(wav_path)
+        def _save(format: str) -> str:
+            return self.save_audio(audio, format, f"{basename}.{format}", sample_rate, bitrate)
         
-        return mp3_path
+        with ThreadPoolExecutor(max_workers=max_workers or len(formats) or 1) as executor:
+            paths = list(executor.map(_save, formats))
+        return dict(zip(formats, paths))
     
     def save_midi(
         self,
@@ -103,12 +262,10 @@ class AudioOutputHandler:
             str: Path to saved file
         """
         if filename is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"generated_{timestamp}.mid"
+            filename = _default_filename("mid")
         
         filepath = os.path.join(self.output_dir, filename)
-        with open(filepath, 'wb') as f:
-            f.write(midi_data)
+        write_atomic(filepath, midi_data)
         
         return filepath
 
@@ -123,7 +280,7 @@ def save_output(
     
     Args:
         generated_music (np.ndarray): Generated music data
-        format (str): Output format ("wav", "mp3", or "midi")
+        format (str): Output format ("wav", "flac", "ogg", "mp3", or "midi")
         filename (Optional[str]): Output filename
         sample_rate (int): Audio sample rate
         
@@ -136,6 +293,8 @@ def save_output(
         return handler.save_wav(generated_music, filename, sample_rate)
     elif format.lower() == "mp3":
         return handler.save_mp3(generated_music, filename, sample_rate)
+    elif format.lower() in AUDIO_FORMATS:
+        return handler.save_audio(generated_music, format, filename, sample_rate)
     elif format.lower() == "midi":
         raise NotImplementedError("MIDI export not yet implemented")
     else:
@@ -0,0 +1,219 @@
+"""
+Result cache module for serving repeated generation requests from disk.
+Results are stored under a digest of everything that determines them, so an
+identical request with a fixed seed returns the stored audio and tokens.
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from .output_handling import write_atomic
+
+# Bump when the generation pipeline changes in a way that invalidates results
+CACHE_VERSION = 2
+
+INDEX_FILENAME = 'index.json'
+
+
+def _update_digest(digest, value: Any):
+    """Feed a processed input value into a hash in a type- and order-stable way."""
+    if isinstance(value, dict):
+        digest.update(b'dict')
+        for key in sorted(value, key=str):
+            digest.update(str(key).encode())
+            _update_digest(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f'list{len(value)}'.encode())
+        for item in value:
+            _update_digest(digest, item)
+    elif isinstance(value, np.ndarray) or hasattr(value, '__array__'):
+        array = np.ascontiguousarray(value)
+        digest.update(f'array{array.dtype.str}{array.shape}'.encode())
+        digest.update(array.tobytes())
+    else:
+        digest.update(json.dumps(value, sort_keys=True, default=repr).encode())
+
+
+def request_digest(processed_input: Dict[str, Any], **params) -> str:
+    """
+    Compute a stable digest of a generation request.
+
+    Args:
+        processed_input (Dict): Processed input from different instruments
+        **params: Everything else determining the result (model, prompt, seed, generation params)
+
+    Returns:
+        str: Hex digest identifying the request
+    """
+    digest = hashlib.sha256(f'automusic-v{CACHE_VERSION}'.encode())
+    _update_digest(digest, processed_input)
+    _update_digest(digest, params)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    On-disk, size-bounded cache of generation results.
+    Each entry is a `.npz` file holding the audio and optional tokens. A JSON
+    index keeps entry metadata and access times; once the total size exceeds
+    the budget, least recently used entries are deleted. Lookups only update
+    access times in memory, the index is written when entries are stored.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 2 * 1024 ** 3):
+        """
+        Initialize the result cache.
+
+        Args:
+            cache_dir (str): Directory holding cached results
+            max_bytes (int): Maximum total size of cached results
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index = self._load_index()
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        path = os.path.join(self.cache_dir, INDEX_FILENAME)
+        try:
+            with open(path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # Forget entries whose file has disappeared
+        return {key: meta for key, meta in index.items() if os.path.exists(self._path(key))}
+
+    def _save_index(self):
+        data = json.dumps(self._index, indent=1, sort_keys=True).encode()
+        write_atomic(os.path.join(self.cache_dir, INDEX_FILENAME), data)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.npz')
+
+    def get(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Look up a cached result.
+
+        Args:
+            key (str): Request digest
+
+        Returns:
+            Optional[Dict[str, np.ndarray]]: 'audio' and, if stored, 'tokens', or None on a miss
+        """
+        with self._lock:
+            if key not in self._index:
+                return None
+            try:
+                with np.load(self._path(key)) as data:
+                    result = {name: data[name] for name in data.files}
+            except (OSError, ValueError):
+                del self._index[key]
+                self._save_index()
+                return None
+            # Kept in memory only, the next put saves it with the index
+            self._index[key]['last_access'] = time.time()
+            return result
+
+    def put(
+        self,
+        key: str,
+        audio: np.ndarray,
+        tokens: Optional[np.ndarray] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Store a result, evicting least recently used entries if over budget.
+
+        Args:
+            key (str): Request digest
+            audio (np.ndarray): Generated audio
+            tokens (Optional[np.ndarray]): Generated tokens
+            metadata (Optional[Dict]): JSON-serialisable description of the request
+        """
+        arrays = {'audio': audio}
+        if tokens is not None:
+            arrays['tokens'] = tokens
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        data = buffer.getvalue()
+
+        with self._lock:
+            write_atomic(self._path(key), data)
+            now = time.time()
+            self._index[key] = {
+                'size': len(data),
+                'created': now,
+                'last_access': now,
+                'metadata': metadata or {},
+            }
+            self._evict()
+            self._save_index()
+
+    def _evict(self):
+        """Delete least recently used entries until within budget. Caller holds the lock."""
+        total = sum(meta['size'] for meta in self._index.values())
+        for key in sorted(self._index, key=lambda k: self._index[k]['last_access']):
+            if total <= self.max_bytes:
+                break
+            total -= self._index.pop(key)['size']
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    @property
+    def total_bytes(self) -> int:
+        """Total size of cached results."""
+        with self._lock:
+            return sum(meta['size'] for meta in self._index.values())
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._index
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._index)
+
+
+_default_cache: Optional[ResultCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """
+    Get the process-wide result cache.
+    Its location can be set with the AUTOMUSIC_CACHE_DIR environment variable.
+
+    Returns:
+        ResultCache: Shared cache instance
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            cache_dir = os.environ.get(
+                'AUTOMUSIC_CACHE_DIR',
+                os.path.join(os.path.expanduser('~'), '.cache', 'automusic', 'results')
+            )
+            _default_cache = ResultCache(cache_dir)
+        return _default_cache
+
+
+def set_result_cache(cache: Optional[ResultCache]):
+    """
+    Replace the process-wide result cache.
+
+    Args:
+        cache (Optional[ResultCache]): Cache to use, None to go back to the default location
+    """
+    global _default_cache
+    with _default_cache_lock:
+        _default_cache = cache
@@ -0,0 +1,363 @@
+"""
+Generation service module for serving music generation requests.
+This module keeps models resident, queues incoming jobs and runs compatible
+jobs together as micro-batches, exposed through a small Flask API.
+"""
+
+import base64
+import binascii
+import io
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+import soundfile as sf
+import torch
+from flask import Flask, jsonify, request, Response
+
+from .model_registry import ModelKey, ModelRegistry, get_model_registry
+from .output_handling import encode_audio
+
+# Generation parameters accepted from clients, with their defaults
+DEFAULT_PARAMS = {
+    'duration': 10.0,
+    'temperature': 1.0,
+    'top_k': 250,
+    'top_p': 0.0,
+    'cfg_coef': 3.0,
+}
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+@dataclass
+class GenerationJob:
+    """
+    A single generation request and its state.
+
+    Args:
+        prompt (str): Text description of the music to generate
+        params (Dict[str, Any]): Generation parameters, see DEFAULT_PARAMS
+        melody (Optional[np.ndarray]): Mono input audio used for melody conditioning
+        melody_sample_rate (Optional[int]): Sample rate of `melody`
+    """
+    prompt: str
+    params: Dict[str, Any]
+    melody: Optional[np.ndarray] = None
+    melody_sample_rate: Optional[int] = None
+    job_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = 'queued'
+    result: Optional[np.ndarray] = None
+    error: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def batch_key(self) -> Tuple:
+        """Jobs with the same key can be generated in one batch."""
+        has_melody = self.melody is not None
+        return (tuple(sorted(self.params.items())), has_melody, self.melody_sample_rate if has_melody else None)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serialisable status of the job."""
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'prompt': self.prompt,
+            'params': self.params,
+            'error': self.error,
+            'submitted_at': self.submitted_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class GenerationService:
+    """
+    Queue of generation jobs processed by a background worker.
+    The worker takes the oldest job and waits briefly for compatible jobs
+    (same duration, sampling parameters and conditioning) so they share a
+    single MusicGen call. Submissions are rejected once the queue is full.
+    """
+
+    def __init__(
+        self,
+        model_name: str = 'medium',
+        max_queue_size: int = 64,
+        max_batch_size: int = 8,
+        batch_timeout: float = 0.05,
+        max_finished_jobs: int = 1024,
+        max_duration: float = 30.0,
+        registry: Optional[ModelRegistry] = None
+    ):
+        """
+        Initialize the generation service.
+
+        Args:
+            model_name (str): MusicGen model to serve, 'debug' for tests
+            max_queue_size (int): Maximum number of queued jobs before rejecting submissions
+            max_batch_size (int): Maximum number of jobs generated together
+            batch_timeout (float): Seconds to wait for compatible jobs before running a batch
+            max_finished_jobs (int): Number of finished jobs kept for polling
+            max_duration (float): Longest audio in seconds a job may request
+            registry (Optional[ModelRegistry]): Registry to load models from, defaults to the process-wide one
+        """
+        self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.model_key = ModelKey('musicgen', model_name, self.device)
+        self.max_queue_size = max_queue_size
+        self.max_batch_size = max_batch_size
+        self.batch_timeout = batch_timeout
+        self.max_finished_jobs = max_finished_jobs
+        self.max_duration = max_duration
+        self.registry = registry if registry is not None else get_model_registry()
+
+        self._queue: Deque[GenerationJob] = deque()
+        self._jobs: 'OrderedDict[str, GenerationJob]' = OrderedDict()
+        self._condition = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        self._running = False
+        self._model = None
+
+    def start(self) -> 'GenerationService':
+        """
+        Load the model and start the worker thread.
+        """
+        if self._worker is None:
+            self._model = self.registry.acquire(self.model_key)
+            self._running = True
+            self._worker = threading.Thread(target=self._run, daemon=True)
+            self._worker.start()
+        return self
+
+    def stop(self):
+        """
+        Stop the worker once the current batch finishes and release the model.
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
+            self._model = None
+            self.registry.release(self.model_key)
+
+    def __enter__(self) -> 'GenerationService':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def submit(
+        self,
+        prompt: str,
+        melody: Optional[np.ndarray] = None,
+        melody_sample_rate: Optional[int] = None,
+        **params
+    ) -> GenerationJob:
+        """
+        Queue a generation job.
+
+        Args:
+            prompt (str): Text description of the music to generate
+            melody (Optional[np.ndarray]): Mono input audio used for melody conditioning
+            melody_sample_rate (Optional[int]): Sample rate of `melody`
+            **params: Generation parameters overriding DEFAULT_PARAMS
+
+        Returns:
+            GenerationJob: The queued job
+        """
+        unknown = set(params) - set(DEFAULT_PARAMS)
+        if unknown:
+            raise ValueError(f"Unsupported generation parameters: {sorted(unknown)}")
+        if melody is not None and melody_sample_rate is None:
+            raise ValueError("melody_sample_rate is required with a melody")
+        job_params = dict(DEFAULT_PARAMS)
+        job_params.update({name: type(DEFAULT_PARAMS[name])(value) for name, value in params.items()})
+        if not 0 < job_params['duration'] <= self.max_duration:
+            raise ValueError(f"duration must be between 0 and {self.max_duration} seconds")
+        job = GenerationJob(prompt, job_params, melody, melody_sample_rate)
+
+        with self._condition:
+            if len(self._queue) >= self.max_queue_size:
+                raise QueueFullError(f"Generation queue is full ({self.max_queue_size} jobs)")
+            self._queue.append(job)
+            self._jobs[job.job_id] = job
+            self._condition.notify_all()
+        return job
+
+    def get_job(self, job_id: str) -> Optional[GenerationJob]:
+        """
+        Get a job by id, or None if it is unknown or expired.
+        """
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    @property
+    def queue_size(self) -> int:
+        """Number of jobs waiting to be generated."""
+        with self._condition:
+            return len(self._queue)
+
+    def _next_batch(self) -> List[GenerationJob]:
+        """Wait for a job, then collect compatible jobs until the batch is full or the timeout expires."""
+        with self._condition:
+            while self._running and not self._queue:
+                self._condition.wait()
+            if not self._queue:
+                return []
+            first = self._queue.popleft()
+            batch = [first]
+            deadline = time.monotonic() + self.batch_timeout
+            while len(batch) < self.max_batch_size:
+                for job in list(self._queue):
+                    if job.batch_key == first.batch_key:
+                        self._queue.remove(job)
+                        batch.append(job)
+                        if len(batch) == self.max_batch_size:
+                            break
+                remaining = deadline - time.monotonic()
+                if len(batch) == self.max_batch_size or remaining <= 0 or not self._running:
+                    break
+                self._condition.wait(remaining)
+            for job in batch:
+                job.status = 'running'
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            try:
+                results = self._generate(batch)
+                for job, result in zip(batch, results):
+                    job.result = result
+                    job.status = 'done'
+            except Exception as e:
+                for job in batch:
+                    job.error = str(e)
+                    job.status = 'failed'
+            with self._condition:
+                for job in batch:
+                    job.finished_at = time.time()
+                self._expire_finished()
+
+    def _generate(self, batch: List[GenerationJob]) -> List[np.ndarray]:
+        """Run one batched MusicGen call for compatible jobs."""
+        model = self._model
+        params = batch[0].params
+        model.set_generation_params(
+            duration=params['duration'],
+            temperature=params['temperature'],
+            top_k=params['top_k'],
+            top_p=params['top_p'],
+            cfg_coef=params['cfg_coef']
+        )
+        descriptions = [job.prompt for job in batch]
+        if batch[0].melody is not None:
+            output = model.generate_with_chroma(
+                descriptions=descriptions,
+                melody_wavs=[torch.from_numpy(job.melody).float()[None] for job in batch],
+                melody_sample_rate=batch[0].melody_sample_rate
+            )
+        else:
+            output = model.generate(descriptions)
+        output = output.cpu().numpy()
+        return [output[row] for row in range(len(batch))]
+
+    def _expire_finished(self):
+        """Drop the oldest finished jobs beyond max_finished_jobs. Caller holds the lock."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+
+    @property
+    def sample_rate(self) -> int:
+        """Sample rate of generated audio."""
+        return self._model.sample_rate
+
+
+def create_app(service: GenerationService) -> Flask:
+    """
+    Create the HTTP API of a generation service.
+
+    Routes:
+        POST /jobs: submit `{"prompt": ..., "melody": <base64 audio file>, **params}`
+        GET /jobs/<job_id>: poll the job status
+        GET /jobs/<job_id>/audio: download the generated WAV once done
+
+    Args:
+        service (GenerationService): Started generation service
+
+    Returns:
+        Flask: The application
+    """
+    app = Flask(__name__)
+
+    @app.post('/jobs')
+    def submit_job():
+        payload = request.get_json(force=True, silent=True)
+        if not isinstance(payload, dict):
+            return jsonify({'error': 'expected a JSON object'}), 400
+        prompt = payload.pop('prompt', None)
+        if not prompt:
+            return jsonify({'error': 'prompt is required'}), 400
+        melody, melody_sample_rate = None, None
+        if 'melody' in payload:
+            try:
+                melody_file = io.BytesIO(base64.b64decode(payload.pop('melody')))
+                melody, melody_sample_rate = sf.read(melody_file)
+            except (TypeError, binascii.Error, RuntimeError) as e:
+                # RuntimeError covers soundfile's LibsndfileError for undecodable audio
+                return jsonify({'error': f'invalid melody: {e}'}), 400
+            if melody.ndim > 1:
+                melody = melody.mean(axis=1)
+        try:
+            job = service.submit(prompt, melody, melody_sample_rate, **payload)
+        except QueueFullError as e:
+            response = jsonify({'error': str(e)})
+            response.headers['Retry-After'] = '1'
+            return response, 503
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(job.to_dict()), 202
+
+    @app.get('/jobs/<job_id>')
+    def job_status(job_id):
+        job = service.get_job(job_id)
+        if job is None:
+            return jsonify({'error': 'unknown job'}), 404
+        status = job.to_dict()
+        status['queue_size'] = service.queue_size
+        return jsonify(status)
+
+    @app.get('/jobs/<job_id>/audio')
+    def job_audio(job_id):
+        job = service.get_job(job_id)
+        if job is None:
+            return jsonify({'error': 'unknown job'}), 404
+        if job.status != 'done':
+            return jsonify(job.to_dict()), 409
+        return Response(encode_audio(job.result, 'wav', service.sample_rate), mimetype='audio/wav')
+
+    return app
+
+
+def serve(model_name: str = 'medium', host: str = '127.0.0.1', port: int = 5000, **service_kwargs):
+    """
+    Run the generation service until interrupted.
+
+    Args:
+        model_name (str): MusicGen model to serve
+        host (str): Interface to listen on
+        port (int): Port to listen on
+        **service_kwargs: Extra GenerationService parameters
+    """
+    with GenerationService(model_name, **service_kwargs) as service:
+        create_app(service).run(host=host, port=port, threaded=True)
@@ -433,6 +433,7 @@ class LMModel(StreamingModule):
                  remove_prompts: bool = False,
                  check: bool = False,
                  callback: tp.Optional[tp.Callable[[int, int], None]] = None,
+                 preallocate_kv_cache: bool = True,
                  ) -> torch.Tensor:
         """Generate tokens sampling from the model given a prompt or unconditionally. Generation can
         be performed in a greedy fashion or using sampling with top K and top P strategies.
@@ -456,6 +457,8 @@ class LMModel(StreamingModule):
             remove_prompts (bool): Whether to remove prompts from generation or not.
             check (bool): Whether to apply further checks on generated sequence.
             callback (Callback, optional): Callback function to report generation progress.
+            preallocate_kv_cache (bool): Whether to preallocate the attention keys and values for the whole
+                generation rather than growing them at every step.
         Returns:
             torch.Tensor: Generated tokens.
         """
@@ -533,37 +536,43 @@ class LMModel(StreamingModule):
         start_offset_sequence = pattern.get_first_step_with_timesteps(start_offset)
         assert start_offset_sequence is not None
 
-        with self.streaming():
-            unconditional_state = self.get_streaming_state()
-            prev_offset = 0
-            gen_sequence_len = gen_sequence.shape[-1]  # gen_sequence shape is [B, K, S]
-            for offset in range(start_offset_sequence, gen_sequence_len):
-                # get current sequence (note that the streaming API is providing the caching over previous offsets)
-                curr_sequence = gen_sequence[..., prev_offset:offset]
-                curr_mask = mask[None, ..., prev_offset:offset].expand(B, -1, -1)
-                if check:
-                    # check coherence between mask and sequence
-                    assert (curr_sequence == torch.where(curr_mask, curr_sequence, self.special_token_id)).all()
-                    # should never happen as gen_sequence is filled progressively
-                    assert not (curr_sequence == unknown_token).any()
-                # sample next token from the model, next token shape is [B, K, 1]
-                next_token = self._sample_next_token(
-                    curr_sequence, cfg_conditions, unconditional_state, use_sampling, temp, top_k, top_p,
-                    cfg_coef=cfg_coef, cfg_coef_beta=cfg_coef_beta, two_step_cfg=two_step_cfg)
-                # ensure the tokens that should be masked are properly set to special_token_id
-                # as the model never output special_token_id
-                valid_mask = mask[..., offset:offset+1].expand(B, -1, -1)
-                next_token[~valid_mask] = self.special_token_id
-                # ensure we don't overwrite prompt tokens, we only write over unknown tokens
-                # (then mask tokens should be left as is as well, which is correct)
-                gen_sequence[..., offset:offset+1] = torch.where(
-                    gen_sequence[..., offset:offset+1] == unknown_token,
-                    next_token, gen_sequence[..., offset:offset+1]
-                )
-                prev_offset = offset
-                if callback is not None:
-                    callback(1 + offset - start_offset_sequence, gen_sequence_len - start_offset_sequence)
-        unconditional_state.clear()
+        gen_sequence_len = gen_sequence.shape[-1]  # gen_sequence shape is [B, K, S]
+        if preallocate_kv_cache:
+            # After the first step, which holds the prompt, each step adds one time step to the keys and values.
+            self.transformer.set_kv_cache(gen_sequence_len - start_offset_sequence)
+        try:
+            with self.streaming():
+                unconditional_state = self.get_streaming_state()
+                prev_offset = 0
+                for offset in range(start_offset_sequence, gen_sequence_len):
+                    # get current sequence (note that the streaming API is providing the caching over previous offsets)
+                    curr_sequence = gen_sequence[..., prev_offset:offset]
+                    curr_mask = mask[None, ..., prev_offset:offset].expand(B, -1, -1)
+                    if check:
+                        # check coherence between mask and sequence
+                        assert (curr_sequence == torch.where(curr_mask, curr_sequence, self.special_token_id)).all()
+                        # should never happen as gen_sequence is filled progressively
+                        assert not (curr_sequence == unknown_token).any()
+                    # sample next token from the model, next token shape is [B, K, 1]
+                    next_token = self._sample_next_token(
+                        curr_sequence, cfg_conditions, unconditional_state, use_sampling, temp, top_k, top_p,
+                        cfg_coef=cfg_coef, cfg_coef_beta=cfg_coef_beta, two_step_cfg=two_step_cfg)
+                    # ensure the tokens that should be masked are properly set to special_token_id
+                    # as the model never output special_token_id
+                    valid_mask = mask[..., offset:offset+1].expand(B, -1, -1)
+                    next_token[~valid_mask] = self.special_token_id
+                    # ensure we don't overwrite prompt tokens, we only write over unknown tokens
+                    # (then mask tokens should be left as is as well, which is correct)
+                    gen_sequence[..., offset:offset+1] = torch.where(
+                        gen_sequence[..., offset:offset+1] == unknown_token,
+                        next_token, gen_sequence[..., offset:offset+1]
+                    )
+                    prev_offset = offset
+                    if callback is not None:
+                        callback(1 + offset - start_offset_sequence, gen_sequence_len - start_offset_sequence)
+            unconditional_state.clear()
+        finally:
+            self.transformer.set_kv_cache(None)
 
         # ensure sequence has been entirely filled
         assert not (gen_sequence == unknown_token).any()
@@ -109,6 +109,13 @@ def expand_repeated_kv(x: torch.Tensor, n_rep: int, memory_efficient: bool) -> t
         )
 
 
+def _new_kv_buffer(x: torch.Tensor, capacity: int, time_dim: int) -> torch.Tensor:
+    # Empty key/value buffer like `x`, with room for `capacity` time steps.
+    shape = list(x.shape)
+    shape[time_dim] = capacity
+    return x.new_zeros(shape)
+
+
 class LayerScale(nn.Module):
     """Layer scale from [Touvron et al 2021] (https://arxiv.org/pdf/2103.17239.pdf).
     This rescales diagonally the residual outputs close to 0, with a learnt scale.
@@ -183,6 +190,7 @@ class StreamingMultiheadAttention(StreamingModule):
         self.num_heads = num_heads
         self.dropout = dropout
         self.kv_repeat = kv_repeat
+        self._kv_cache_steps: tp.Optional[int] = None
         if cross_attention:
             assert not causal, "Causal cannot work with cross attention."
             assert rope is None, "Rope cannot work with cross attention."
@@ -230,6 +238,48 @@ class StreamingMultiheadAttention(StreamingModule):
                     state_dict[prefix + "mha." + key] = state_dict.pop(prefix + key)
         super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
 
+    def set_kv_cache(self, max_steps: tp.Optional[int]):
+        """Preallocate the streaming keys and values instead of concatenating them at every step.
+
+        The buffers are allocated at the first streaming step, with room for the keys of that step
+        and `max_steps` more. New keys and values are written in place and attention reads views
+        of the buffers. With `past_context` (and an explicit attention mask), the buffers are a ring
+        of `past_context + 1` steps instead. The buffers live in the streaming state.
+
+        Args:
+            max_steps (int, optional): Time steps expected after the first streaming step,
+                None to go back to concatenation. The buffers grow if this is exceeded.
+        """
+        self._kv_cache_steps = max_steps
+
+    def _uses_kv_ring(self) -> bool:
+        # The ring holds keys out of order, which only a full attention mask can express.
+        return self.past_context is not None and not self.memory_efficient
+
+    def _ring_step(self, current_steps: int) -> bool:
+        # Whether this step attends the whole ring, otherwise it attends the ordered window.
+        if 'cache_end' not in self._streaming_state or not self._uses_kv_ring():
+            return False
+        time_dim = _get_attention_time_dimension(self.memory_efficient)
+        capacity = self._streaming_state['cache_keys'].shape[time_dim]
+        assert self.past_context is not None
+        return current_steps <= capacity - self.past_context
+
+    def _get_ring_mask(self, past_steps: int, current_steps: int, capacity: int,
+                       device: torch.device, dtype: torch.dtype):
+        # Slot s of the ring holds the latest position equal to s modulo the capacity.
+        assert self.past_context is not None
+        last = past_steps + current_steps - 1
+        slots = torch.arange(capacity, device=device)
+        keys_pos = (last - torch.remainder(last - slots, capacity)).view(1, -1)
+        queries_pos = torch.arange(past_steps, last + 1, device=device).view(-1, 1)
+        delta = queries_pos - keys_pos
+        valid = (keys_pos >= 0) & (delta >= 0) & (delta <= self.past_context)
+        return torch.where(
+            valid,
+            torch.zeros([], device=device, dtype=dtype),
+            torch.full([], float('-inf'), device=device, dtype=dtype))
+
     def _get_mask(self, current_steps: int, device: torch.device, dtype: torch.dtype):
         # Return a causal mask, accounting for potentially stored past keys/values
         # We actually return a bias for the attention score, as this has the same
@@ -240,12 +290,19 @@ class StreamingMultiheadAttention(StreamingModule):
             if current_steps == 1:
                 # If we only have one step, then we do not need a mask.
                 return None
-            elif 'past_keys' in self._streaming_state:
+            elif 'past_keys' in self._streaming_state or 'cache_end' in self._streaming_state:
                 raise RuntimeError("Not supported at the moment")
             else:
                 # Then we can safely use a lower triangular mask
                 return LowerTriangularMask()
-        if self._streaming_state:
+        if 'cache_end' in self._streaming_state:
+            past_steps = int(self._streaming_state['cache_end'])
+            if self._ring_step(current_steps):
+                capacity = self._streaming_state['cache_keys'].shape[time_dim]
+                return self._get_ring_mask(past_steps, current_steps, capacity, device, dtype)
+            if self.past_context is not None:
+                past_steps = min(past_steps, self.past_context)
+        elif self._streaming_state:
             past_keys = self._streaming_state['past_keys']
             past_steps = past_keys.shape[time_dim]
         else:
@@ -270,6 +327,8 @@ class StreamingMultiheadAttention(StreamingModule):
             # are already available, and streaming is with respect
             # to the queries only.
             return k, v
+        if self._is_streaming and self._kv_cache_steps is not None:
+            return self._complete_kv_cache(k, v)
         # Complete the key/value pair using the streaming state.
         if self._streaming_state:
             pk = self._streaming_state['past_keys']
@@ -297,10 +356,73 @@ class StreamingMultiheadAttention(StreamingModule):
                 self._streaming_state['offset'] = torch.tensor(0)
         return nk, nv
 
+    def _complete_kv_cache(self, k, v):
+        # Same as `_complete_kv`, writing the new keys and values in preallocated buffers.
+        time_dim = _get_attention_time_dimension(self.memory_efficient)
+        state = self._streaming_state
+        shared = v is k
+        steps = k.shape[time_dim]
+        ring_step = self._ring_step(steps)
+        end = int(state['cache_end']) if 'cache_end' in state else 0
+        if 'cache_keys' not in state:
+            assert self._kv_cache_steps is not None
+            if self._uses_kv_ring():
+                assert self.past_context is not None
+                capacity = self.past_context + 1
+            else:
+                capacity = steps + self._kv_cache_steps
+            state['cache_keys'] = _new_kv_buffer(k, capacity, time_dim)
+            if not shared:
+                state['cache_values'] = _new_kv_buffer(v, capacity, time_dim)
+        names = ['cache_keys'] if shared else ['cache_keys', 'cache_values']
+        capacity = state['cache_keys'].shape[time_dim]
+        state['cache_end'] = torch.tensor(end + steps)
+
+        if not self._uses_kv_ring():
+            if end + steps > capacity:
+                capacity = max(2 * capacity, end + steps)
+                for name in names:
+                    buffer = _new_kv_buffer(state[name], capacity, time_dim)
+                    buffer.narrow(time_dim, 0, end).copy_(state[name].narrow(time_dim, 0, end))
+                    state[name] = buffer
+            start = 0
+            if self.past_context is not None:
+                start = max(0, end - self.past_context)
+            completed = []
+            for name, x in zip(names, [k, v]):
+                state[name].narrow(time_dim, end, steps).copy_(x)
+                completed.append(state[name].narrow(time_dim, start, end + steps - start))
+            nk = completed[0]
+            return nk, (nk if shared else completed[1])
+
+        assert self.past_context is not None
+        device = state['cache_keys'].device
+        if ring_step:
+            completed = []
+            for name, x in zip(names, [k, v]):
+                slots = torch.remainder(torch.arange(end, end + steps, device=device), capacity)
+                state[name].index_copy_(time_dim, slots, x)
+                completed.append(state[name])
+        else:
+            # More steps than the ring can take at once: attend the ordered window, then keep its end.
+            window = min(end, self.past_context)
+            window_slots = torch.remainder(torch.arange(end - window, end, device=device), capacity)
+            kept = min(steps, capacity)
+            kept_slots = torch.remainder(torch.arange(end + steps - kept, end + steps, device=device), capacity)
+            completed = []
+            for name, x in zip(names, [k, v]):
+                completed.append(torch.cat([state[name].index_select(time_dim, window_slots), x], dim=time_dim))
+                state[name].index_copy_(time_dim, kept_slots, x.narrow(time_dim, steps - kept, kept))
+        nk = completed[0]
+        return nk, (nk if shared else completed[1])
+
     def _apply_rope(self, query: torch.Tensor, key: torch.Tensor):
         time_dim = _get_attention_time_dimension(self.memory_efficient)
         # Apply rope embeddings to query and key tensors.
         assert self.rope is not None
+        if 'cache_end' in self._streaming_state:
+            streaming_offset = int(self._streaming_state['cache_end'])
+            return self.rope.rotate_qk(query, key, start=streaming_offset, time_dim=time_dim)
         if 'past_keys' in self._streaming_state:
             past_keys_offset = self._streaming_state['past_keys'].shape[1]
         else:
@@ -690,6 +812,13 @@ class StreamingTransformer(StreamingModule):
         else:
             raise ValueError(f"Checkpointing method {method} is unknown.")
 
+    def set_kv_cache(self, max_steps: tp.Optional[int]):
+        """Preallocate the streaming keys and values of all self-attentions,
+        see `StreamingMultiheadAttention.set_kv_cache`."""
+        for module in self.modules():
+            if isinstance(module, StreamingMultiheadAttention) and not module.cross_attention:
+                module.set_kv_cache(max_steps)
+
     def forward(self, x: torch.Tensor, *args, **kwargs):
         B, T, C = x.shape
 
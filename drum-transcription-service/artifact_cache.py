@@ -0,0 +1,191 @@
+# Content-addressed cache for the outputs of transcription stages.
+import hashlib
+import json
+import os
+import threading
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+import joblib
+
+# Import project modules
+import config
+
+# Bump when a stage changes in a way that invalidates cached outputs.
+ARTIFACT_CACHE_VERSION = 1
+
+_MISSING = object()
+
+
+def write_atomic(path: str, write: Callable[[BinaryIO], Any]):
+    """
+    Writes a file through a temporary file renamed over it, so readers in
+    other processes or threads never see a partial file.
+
+    Args:
+        path: Path of the file.
+        write: Function writing the content to the binary file it is given.
+    """
+    temp_path = f"{path}.tmp{os.getpid()}-{threading.get_ident()}"
+    try:
+        with open(temp_path, "wb") as f:
+            write(f)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def file_digest(path: str, block_size: int = 1 << 20) -> str:
+    """
+    Computes the SHA-256 digest of a file's content.
+
+    Returns:
+        The hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def stage_key(stage: str, parent: str, stage_config: Dict[str, Any]) -> str:
+    """
+    Computes the key of a stage output.
+
+    The key chains the key of the stage input (or the input file digest) with
+    the stage name and configuration, so changing a stage invalidates it and
+    every stage downstream of it.
+
+    Args:
+        stage: Stage name.
+        parent: Key of the stage input.
+        stage_config: Settings the stage output depends on.
+
+    Returns:
+        The hex key.
+    """
+    payload = json.dumps(
+        {
+            "version": ARTIFACT_CACHE_VERSION,
+            "stage": stage,
+            "parent": parent,
+            "config": stage_config,
+        },
+        sort_keys=True,
+        default=repr,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ArtifactCache:
+    """
+    Stores stage outputs on disk under their stage key.
+
+    The modification time of an artifact records its last use. Once the
+    artifacts exceed the size budget, the least recently used ones are
+    deleted. Processes sharing the directory see the same times.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str],
+        max_bytes: int = config.ARTIFACT_CACHE_MAX_BYTES,
+    ):
+        """
+        Args:
+            cache_dir: Directory holding the artifacts, None to disable caching.
+            max_bytes: Size budget of the artifacts.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._evict_lock = threading.Lock()
+
+    def _path(self, stage: str, key: str) -> str:
+        return os.path.join(self.cache_dir, stage, f"{key}.joblib")
+
+    def _load(self, stage: str, key: str) -> Any:
+        if self.cache_dir is None:
+            return _MISSING
+        path = self._path(stage, key)
+        try:
+            value = joblib.load(path)
+        except FileNotFoundError:
+            return _MISSING
+        except Exception as e:
+            print(f"Ignoring unreadable cached {stage} output: {e}")
+            return _MISSING
+        try:
+            os.utime(path)  # Records the use for eviction
+        except OSError:
+            pass
+        return value
+
+    def store(self, stage: str, key: str, value: Any):
+        """
+        Stores a stage output.
+        The file is written under a temporary name and renamed, so concurrent
+        runs and threads never read a partial artifact.
+        """
+        if self.cache_dir is None:
+            return
+        path = self._path(stage, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_atomic(path, lambda f: joblib.dump(value, f))
+        self._evict()
+
+    def _artifacts(self) -> List[Tuple[float, int, str]]:
+        """Lists (last use, size, path) of the stored artifacts."""
+        artifacts = []
+        for root, _, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                if not filename.endswith(".joblib"):
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                artifacts.append((stat.st_mtime, stat.st_size, path))
+        return artifacts
+
+    def _evict(self):
+        """Deletes least recently used artifacts until the cache fits its budget."""
+        with self._evict_lock:
+            artifacts = self._artifacts()
+            total = sum(size for _, size, _ in artifacts)
+            for _, size, path in sorted(artifacts):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    @property
+    def total_bytes(self) -> int:
+        """Total size of the stored artifacts."""
+        if self.cache_dir is None:
+            return 0
+        return sum(size for _, size, _ in self._artifacts())
+
+    def fetch(self, stage: str, key: str, compute: Callable[[], Any]) -> Any:
+        """
+        Loads a stage output, computing and storing it on a miss.
+
+        Args:
+            stage: Stage name.
+            key: Stage key.
+            compute: Function computing the stage output.
+
+        Returns:
+            The stage output.
+        """
+        value = self._load(stage, key)
+        if value is not _MISSING:
+            print(f"Using cached {stage} output.")
+            return value
+        value = compute()
+        self.store(stage, key, value)
+        return value
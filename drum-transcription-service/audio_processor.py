@@ -1,7 +1,10 @@
 # Handles audio loading, onset detection, and feature extraction.
+import functools
+
 import librosa
 import numpy as np
-from typing import Tuple, List
+import scipy.fft
+from typing import Tuple
 
 # Import configuration
 import config
@@ -22,6 +25,13 @@ def load_audio(file_path: str) -> Tuple[np.ndarray, int]:
         raise
 
 
+def audio_duration(file_path: str) -> float:
+    """
+    Reads the duration of an audio file in seconds, without decoding it when possible.
+    """
+    return librosa.get_duration(path=file_path)
+
+
 def detect_onsets(waveform: np.ndarray, sr: int) -> np.ndarray:
     """
     Detects onset timestamps in a waveform.
@@ -29,33 +39,78 @@ def detect_onsets(waveform: np.ndarray, sr: int) -> np.ndarray:
     Returns:
         An array of timestamps in seconds.
     """
-    return librosa.onset.onset_detect(y=waveform, sr=sr, units="time", backtrack=True)
+    return AudioAnalysis(waveform, sr).onsets()
+
+
+def _onset_frames(
+    waveform: np.ndarray, starts: np.ndarray, lengths: np.ndarray, n_frames: int
+) -> np.ndarray:
+    """
+    Gathers centered STFT frames of the audio slice following each start sample.
+
+    Samples outside a slice are zero, as if each slice was analysed on its own.
+
+    Returns:
+        An array of shape [n_slices, n_frames, N_FFT].
+    """
+    pad = config.N_FFT // 2
+    span = np.arange((n_frames - 1) * config.HOP_LENGTH + config.N_FFT) - pad
+    positions = starts[:, None] + span
+    inside = (span >= 0) & (span < lengths[:, None])
+    padded = np.where(inside, waveform[np.clip(positions, 0, len(waveform) - 1)], 0.0)
+    frames = np.lib.stride_tricks.sliding_window_view(padded, config.N_FFT, axis=1)
+    return frames[:, :: config.HOP_LENGTH]
 
 
 def extract_features_for_onsets(
     waveform: np.ndarray, sr: int, onset_timestamps: np.ndarray
-) -> List[np.ndarray]:
+) -> np.ndarray:
     """
     Extracts a feature vector for each onset.
 
+    The feature vector is the mean MFCC of the window starting half a window
+    before the onset. Frames of all onsets are gathered from the waveform and
+    transformed in batches, giving the same result as running
+    librosa.feature.mfcc on every window separately.
+
     Returns:
-        A list of feature vectors (each vector is a NumPy array).
+        An array of shape [n_onsets, N_MFCC].
     """
-    feature_list = []
+    onset_timestamps = np.asarray(onset_timestamps, dtype=float)
+    features = np.empty((len(onset_timestamps), config.N_MFCC), dtype=np.float32)
+    if len(onset_timestamps) == 0 or len(waveform) == 0:
+        return features
+
+    waveform = np.asarray(waveform, dtype=np.float32)
     window_samples = int((config.ONSET_WINDOW_MS / 1000) * sr)
+    starts = np.maximum(0, (onset_timestamps * sr).astype(int) - window_samples // 2)
+    lengths = np.clip(len(waveform) - starts, 0, window_samples)
+    n_frames = 1 + window_samples // config.HOP_LENGTH
 
-    for timestamp in onset_timestamps:
-        onset_sample = int(timestamp * sr)
-        start = max(0, onset_sample - window_samples // 2)
-        end = start + window_samples
-        audio_slice = waveform[start:end]
+    window = librosa.filters.get_window("hann", config.N_FFT, fftbins=True).astype(
+        np.float32
+    )
+    mel_basis = librosa.filters.mel(sr=sr, n_fft=config.N_FFT)
 
-        # Calculate MFCCs and aggregate
-        mfccs = librosa.feature.mfcc(y=audio_slice, sr=sr, n_mfcc=config.N_MFCC)
-        feature_vector = np.mean(mfccs, axis=1)
-        feature_list.append(feature_vector)
+    for i in range(0, len(onset_timestamps), config.FEATURE_BATCH_SIZE):
+        batch = slice(i, i + config.FEATURE_BATCH_SIZE)
+        frames = _onset_frames(waveform, starts[batch], lengths[batch], n_frames)
+        spectrum = scipy.fft.rfft(frames * window, axis=-1)
+        power = spectrum.real**2 + spectrum.imag**2
+        mel_db = 10.0 * np.log10(np.maximum(power @ mel_basis.T, 1e-10))
 
-    return feature_list
+        # A slice of length L has 1 + L // hop frames; ignore the others
+        valid = np.arange(n_frames) <= lengths[batch, None] // config.HOP_LENGTH
+        peak = np.where(valid[..., None], mel_db, -np.inf).max(axis=(1, 2))
+        mel_db = np.maximum(mel_db, peak[:, None, None] - 80.0)
+
+        # The DCT is linear, so averaging before it equals averaging the MFCCs
+        mean_db = (mel_db * valid[..., None]).sum(axis=1) / valid.sum(axis=1)[:, None]
+        features[batch] = scipy.fft.dct(mean_db, axis=-1, type=2, norm="ortho")[
+            :, : config.N_MFCC
+        ]
+
+    return features
 
 
 def estimate_bpm(waveform: np.ndarray, sr: int) -> float:
@@ -65,5 +120,93 @@ def estimate_bpm(waveform: np.ndarray, sr: int) -> float:
     Returns:
         The estimated BPM as a float.
     """
-    bpm, _ = librosa.beat.beat_track(y=waveform, sr=sr)
-    return float(bpm)
+    return AudioAnalysis(waveform, sr).bpm()
+
+
+class AudioAnalysis:
+    """
+    Analysis of one waveform, computing every intermediate result once.
+
+    Onset detection and tempo estimation both start from the same mel
+    spectrogram, which librosa would otherwise recompute from the waveform
+    for each of them. Per-onset features keep their own short windows, as
+    their MFCCs are defined on the isolated window around each onset.
+    """
+
+    def __init__(self, waveform: np.ndarray, sr: int):
+        """
+        Args:
+            waveform: Mono waveform.
+            sr: Sample rate of the waveform.
+        """
+        self.waveform = waveform
+        self.sr = sr
+
+    @functools.cached_property
+    def mel_db(self) -> np.ndarray:
+        """Mel power spectrogram in dB, shape [n_mels, n_frames]."""
+        mel = librosa.feature.melspectrogram(
+            y=self.waveform,
+            sr=self.sr,
+            n_fft=config.N_FFT,
+            hop_length=config.HOP_LENGTH,
+        )
+        return librosa.power_to_db(mel)
+
+    def _onset_strength(self, aggregate) -> np.ndarray:
+        return librosa.onset.onset_strength(
+            S=self.mel_db,
+            sr=self.sr,
+            n_fft=config.N_FFT,
+            hop_length=config.HOP_LENGTH,
+            aggregate=aggregate,
+        )
+
+    @functools.cached_property
+    def onset_envelope(self) -> np.ndarray:
+        """Onset strength averaged over mel bands, used to detect onsets."""
+        return self._onset_strength(np.mean)
+
+    @functools.cached_property
+    def beat_envelope(self) -> np.ndarray:
+        """Onset strength with the median over mel bands, used to track beats."""
+        return self._onset_strength(np.median)
+
+    def onsets(self) -> np.ndarray:
+        """
+        Detects onset timestamps.
+
+        Returns:
+            An array of timestamps in seconds.
+        """
+        return librosa.onset.onset_detect(
+            onset_envelope=self.onset_envelope,
+            sr=self.sr,
+            hop_length=config.HOP_LENGTH,
+            units="time",
+            backtrack=True,
+        )
+
+    def bpm(self) -> float:
+        """
+        Estimates the tempo.
+
+        Returns:
+            The estimated BPM as a float.
+        """
+        bpm, _ = librosa.beat.beat_track(
+            onset_envelope=self.beat_envelope,
+            sr=self.sr,
+            hop_length=config.HOP_LENGTH,
+        )
+        # Recent librosa versions return the tempo as a one-element array
+        return float(np.atleast_1d(bpm)[0])
+
+    def features(self, onset_timestamps: np.ndarray) -> np.ndarray:
+        """
+        Extracts a feature vector for each onset (see extract_features_for_onsets).
+
+        Returns:
+            An array of shape [n_onsets, N_MFCC].
+        """
+        return extract_features_for_onsets(self.waveform, self.sr, onset_timestamps)
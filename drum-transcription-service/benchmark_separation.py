@@ -0,0 +1,233 @@
+# Compares the drum separation backends on the same files.
+# For every file, each backend separates the drums, onsets are detected on
+# its stem, and the onsets are scored against a reference: the drum hits of
+# a MIDI file next to the audio (song.wav + song.mid) when there is one, or
+# else the onsets found on the stem of the first backend.
+
+import argparse
+import json
+import os
+import time
+from typing import Dict, List
+
+import mido
+import numpy as np
+
+# Import project modules
+import config
+import audio_processor
+import source_separator
+from create_dataset import DRUM_MAP
+from transcribe import AUDIO_EXTENSIONS
+
+# Tolerance when matching an onset to a reference onset (as in MIREX)
+ONSET_TOLERANCE = 0.05
+
+
+def onset_f_measure(
+    reference: np.ndarray, estimated: np.ndarray, tolerance: float = ONSET_TOLERANCE
+) -> Dict[str, float]:
+    """
+    Scores estimated onsets against reference onsets.
+
+    Each reference onset matches at most one estimated onset within the
+    tolerance. Matching sorted onsets greedily in time order finds the
+    largest such matching.
+
+    Returns:
+        A dict with precision, recall and F-measure.
+    """
+    reference, estimated = np.sort(reference), np.sort(estimated)
+    matched = i = j = 0
+    while i < len(reference) and j < len(estimated):
+        if estimated[j] < reference[i] - tolerance:
+            j += 1
+        elif estimated[j] > reference[i] + tolerance:
+            i += 1
+        else:
+            matched += 1
+            i += 1
+            j += 1
+    precision = matched / len(estimated) if len(estimated) else 0.0
+    recall = matched / len(reference) if len(reference) else 0.0
+    f_measure = (
+        2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    )
+    return {
+        "precision": round(precision, 4),
+        "recall": round(recall, 4),
+        "f_measure": round(f_measure, 4),
+    }
+
+
+def midi_onsets(midi_path: str) -> np.ndarray:
+    """
+    Reads the times of the drum hits of a MIDI file.
+    Simultaneous hits count as one onset.
+
+    Returns:
+        A sorted array of onset times in seconds.
+    """
+    times = []
+    current_time_seconds = 0.0
+    for msg in mido.MidiFile(midi_path):
+        current_time_seconds += msg.time
+        if msg.type == "note_on" and msg.velocity > 0 and msg.note in DRUM_MAP:
+            times.append(current_time_seconds)
+    return np.unique(np.round(times, 3))
+
+
+def find_audio_files(paths: List[str]) -> List[str]:
+    """Expands directories into the audio files found under them."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, filenames in os.walk(path):
+                files.extend(
+                    os.path.join(root, filename)
+                    for filename in filenames
+                    if filename.lower().endswith(AUDIO_EXTENSIONS)
+                )
+        else:
+            files.append(path)
+    return sorted(files)
+
+
+def benchmark_file(
+    audio_path: str, backends: List[str], tolerance: float = ONSET_TOLERANCE
+) -> Dict:
+    """
+    Separates one file with every backend and scores the onsets of each.
+
+    Returns:
+        The result of every backend, with its runtime and onset scores.
+    """
+    waveform, sr = audio_processor.load_audio(audio_path)
+    duration = len(waveform) / sr
+
+    onsets_by_backend = {}
+    results = {}
+    for backend in backends:
+        start = time.perf_counter()
+        drums = source_separator.separate_drums(waveform, sr, backend=backend)
+        seconds = time.perf_counter() - start
+        onsets_by_backend[backend] = audio_processor.detect_onsets(drums, sr)
+        results[backend] = {
+            "seconds": round(seconds, 3),
+            "real_time_factor": round(seconds / duration, 4) if duration else None,
+            "onsets": len(onsets_by_backend[backend]),
+        }
+
+    midi_path = next(
+        (
+            os.path.splitext(audio_path)[0] + extension
+            for extension in (".mid", ".midi")
+            if os.path.exists(os.path.splitext(audio_path)[0] + extension)
+        ),
+        None,
+    )
+    if midi_path is not None:
+        reference_name, reference = midi_path, midi_onsets(midi_path)
+    else:
+        reference_name, reference = backends[0], onsets_by_backend[backends[0]]
+    for backend in backends:
+        results[backend].update(
+            onset_f_measure(reference, onsets_by_backend[backend], tolerance)
+        )
+
+    return {
+        "input": audio_path,
+        "audio_seconds": round(duration, 3),
+        "reference": reference_name,
+        "backends": results,
+    }
+
+
+def summarize(files: List[Dict], backends: List[str]) -> Dict[str, Dict]:
+    """Totals the runtime and averages the onset scores of every backend."""
+    summary = {}
+    audio_seconds = sum(result["audio_seconds"] for result in files)
+    for backend in backends:
+        runs = [result["backends"][backend] for result in files]
+        seconds = sum(run["seconds"] for run in runs)
+        summary[backend] = {
+            "seconds": round(seconds, 3),
+            "real_time_factor": (
+                round(seconds / audio_seconds, 4) if audio_seconds else None
+            ),
+            "mean_f_measure": round(float(np.mean([r["f_measure"] for r in runs])), 4),
+        }
+    return summary
+
+
+def main():
+    """Runs the separation benchmark."""
+    parser = argparse.ArgumentParser(
+        description="Compare drum separation backends on speed and onset accuracy."
+    )
+    parser.add_argument(
+        "inputs", nargs="+", help="Audio files or directories of audio files."
+    )
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        choices=sorted(source_separator.SEPARATION_BACKENDS),
+        default=["spleeter", "hpss"],
+        help="Backends to compare; the first one is the reference for files without MIDI.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=ONSET_TOLERANCE,
+        help="Onset matching tolerance in seconds.",
+    )
+    parser.add_argument(
+        "--output", type=str, default=None, help="Path of the JSON report."
+    )
+    args = parser.parse_args()
+
+    audio_files = find_audio_files(args.inputs)
+    if not audio_files:
+        print("No audio files to benchmark.")
+        return
+
+    # Model loading is not part of the per-file runtime
+    if "spleeter" in args.backends:
+        print("Loading the Spleeter model...")
+        source_separator.get_separator()
+
+    files = []
+    for i, audio_path in enumerate(audio_files):
+        print(f"[{i + 1}/{len(audio_files)}] {audio_path}")
+        result = benchmark_file(audio_path, args.backends, args.tolerance)
+        for backend, run in result["backends"].items():
+            print(
+                f"  {backend:>10}: {run['seconds']:7.2f} s "
+                f"(x{run['real_time_factor']} real time), "
+                f"F-measure {run['f_measure']:.3f}"
+            )
+        files.append(result)
+
+    summary = summarize(files, args.backends)
+    print("\n--- Summary ---")
+    for backend, totals in summary.items():
+        print(
+            f"{backend:>10}: {totals['seconds']:8.2f} s "
+            f"(x{totals['real_time_factor']} real time), "
+            f"mean F-measure {totals['mean_f_measure']:.3f}"
+        )
+
+    if args.output:
+        report = {
+            "sample_rate": config.TARGET_SR,
+            "tolerance": args.tolerance,
+            "summary": summary,
+            "files": files,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
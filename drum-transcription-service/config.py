@@ -6,10 +6,60 @@ ONSET_WINDOW_MS = (
     100  # Window size in milliseconds for feature extraction around an onset.
 )
 N_MFCC = 13  # Number of Mel-Frequency Cepstral Coefficients to compute.
+N_FFT = 2048  # FFT size of the spectrograms used for features.
+HOP_LENGTH = 512  # Hop length in samples between spectrogram frames.
+FEATURE_BATCH_SIZE = 256  # Onsets whose features are computed in one batch.
+
+# Source Separation Parameters
+SEPARATION_BACKEND = (
+    "spleeter"  # "spleeter" (4-stem model) or "hpss" (fast harmonic/percussive split).
+)
+HPSS_KERNEL_SIZE = 31  # Median filter length, in frames and bins, of the HPSS backend.
+HPSS_MARGIN = 1.0  # Percussive margin of the HPSS backend; larger keeps less residual.
+SEPARATION_CHUNK_SECONDS = 30.0  # Length of the windows separated one at a time.
+SEPARATION_OVERLAP_SECONDS = 2.0  # Crossfade between consecutive separation windows.
 
 # MIDI Generation Parameters
 DEFAULT_VELOCITY = 100  # Default MIDI velocity for detected notes.
 NOTE_DURATION_TICKS = 30  # A short, fixed duration for each drum hit in MIDI ticks.
+MIDI_QUANTIZE_BEATS = (
+    None  # Grid to snap hits to in beats (e.g. 0.25 for sixteenths), None for none.
+)
+MIDI_SEPARATE_TRACKS = (
+    True  # Write one track per instrument instead of a single drum track.
+)
+
+# Score Generation Parameters
+SCORE_GRID = 1  # Quantization grid of the score in sixteenth notes (2 for eighths).
+SCORE_BACKEND = (
+    "direct"  # "direct" builds MusicXML from onsets, "music21" converts the MIDI file.
+)
+
+# Artifact Cache
+ARTIFACT_CACHE_DIR = (
+    ".transcription_cache"  # Directory holding cached outputs of transcription stages.
+)
+ARTIFACT_CACHE_MAX_BYTES = 2 * 1024**3  # Size budget of the artifact cache.
+
+# Live Stream Transcription
+STREAM_BLOCK_SIZE = 512  # Samples per block of a live audio stream.
+STREAM_HISTORY_SECONDS = (
+    1.0  # Audio kept behind the newest block for backtracking and features.
+)
+
+# Transcription Server
+SERVER_HOST = "127.0.0.1"  # Interface the transcription server listens on.
+SERVER_PORT = 5100  # Port of the transcription server.
+SERVER_MAX_JOBS = 4  # Transcriptions analysed concurrently by the server.
+SERVER_INPUT_ROOT = (
+    None  # Directory requests may name files in; None accepts uploads only.
+)
+SERVER_BATCH_DELAY = (
+    0.01  # Seconds the server waits for more onsets to classify together.
+)
+SERVER_MAX_BATCH_ONSETS = (
+    4096  # Largest number of onsets classified in one predict call.
+)
 
 # Model Paths
 CLASSIFIER_MODEL_PATH = (
@@ -2,7 +2,11 @@
 # This script takes a clean drum audio track and a corresponding MIDI file
 # and slices the audio into labeled samples (kick, snare, hihat) for training.
 
+import argparse
 import os
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
 import mido
 import librosa
 import soundfile as sf
@@ -16,6 +20,10 @@ SLICE_WINDOW_MS = 120
 # The sample rate to use for all processing.
 TARGET_SR = 44100
 
+# Files of a packed dataset: all slices back to back, and where each one is.
+PACKED_SAMPLES_FILENAME = "samples.f32"
+PACKED_INDEX_FILENAME = "index.npz"
+
 # MIDI note numbers for common drum instruments (GM Standard).
 DRUM_MAP = {
     36: "kick",
@@ -28,31 +36,26 @@ DRUM_MAP = {
 }
 
 
-def create_labeled_slices(audio_path: str, midi_path: str):
-    """
-    Processes a single audio/MIDI pair to generate labeled audio slices.
+def extract_labeled_slices(
+    audio_path: str, midi_path: str
+) -> List[Tuple[str, np.ndarray]]:
     """
-    print(
-        f"\nProcessing pair: {os.path.basename(audio_path)} and {os.path.basename(midi_path)}"
-    )
+    Slices an audio/MIDI pair into labeled drum hits.
 
+    Returns:
+        A list of (instrument label, audio slice) tuples, in MIDI order.
+    """
     # 1. Load the audio file
-    try:
-        waveform, sr = librosa.load(audio_path, sr=TARGET_SR, mono=True)
-    except Exception as e:
-        print(f"  - Error loading audio file: {e}")
-        return
+    waveform, sr = librosa.load(audio_path, sr=TARGET_SR, mono=True)
 
     # 2. Load the MIDI file
-    try:
-        mid = mido.MidiFile(midi_path)
-    except Exception as e:
-        print(f"  - Error loading MIDI file: {e}")
-        return
+    mid = mido.MidiFile(midi_path)
 
     # 3. Iterate through MIDI messages to find drum hits
+    window_samples = int((SLICE_WINDOW_MS / 1000) * sr)
+    half_window = window_samples // 2
     current_time_seconds = 0.0
-    slice_count = 0
+    slices = []
     for msg in mid:
         # Accumulate delta times to get the absolute time of each message
         current_time_seconds += msg.time
@@ -64,55 +67,277 @@ def create_labeled_slices(audio_path: str, midi_path: str):
             if instrument_label:
                 # 4. Slice the audio at the note's timestamp
                 start_sample = int(current_time_seconds * sr)
-                window_samples = int((SLICE_WINDOW_MS / 1000) * sr)
-                half_window = window_samples // 2
-
                 audio_slice = waveform[
                     max(0, start_sample - half_window) : start_sample + half_window
                 ]
-
-                # 5. Save the slice to the appropriate directory
                 if len(audio_slice) > 0:
-                    # Create the instrument's directory if it doesn't exist
-                    instrument_dir = os.path.join(OUTPUT_DATASET_DIR, instrument_label)
-                    os.makedirs(instrument_dir, exist_ok=True)
+                    slices.append((instrument_label, audio_slice))
 
-                    # Generate a unique filename
-                    filename = f"{os.path.splitext(os.path.basename(audio_path))[0]}_{slice_count}.wav"
-                    output_path = os.path.join(instrument_dir, filename)
+    return slices
 
-                    sf.write(output_path, audio_slice, sr)
-                    slice_count += 1
 
-    print(f"  - Successfully created {slice_count} labeled slices.")
+def create_labeled_slices(audio_path: str, midi_path: str):
+    """
+    Processes a single audio/MIDI pair to generate labeled audio slices.
+    """
+    print(
+        f"\nProcessing pair: {os.path.basename(audio_path)} and {os.path.basename(midi_path)}"
+    )
 
+    try:
+        slices = extract_labeled_slices(audio_path, midi_path)
+    except Exception as e:
+        print(f"  - Error loading audio/MIDI pair: {e}")
+        return
 
-if __name__ == "__main__":
-    # --- Example Usage ---
-    # To use this, you need to find a song, get its MIDI drum track,
-    # and use Spleeter to get its clean drum audio track.
+    # 5. Save each slice to the appropriate directory
+    for slice_count, (instrument_label, audio_slice) in enumerate(slices):
+        # Create the instrument's directory if it doesn't exist
+        instrument_dir = os.path.join(OUTPUT_DATASET_DIR, instrument_label)
+        os.makedirs(instrument_dir, exist_ok=True)
 
-    # 1. Define the paths to your source files
-    #    (Replace these with your actual file paths)
-    drum_audio_file = "path/to/your/song_drums.wav"
-    drum_midi_file = "path/to/your/song_drums.mid"
+        # Generate a unique filename
+        filename = (
+            f"{os.path.splitext(os.path.basename(audio_path))[0]}_{slice_count}.wav"
+        )
+        output_path = os.path.join(instrument_dir, filename)
 
-    print("Starting dataset creation process...")
+        sf.write(output_path, audio_slice, TARGET_SR)
 
-    if os.path.exists(drum_audio_file) and os.path.exists(drum_midi_file):
-        create_labeled_slices(drum_audio_file, drum_midi_file)
-        print("\nDataset creation finished.")
-        print(f"Check the '{OUTPUT_DATASET_DIR}' directory for your new samples.")
-    else:
-        print("\n--- Please Read ---")
-        print("Could not find the example audio/MIDI files.")
-        print("To run this script, you need to:")
-        print(
-            "  1. Find a song that has a publicly available and accurate MIDI drum transcription."
-        )
-        print(
-            "  2. Use a tool like Spleeter to separate the drum audio from the original song."
-        )
-        print(
-            "  3. Update the 'drum_audio_file' and 'drum_midi_file' variables in this script to point to your files."
+    print(f"  - Successfully created {len(slices)} labeled slices.")
+
+
+def _extract_packed(audio_path: str, midi_path: str):
+    """Slices a pair in a worker process, returning arrays that pickle compactly."""
+    slices = extract_labeled_slices(audio_path, midi_path)
+    lengths = np.array([len(audio_slice) for _, audio_slice in slices], dtype=np.int64)
+    samples = (
+        np.concatenate([audio_slice for _, audio_slice in slices]).astype(np.float32)
+        if slices
+        else np.empty(0, dtype=np.float32)
+    )
+    return samples, lengths, [label for label, _ in slices]
+
+
+def build_packed_dataset(
+    pairs: List[Tuple[str, str]],
+    output_dir: str = OUTPUT_DATASET_DIR,
+    max_workers: Optional[int] = None,
+) -> Dict[str, int]:
+    """
+    Slices many audio/MIDI pairs in parallel into a packed dataset.
+
+    All slices are appended to one contiguous float32 file and described by
+    an index of offsets, lengths, labels and source pairs, so the dataset can
+    be memory-mapped instead of read as many small files. Slices are stored
+    in the order of the pairs, and of their notes within a pair.
+
+    Args:
+        pairs: (audio path, MIDI path) tuples.
+        output_dir: Directory receiving samples.f32 and index.npz.
+        max_workers: Worker processes (None for one per CPU).
+
+    Returns:
+        The number of slices per label.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    samples_path = os.path.join(output_dir, PACKED_SAMPLES_FILENAME)
+    index_path = os.path.join(output_dir, PACKED_INDEX_FILENAME)
+    temp_samples_path = samples_path + ".tmp"
+    temp_index_path = index_path + ".tmp"
+
+    offsets, lengths, label_ids, source_ids = [], [], [], []
+    label_names: List[str] = []
+    position = 0
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(pairs)))
+
+    def append(samples_file, source_id, future):
+        nonlocal position
+        audio_path = pairs[source_id][0]
+        try:
+            samples, pair_lengths, labels = future.result()
+        except Exception as e:
+            print(f"  - Error processing {os.path.basename(audio_path)}: {e}")
+            return
+        samples_file.write(samples.tobytes())
+        offsets.append(position + np.cumsum(pair_lengths) - pair_lengths)
+        lengths.append(pair_lengths)
+        for label in labels:
+            if label not in label_names:
+                label_names.append(label)
+        label_ids.append(
+            np.array([label_names.index(label) for label in labels], dtype=np.int32)
         )
+        source_ids.append(np.full(len(labels), source_id, dtype=np.int32))
+        position += len(samples)
+        print(f"  - {os.path.basename(audio_path)}: {len(labels)} slices")
+
+    try:
+        with open(temp_samples_path, "wb") as samples_file, ProcessPoolExecutor(
+            max_workers=workers
+        ) as executor:
+            futures = {
+                executor.submit(_extract_packed, audio_path, midi_path): source_id
+                for source_id, (audio_path, midi_path) in enumerate(pairs)
+            }
+            # Pairs are appended in input order whatever order they finish in,
+            # so the same pairs always give the same dataset
+            finished: Dict[int, Future] = {}
+            next_source_id = 0
+            for future in as_completed(futures):
+                finished[futures[future]] = future
+                while next_source_id in finished:
+                    append(samples_file, next_source_id, finished.pop(next_source_id))
+                    next_source_id += 1
+
+        def concat(arrays, dtype):
+            return np.concatenate(arrays) if arrays else np.empty(0, dtype=dtype)
+
+        label_ids = concat(label_ids, np.int32)
+        with open(temp_index_path, "wb") as f:
+            np.savez(
+                f,
+                offsets=concat(offsets, np.int64),
+                lengths=concat(lengths, np.int64),
+                label_ids=label_ids,
+                source_ids=concat(source_ids, np.int32),
+                label_names=np.array(label_names, dtype=str),
+                sources=np.array([audio_path for audio_path, _ in pairs], dtype=str),
+                sample_rate=TARGET_SR,
+            )
+        os.replace(temp_samples_path, samples_path)
+        os.replace(temp_index_path, index_path)
+    except BaseException:
+        # Leave no partial dataset behind
+        for temp_path in (temp_samples_path, temp_index_path):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        raise
+
+    return {name: int(np.sum(label_ids == i)) for i, name in enumerate(label_names)}
+
+
+class PackedDataset:
+    """
+    Read-only view of a packed dataset.
+
+    The samples file is memory-mapped, so slices are zero-copy views and only
+    the pages actually read are loaded.
+    """
+
+    def __init__(self, dataset_dir: str):
+        """
+        Args:
+            dataset_dir: Directory holding samples.f32 and index.npz.
+        """
+        with np.load(os.path.join(dataset_dir, PACKED_INDEX_FILENAME)) as index:
+            self.offsets = index["offsets"]
+            self.lengths = index["lengths"]
+            self.label_ids = index["label_ids"]
+            self.source_ids = index["source_ids"]
+            self.label_names = index["label_names"].tolist()
+            self.sources = index["sources"].tolist()
+            self.sample_rate = int(index["sample_rate"])
+        samples_path = os.path.join(dataset_dir, PACKED_SAMPLES_FILENAME)
+        if os.path.getsize(samples_path) == 0:
+            self.samples = np.empty(0, dtype=np.float32)
+        else:
+            self.samples = np.memmap(samples_path, dtype=np.float32, mode="r")
+
+    @property
+    def labels(self) -> np.ndarray:
+        """The label of every slice."""
+        return np.array(self.label_names, dtype=str)[self.label_ids]
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        """The audio of slice i, as a view of the mapped samples."""
+        return self.samples[self.offsets[i] : self.offsets[i] + self.lengths[i]]
+
+
+def find_pairs(directory: str) -> List[Tuple[str, str]]:
+    """
+    Finds audio/MIDI pairs sharing a file name (e.g. song.wav and song.mid).
+
+    Returns:
+        A sorted list of (audio path, MIDI path) tuples.
+    """
+    pairs = []
+    for root, _, filenames in os.walk(directory):
+        stems = {}
+        for filename in filenames:
+            stem, extension = os.path.splitext(filename)
+            stems.setdefault(stem, {})[extension.lower()] = os.path.join(root, filename)
+        for files in stems.values():
+            midi_path = files.get(".mid") or files.get(".midi")
+            audio_path = next(
+                (
+                    files[ext]
+                    for ext in (".wav", ".flac", ".mp3", ".ogg")
+                    if ext in files
+                ),
+                None,
+            )
+            if midi_path and audio_path:
+                pairs.append((audio_path, midi_path))
+    return sorted(pairs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create a labeled drum dataset.")
+    parser.add_argument(
+        "--pairs-dir",
+        type=str,
+        default=None,
+        help="Build a packed dataset from every audio/MIDI pair under this directory.",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=OUTPUT_DATASET_DIR,
+        help="Directory receiving the packed dataset.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes (default: one per CPU).",
+    )
+    args = parser.parse_args()
+
+    if args.pairs_dir:
+        pairs = find_pairs(args.pairs_dir)
+        print(f"Packing {len(pairs)} audio/MIDI pairs into '{args.output}'...")
+        counts = build_packed_dataset(pairs, args.output, args.workers)
+        print(f"\nDataset creation finished: {counts}")
+    else:
+        # --- Example Usage ---
+        # To use this, you need to find a song, get its MIDI drum track,
+        # and use Spleeter to get its clean drum audio track.
+
+        # 1. Define the paths to your source files
+        #    (Replace these with your actual file paths)
+        drum_audio_file = "path/to/your/song_drums.wav"
+        drum_midi_file = "path/to/your/song_drums.mid"
+
+        print("Starting dataset creation process...")
+
+        if os.path.exists(drum_audio_file) and os.path.exists(drum_midi_file):
+            create_labeled_slices(drum_audio_file, drum_midi_file)
+            print("\nDataset creation finished.")
+            print(f"Check the '{OUTPUT_DATASET_DIR}' directory for your new samples.")
+        else:
+            print("\n--- Please Read ---")
+            print("Could not find the example audio/MIDI files.")
+            print("To run this script, you need to:")
+            print(
+                "  1. Find a song that has a publicly available and accurate MIDI drum transcription."
+            )
+            print(
+                "  2. Use a tool like Spleeter to separate the drum audio from the original song."
+            )
+            print(
+                "  3. Update the 'drum_audio_file' and 'drum_midi_file' variables in this script to point to your files."
+            )
@@ -16,6 +16,7 @@ class InstrumentClassifier:
         Args:
             model_path: Path to a serialized scikit-learn model file.
         """
+        self.model_path = model_path
         try:
             self.model = joblib.load(model_path)
             print(f"Classifier model loaded from {model_path}")
@@ -45,13 +46,33 @@ class InstrumentClassifier:
         # 1. Extract features for all onsets
         feature_vectors = extract_features_for_onsets(waveform, sr, onset_timestamps)
 
-        if not feature_vectors:
+        # 2. Predict the class of every onset
+        return self.classify_features(onset_timestamps, feature_vectors)
+
+    def classify_features(
+        self, onset_timestamps: np.ndarray, feature_vectors: np.ndarray
+    ) -> List[Dict[str, Any]]:
+        """
+        Classifies onsets whose feature vectors were already extracted.
+
+        Args:
+            onset_timestamps: Onset times in seconds.
+            feature_vectors: One feature vector per onset, shape [n_onsets, n_features].
+
+        Returns:
+            A list of dictionaries, e.g., [{'time': 0.5, 'instrument': 'kick'}, ...]
+        """
+        if self.model is None:
+            print("Classifier not loaded. Cannot perform classification.")
+            return []
+
+        if len(feature_vectors) == 0:
             return []
 
-        # 2. Predict the class for each feature vector
+        # Predict the class for each feature vector
         predicted_labels = self.model.predict(feature_vectors)
 
-        # 3. Combine timestamps with predicted labels
+        # Combine timestamps with predicted labels
         classified_onsets = []
         for i, timestamp in enumerate(onset_timestamps):
             classified_onsets.append(
@@ -1,22 +1,106 @@
 # Generates a MIDI file from classified drum onsets.
-from mido import Message, MetaMessage, MidiFile, MidiTrack, bpm2tempo, second2tick
-from typing import List, Dict, Any
+import struct
+from mido import Message, MetaMessage, MidiFile, MidiTrack, bpm2tempo
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
 
 # Import configuration
 import config
 
+# Channel 9 is conventionally used for percussion in General MIDI
+DRUM_CHANNEL = 9
+NOTE_ON = 0x90 | DRUM_CHANNEL
+NOTE_OFF = 0x80 | DRUM_CHANNEL
+
+
+def _encode_varlen(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Encodes non-negative integers as MIDI variable-length quantities.
+
+    Returns:
+        A tuple of (bytes of shape [n, 4], number of bytes used per value).
+        The bytes of a value are left-aligned in its row.
+    """
+    values = values.astype(np.int64)
+    if len(values) and values.max() >= 1 << 28:
+        raise ValueError("Delta time too large for a MIDI file.")
+    lengths = 1 + (values >= 1 << 7) + (values >= 1 << 14) + (values >= 1 << 21)
+    encoded = np.zeros((len(values), 4), dtype=np.uint8)
+    for k in range(4):
+        shift = 7 * np.maximum(lengths - 1 - k, 0)
+        more = (k < lengths - 1).astype(np.int64) << 7
+        encoded[:, k] = ((values >> shift) & 0x7F) | more
+    return encoded, lengths
+
+
+def _encode_track(
+    meta: bytes,
+    ticks: np.ndarray,
+    status: np.ndarray,
+    notes: np.ndarray,
+    velocities: np.ndarray,
+) -> bytes:
+    """
+    Encodes a track chunk from sorted absolute event ticks.
+
+    Args:
+        meta: Already encoded events placed at tick 0 before the notes.
+        ticks: Absolute tick of every event, sorted.
+        status: Status byte of every event.
+        notes: Note number of every event.
+        velocities: Velocity of every event.
+
+    Returns:
+        The encoded MTrk chunk.
+    """
+    deltas = np.diff(ticks, prepend=0)
+    varlen, lengths = _encode_varlen(deltas)
+    # Running status: the status byte is omitted when it repeats
+    has_status = status != np.concatenate([[-1], status[:-1]])
+    sizes = lengths + has_status + 2
+    offsets = np.cumsum(sizes) - sizes
+    events = np.empty(int(sizes.sum()), dtype=np.uint8)
+    for k in range(4):
+        used = lengths > k
+        events[offsets[used] + k] = varlen[used, k]
+    data = offsets + lengths + has_status
+    events[(offsets + lengths)[has_status]] = status[has_status]
+    events[data] = notes
+    events[data + 1] = velocities
+    body = meta + events.tobytes() + b"\x00\xff\x2f\x00"  # End of track
+    return b"MTrk" + struct.pack(">I", len(body)) + body
+
+
+def _meta_event(meta_type: int, data: bytes) -> bytes:
+    """Encodes a meta event at delta time 0 (data shorter than 128 bytes)."""
+    return bytes([0x00, 0xFF, meta_type, len(data)]) + data
+
 
 class MidiGenerator:
-    def __init__(self, classified_onsets: List[Dict[str, Any]], bpm: float):
+    def __init__(
+        self,
+        classified_onsets: List[Dict[str, Any]],
+        bpm: float,
+        quantize_beats: Optional[float] = config.MIDI_QUANTIZE_BEATS,
+        separate_tracks: bool = config.MIDI_SEPARATE_TRACKS,
+        ticks_per_beat: int = 480,
+    ):
         """
         Initializes the generator with the necessary data.
 
         Args:
             classified_onsets: A list of dicts, e.g., [{'time': 1.23, 'instrument': 'kick'}, ...]
             bpm: The estimated beats per minute of the track.
+            quantize_beats: Grid to snap hits to, in beats (0.25 for sixteenths), None to keep exact times.
+            separate_tracks: Whether to write one track per instrument after a tempo track.
+            ticks_per_beat: MIDI resolution.
         """
-        self.classified_onsets = sorted(classified_onsets, key=lambda x: x["time"])
+        self.classified_onsets = classified_onsets
         self.bpm = bpm
+        self.quantize_beats = quantize_beats
+        self.separate_tracks = separate_tracks
+        self.ticks_per_beat = ticks_per_beat
         self.instrument_to_midi = {
             "kick": 36,
             "snare": 38,
@@ -24,71 +108,152 @@ class MidiGenerator:
             # Add more mappings as the classifier improves
         }
 
-    def generate_midi_file(self) -> MidiFile:
+    def _note_events(self) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
         """
-        Generates the final Mido MidiFile object.
-        """
-        mid = MidiFile(type=1)
-        track = MidiTrack()
-        mid.tracks.append(track)
+        Computes the note_on and note_off ticks of every instrument.
 
-        # Set the tempo
-        track.append(MetaMessage("set_tempo", tempo=bpm2tempo(self.bpm)))
+        Hits of an instrument on the same tick are merged, and a note_off
+        never extends past the next hit of the same instrument.
 
-        last_event_time_seconds = 0.0
+        Returns:
+            A dict mapping MIDI note numbers to (on ticks, off ticks) arrays.
+        """
+        if not self.classified_onsets:
+            return {}
+        times = np.fromiter(
+            (onset["time"] for onset in self.classified_onsets),
+            dtype=float,
+            count=len(self.classified_onsets),
+        )
+        labels = np.array([onset["instrument"] for onset in self.classified_onsets])
 
-        for onset in self.classified_onsets:
-            instrument = onset["instrument"]
-            midi_note = self.instrument_to_midi.get(instrument)
+        ticks = times * (self.bpm / 60.0) * self.ticks_per_beat
+        if self.quantize_beats:
+            grid = self.quantize_beats * self.ticks_per_beat
+            ticks = np.rint(ticks / grid) * grid
+        ticks = np.maximum(np.rint(ticks), 0).astype(np.int64)
 
+        events = {}
+        for instrument in np.unique(labels):
+            midi_note = self.instrument_to_midi.get(instrument)
             if midi_note is None:
                 print(f"Warning: Unknown instrument '{instrument}' found. Skipping.")
                 continue
+            on = np.unique(ticks[labels == instrument])
+            gaps = np.diff(on, append=on[-1] + config.NOTE_DURATION_TICKS)
+            off = on + np.minimum(gaps, config.NOTE_DURATION_TICKS)
+            events[midi_note] = (on, off)
+        return events
 
-            current_time_seconds = onset["time"]
-            delta_seconds = current_time_seconds - last_event_time_seconds
+    @staticmethod
+    def _merge(events: Dict[int, Tuple[np.ndarray, np.ndarray]]):
+        """
+        Merges note events into one stream sorted by tick.
+        At equal ticks note_off comes before note_on, so a note ending where
+        the next one starts does not cut it.
 
-            # Convert delta time from seconds to MIDI ticks
-            delta_ticks = second2tick(
-                delta_seconds, mid.ticks_per_beat, bpm2tempo(self.bpm)
-            )
+        Returns:
+            A tuple of (ticks, status bytes, note numbers, velocities).
+        """
+        ticks, status, notes = [], [], []
+        for midi_note, (on, off) in events.items():
+            ticks += [on, off]
+            status += [np.full(len(on), NOTE_ON), np.full(len(off), NOTE_OFF)]
+            notes += [np.full(len(on) + len(off), midi_note)]
+        if not ticks:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, empty, empty
+        ticks = np.concatenate(ticks)
+        status = np.concatenate(status)
+        notes = np.concatenate(notes)
+        order = np.lexsort((status == NOTE_ON, ticks))
+        status = status[order]
+        velocities = np.where(status == NOTE_ON, config.DEFAULT_VELOCITY, 0)
+        return ticks[order], status, notes[order], velocities
 
-            # Add note_on and note_off messages
-            # Channel 9 is conventionally used for percussion in General MIDI
-            track.append(
-                Message(
-                    "note_on",
-                    note=midi_note,
-                    velocity=config.DEFAULT_VELOCITY,
-                    time=round(delta_ticks),
-                    channel=9,
-                )
-            )
-            track.append(
-                Message(
-                    "note_off",
-                    note=midi_note,
-                    velocity=0,
-                    time=config.NOTE_DURATION_TICKS,
-                    channel=9,
-                )
-            )
+    def _track_events(self):
+        """
+        Lists the note events of every output track.
 
-            # Update the time of the last event
-            # Note: The duration of the note_off message also consumes time.
-            duration_seconds = (config.NOTE_DURATION_TICKS / mid.ticks_per_beat) * (
-                60 / self.bpm
-            )
-            last_event_time_seconds = current_time_seconds + duration_seconds
+        Returns:
+            A list of (track name, ticks, status, notes, velocities) tuples.
+        """
+        events = self._note_events()
+        if not self.separate_tracks:
+            return [("Drums",) + self._merge(events)]
+        midi_to_instrument = {
+            note: name for name, note in self.instrument_to_midi.items()
+        }
+        return [
+            (midi_to_instrument[midi_note],)
+            + self._merge({midi_note: events[midi_note]})
+            for midi_note in sorted(events)
+        ]
 
+    def generate_midi_file(self) -> MidiFile:
+        """
+        Generates the final Mido MidiFile object.
+        """
+        mid = MidiFile(type=1, ticks_per_beat=self.ticks_per_beat)
+        tempo = MetaMessage("set_tempo", tempo=bpm2tempo(self.bpm))
+
+        tracks = self._track_events()
+        if self.separate_tracks:
+            mid.tracks.append(MidiTrack([tempo]))
+        for i, (name, ticks, status, notes, velocities) in enumerate(tracks):
+            track = MidiTrack()
+            if not self.separate_tracks:
+                track.append(tempo)
+            track.append(MetaMessage("track_name", name=name))
+            deltas = np.diff(ticks, prepend=0).tolist()
+            for delta, is_on, note, velocity in zip(
+                deltas,
+                (status == NOTE_ON).tolist(),
+                notes.tolist(),
+                velocities.tolist(),
+            ):
+                track.append(
+                    Message(
+                        "note_on" if is_on else "note_off",
+                        note=note,
+                        velocity=velocity,
+                        time=delta,
+                        channel=DRUM_CHANNEL,
+                    )
+                )
+            mid.tracks.append(track)
         return mid
 
+    def to_bytes(self) -> bytes:
+        """
+        Encodes the Standard MIDI File directly from the event arrays.
+        Equivalent to saving generate_midi_file(), without creating a
+        message object per event.
+        """
+        tempo = _meta_event(0x51, bpm2tempo(self.bpm).to_bytes(3, "big"))
+        tracks = self._track_events()
+        chunks = []
+        if self.separate_tracks:
+            chunks.append(
+                b"MTrk"
+                + struct.pack(">I", len(tempo) + 4)
+                + tempo
+                + b"\x00\xff\x2f\x00"
+            )
+        for name, ticks, status, notes, velocities in tracks:
+            meta = _meta_event(0x03, name.encode("latin-1"))
+            if not self.separate_tracks:
+                meta = tempo + meta
+            chunks.append(_encode_track(meta, ticks, status, notes, velocities))
+        header = b"MThd" + struct.pack(">IHHH", 6, 1, len(chunks), self.ticks_per_beat)
+        return header + b"".join(chunks)
+
     def save_to_file(self, output_path: str):
         """
         Saves the generated MIDI data to a .mid file.
         """
-        midi_file = self.generate_midi_file()
-        midi_file.save(output_path)
+        with open(output_path, "wb") as f:
+            f.write(self.to_bytes())
         print(f"MIDI file saved to {output_path}")
 
 
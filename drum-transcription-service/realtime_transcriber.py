@@ -0,0 +1,320 @@
+# Transcribes drum hits from a live audio stream as they happen.
+# Audio arrives in blocks; onsets are detected incrementally with the same
+# spectral flux and peak picking rules as the offline pipeline, and every
+# detected hit is classified by the InstrumentClassifier as soon as the
+# analysis window around it has been received.
+
+import argparse
+import time
+from typing import Any, Dict, Iterator, List
+
+import librosa
+import numpy as np
+
+# Import project modules
+import config
+import audio_processor
+from instrument_classifier import InstrumentClassifier
+
+
+def iter_file_blocks(
+    file_path: str, block_size: int = config.STREAM_BLOCK_SIZE, realtime: bool = False
+) -> Iterator[np.ndarray]:
+    """
+    Plays an audio file as a stream of blocks, standing in for a live input.
+
+    Args:
+        file_path: Path to the audio file.
+        block_size: Samples per block.
+        realtime: Whether to wait for the duration of each block before yielding it.
+
+    Yields:
+        Consecutive mono blocks at the target sample rate.
+    """
+    waveform, sr = audio_processor.load_audio(file_path)
+    start_time = time.perf_counter()
+    for start in range(0, len(waveform), block_size):
+        if realtime:
+            delay = start_time + (start + block_size) / sr - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        yield waveform[start : start + block_size]
+
+
+class StreamingTranscriber:
+    """
+    Detects and classifies drum onsets incrementally.
+
+    Each STFT frame is computed once its samples have arrived. Its log-mel
+    spectral flux extends the onset envelope, and a frame is accepted as a
+    peak with librosa's onset_detect rules once the frames it is compared to
+    have arrived. Where offline analysis uses the maximum of the whole take
+    (the dB floor and the envelope normalization), each frame uses the
+    running maximum up to the last frame it is compared to, so the hits do
+    not depend on the block size. The peak is backtracked to the preceding
+    envelope minimum and classified from the same feature window as offline.
+
+    A hit is emitted when the stream has advanced by the peak picking
+    lookahead past the peak, so it is detected at most latency_seconds plus
+    one block after its peak, and that plus the attack length after the
+    backtracked onset time.
+    """
+
+    def __init__(self, classifier: InstrumentClassifier, sr: int = config.TARGET_SR):
+        """
+        Args:
+            classifier: Loaded instrument classifier.
+            sr: Sample rate of the stream.
+        """
+        self.classifier = classifier
+        self.sr = sr
+        n_fft, hop = config.N_FFT, config.HOP_LENGTH
+        # Peak picking parameters of librosa.onset.onset_detect, in frames
+        self.pre_max = int(0.03 * sr // hop)
+        self.post_max = int(0.00 * sr // hop + 1)
+        self.pre_avg = int(0.10 * sr // hop)
+        self.post_avg = int(0.10 * sr // hop + 1)
+        self.wait = int(0.03 * sr // hop)
+        self.delta = 0.07
+
+        self._window = librosa.filters.get_window("hann", n_fft, fftbins=True).astype(
+            np.float32
+        )
+        self._mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft)
+        window_samples = int((config.ONSET_WINDOW_MS / 1000) * sr)
+        # Audio and envelope history needed behind the newest frame
+        self._history_samples = max(
+            int(config.STREAM_HISTORY_SECONDS * sr), n_fft + window_samples
+        )
+        self._history_frames = self._history_samples // hop
+        # Backtracking searches a fixed span, well inside the retained history
+        self._backtrack_frames = self._history_frames // 2
+
+        # Centered frames: the stream starts with half a frame of silence
+        self._audio = np.zeros(n_fft // 2, dtype=np.float32)
+        self._audio_start = -(n_fft // 2)  # Stream sample of self._audio[0]
+        self._received = 0  # Stream samples received
+        self._next_frame = 0  # Next STFT frame to compute
+        self._previous_mel = None
+        self._mel_peak = -np.inf
+        # librosa's onset envelope lags the centered frames by half an FFT
+        # frame; the same lag keeps onset times equal to the offline ones
+        self._envelope = np.zeros(n_fft // (2 * hop), dtype=np.float32)
+        self._envelope_start = 0  # Frame of self._envelope[0]
+        self._envelope_max = np.zeros_like(self._envelope)  # Running maximum
+        self._next_candidate = 0  # Next frame to test as a peak
+
+    @property
+    def latency_seconds(self) -> float:
+        """
+        Delay between an onset peak and the end of the audio needed to emit it.
+
+        Backtracking then dates the hit to the start of its attack, so the
+        delay after the reported time is longer by the attack length.
+        """
+        return (self.post_avg - 1) * config.HOP_LENGTH / self.sr
+
+    def _compute_frames(self):
+        """Extends the onset envelope with the frames whose samples have all arrived."""
+        n_fft, hop = config.N_FFT, config.HOP_LENGTH
+        last_frame = (self._received - n_fft // 2) // hop  # Inclusive
+        if last_frame < self._next_frame:
+            return
+        first = self._next_frame * hop - n_fft // 2 - self._audio_start
+        stop = last_frame * hop + n_fft // 2 - self._audio_start
+        frames = np.lib.stride_tricks.sliding_window_view(
+            self._audio[first:stop], n_fft
+        )[::hop]
+        spectrum = np.fft.rfft(frames * self._window, axis=-1)
+        power = spectrum.real**2 + spectrum.imag**2
+        mel_db = 10.0 * np.log10(np.maximum(power @ self._mel_basis.T, 1e-10))
+        # Floor at 80 dB below the loudest frame so far, as power_to_db does
+        mel_peak = np.maximum.accumulate(np.maximum(mel_db.max(axis=1), self._mel_peak))
+        mel_db = np.maximum(mel_db, mel_peak[:, None] - 80.0)
+        self._mel_peak = float(mel_peak[-1])
+
+        previous = mel_db[0] if self._previous_mel is None else self._previous_mel
+        flux = np.diff(mel_db, axis=0, prepend=previous[None])
+        envelope = np.maximum(flux, 0.0).mean(axis=1).astype(np.float32)
+        self._previous_mel = mel_db[-1]
+        running_max = np.maximum.accumulate(
+            np.maximum(envelope, self._envelope_max[-1])
+        )
+        self._envelope = np.concatenate([self._envelope, envelope])
+        self._envelope_max = np.concatenate([self._envelope_max, running_max])
+        self._next_frame = last_frame + 1
+
+    def _backtrack(self, frame: int) -> int:
+        """Moves an onset back to the closest envelope minimum before it."""
+        first = max(frame - self._backtrack_frames, 0)
+        energy = self._envelope[
+            first - self._envelope_start : frame - self._envelope_start + 2
+        ]
+        minima = (
+            np.flatnonzero((energy[1:-1] <= energy[:-2]) & (energy[1:-1] < energy[2:]))
+            + 1
+        )
+        minima = minima[minima <= frame - first]
+        if len(minima) == 0:
+            return first
+        return int(minima[-1]) + first
+
+    def _pick_peaks(self, final: bool = False) -> List[int]:
+        """
+        Decides the candidate frames whose lookahead has arrived.
+
+        Returns:
+            The backtracked onset frames found.
+        """
+        onsets = []
+        envelope_end = self._envelope_start + len(self._envelope)
+        offset = self._envelope_start
+        x = self._envelope
+        while self._next_candidate < envelope_end and (
+            final or self._next_candidate + self.post_avg <= envelope_end
+        ):
+            n = self._next_candidate
+            self._next_candidate += 1
+            value = x[n - offset]
+            if (
+                value
+                < x[
+                    max(0, n - self.pre_max) - offset : n + self.post_max - offset
+                ].max()
+            ):
+                continue
+            end = min(n + self.post_avg, envelope_end)
+            average = x[max(0, n - self.pre_avg) - offset : end - offset].mean()
+            # delta applies to the envelope normalized by its maximum so far
+            peak = self._envelope_max[end - 1 - offset] or 1.0
+            if value < average + self.delta * peak:
+                continue
+            self._next_candidate = n + self.wait + 1
+            onsets.append(self._backtrack(n))
+        return onsets
+
+    def _classify(self, onset_frames: List[int]) -> List[Dict[str, Any]]:
+        """Classifies onsets from the feature window around each."""
+        if not onset_frames:
+            return []
+        onset_samples = np.asarray(onset_frames) * config.HOP_LENGTH
+        relative = (onset_samples - self._audio_start) / self.sr
+        features = audio_processor.extract_features_for_onsets(
+            self._audio, self.sr, relative
+        )
+        return self.classifier.classify_features(onset_samples / self.sr, features)
+
+    def _trim(self):
+        """Drops audio and envelope frames no longer needed."""
+        keep_from = self._received - self._history_samples
+        if keep_from - self._audio_start > self._history_samples:
+            self._audio = self._audio[keep_from - self._audio_start :]
+            self._audio_start = keep_from
+        keep_frame = self._next_candidate - self._history_frames
+        if keep_frame - self._envelope_start > self._history_frames:
+            self._envelope = self._envelope[keep_frame - self._envelope_start :]
+            self._envelope_max = self._envelope_max[keep_frame - self._envelope_start :]
+            self._envelope_start = keep_frame
+
+    def process_block(self, block: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        Feeds the next block of the stream.
+
+        Args:
+            block: Mono samples at the stream sample rate.
+
+        Returns:
+            The hits confirmed by this block, e.g., [{'time': 0.5, 'instrument': 'kick'}, ...]
+            with times in seconds from the start of the stream.
+        """
+        self._audio = np.concatenate([self._audio, np.asarray(block, np.float32)])
+        self._received += len(block)
+        self._compute_frames()
+        hits = self._classify(self._pick_peaks())
+        self._trim()
+        return hits
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """
+        Ends the stream, deciding the frames still waiting for lookahead.
+
+        Returns:
+            The remaining hits.
+        """
+        # Half a frame of silence completes the last frames, as offline
+        self._audio = np.concatenate(
+            [self._audio, np.zeros(config.N_FFT // 2, dtype=np.float32)]
+        )
+        self._received += config.N_FFT // 2
+        self._compute_frames()
+        return self._classify(self._pick_peaks(final=True))
+
+
+def transcribe_stream(
+    blocks: Iterator[np.ndarray], transcriber: StreamingTranscriber
+) -> Iterator[Dict[str, Any]]:
+    """
+    Runs a transcriber over a stream of blocks.
+
+    Yields:
+        Classified hits as soon as they are confirmed, each with the stream
+        position ('detected_at', in seconds) at which it was emitted.
+    """
+    position = 0
+    for block in blocks:
+        position += len(block)
+        for hit in transcriber.process_block(block):
+            yield dict(hit, detected_at=position / transcriber.sr)
+    for hit in transcriber.flush():
+        yield dict(hit, detected_at=position / transcriber.sr)
+
+
+def main():
+    """Transcribes an audio file played as a live stream."""
+    parser = argparse.ArgumentParser(
+        description="Transcribe drum hits from a (simulated) live stream."
+    )
+    parser.add_argument(
+        "--input", type=str, required=True, help="Audio file played as the stream."
+    )
+    parser.add_argument(
+        "--block-size",
+        type=int,
+        default=config.STREAM_BLOCK_SIZE,
+        help="Samples per stream block.",
+    )
+    parser.add_argument(
+        "--realtime",
+        action="store_true",
+        help="Play the file at its real speed instead of as fast as possible.",
+    )
+    args = parser.parse_args()
+
+    classifier = InstrumentClassifier()
+    if not classifier.model:
+        print("Cannot proceed without a trained classifier model.")
+        return
+
+    transcriber = StreamingTranscriber(classifier)
+    print(
+        f"Detection latency: {transcriber.latency_seconds * 1000:.0f} ms + one block "
+        "after each peak"
+    )
+    latencies = []
+    start_time = time.time()
+    blocks = iter_file_blocks(args.input, args.block_size, args.realtime)
+    for hit in transcribe_stream(blocks, transcriber):
+        latency = hit["detected_at"] - hit["time"]
+        latencies.append(latency)
+        print(
+            f"{hit['time']:8.3f} s  {hit['instrument']:<6}  "
+            f"(detected after {latency * 1000:.0f} ms)"
+        )
+
+    print(f"\n{len(latencies)} hits in {time.time() - start_time:.2f} seconds.")
+    if latencies:
+        print(f"Maximum detection latency: {max(latencies) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,305 @@
-# Generates a musical score (e.g., MusicXML) from a MIDI file.
-from music21 import converter, stream
+# Generates a musical score (e.g., MusicXML) from classified onsets or a MIDI file.
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Import project modules
+import config
+from artifact_cache import write_atomic
+
+# Notation of each instrument on a percussion staff:
+# (GM note number, display step, display octave, notehead or None)
+DRUM_NOTATION = {
+    "kick": (36, "F", 4, None),
+    "snare": (38, "C", 5, None),
+    "hihat": (42, "G", 5, "x"),
+}
+
+# Notes formatted per chunk when streaming a practice app score
+PRACTICE_CHUNK_NOTES = 4096
+
+# Durations are counted in sixteenths, i.e. 4 MusicXML divisions per quarter
+MEASURE_SIXTEENTHS = 16  # 4/4 time
+
+# Note types by duration in sixteenths, longest first: (sixteenths, type, dotted)
+NOTE_VALUES = [
+    (16, "whole", False),
+    (12, "half", True),
+    (8, "half", False),
+    (6, "quarter", True),
+    (4, "quarter", False),
+    (3, "eighth", True),
+    (2, "eighth", False),
+    (1, "16th", False),
+]
+
+
+def _split_duration(sixteenths: int) -> List[Tuple[int, str, bool]]:
+    """
+    Splits a duration into notatable values, longest first.
+
+    Returns:
+        A list of (sixteenths, type, dotted) tuples.
+    """
+    values = []
+    for length, note_type, dotted in NOTE_VALUES:
+        while sixteenths >= length:
+            values.append((length, note_type, dotted))
+            sixteenths -= length
+    return values
+
+
+class DrumScoreBuilder:
+    """
+    Builds a MusicXML drum score straight from classified onsets.
+
+    Onsets are quantized to a grid of config.SCORE_GRID sixteenths in 4/4.
+    Simultaneous hits form chords, each chord lasts until the next hit (or
+    the end of the measure) and the remaining gaps are filled with rests.
+    """
+
+    def __init__(self, classified_onsets: List[Dict[str, Any]], bpm: float):
+        """
+        Initializes the builder with the necessary data.
+
+        Args:
+            classified_onsets: A list of dicts, e.g., [{'time': 1.23, 'instrument': 'kick'}, ...]
+            bpm: The estimated beats per minute of the track.
+        """
+        self.classified_onsets = classified_onsets
+        self.bpm = bpm
+
+    def _quantize(self) -> Tuple[np.ndarray, List[str]]:
+        """
+        Quantizes the onsets to the score grid.
+
+        Returns:
+            A tuple of (sorted grid positions in sixteenths, instrument of each).
+        """
+        times, instruments = [], []
+        for onset in self.classified_onsets:
+            if onset["instrument"] in DRUM_NOTATION:
+                times.append(onset["time"])
+                instruments.append(onset["instrument"])
+            else:
+                print(
+                    f"Warning: Unknown instrument '{onset['instrument']}' found. Skipping."
+                )
+        sixteenths = np.asarray(times, dtype=float) * self.bpm / 60.0 * 4
+        grid = config.SCORE_GRID
+        positions = np.maximum(np.rint(sixteenths / grid).astype(int) * grid, 0)
+        order = np.argsort(positions, kind="stable")
+        return positions[order], [instruments[i] for i in order]
+
+    def to_musicxml(self) -> str:
+        """
+        Renders the score as a MusicXML document.
+        """
+        positions, instruments = self._quantize()
+        n_measures = (
+            int(positions[-1]) // MEASURE_SIXTEENTHS + 1 if len(positions) else 1
+        )
+
+        # Hits grouped by grid position, in order of appearance
+        chords: Dict[int, List[str]] = {}
+        for position, instrument in zip(positions.tolist(), instruments):
+            hits = chords.setdefault(position, [])
+            if instrument not in hits:
+                hits.append(instrument)
+        chord_starts = sorted(chords)
+
+        out = [
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<!DOCTYPE score-partwise PUBLIC "-//Recordare//DTD MusicXML 4.0 Partwise//EN" '
+            '"http://www.musicxml.org/dtds/partwise.dtd">\n'
+            '<score-partwise version="4.0">\n'
+            "<part-list>\n"
+            '<score-part id="P1">\n<part-name>Drums</part-name>\n'
+        ]
+        for name, (note, _, _, _) in DRUM_NOTATION.items():
+            out.append(
+                f'<score-instrument id="P1-I{note}"><instrument-name>{name}'
+                f"</instrument-name></score-instrument>\n"
+            )
+        for name, (note, _, _, _) in DRUM_NOTATION.items():
+            out.append(
+                f'<midi-instrument id="P1-I{note}"><midi-channel>10</midi-channel>'
+                f"<midi-unpitched>{note + 1}</midi-unpitched></midi-instrument>\n"
+            )
+        out.append('</score-part>\n</part-list>\n<part id="P1">\n')
+
+        def rest(duration: int, note_type: str, dotted: bool):
+            out.append(
+                f"<note><rest/><duration>{duration}</duration><voice>1</voice>"
+                f"<type>{note_type}</type>{'<dot/>' if dotted else ''}</note>\n"
+            )
+
+        next_chord = 0
+        for measure in range(n_measures):
+            start = measure * MEASURE_SIXTEENTHS
+            stop = start + MEASURE_SIXTEENTHS
+            out.append(f'<measure number="{measure + 1}">\n')
+            if measure == 0:
+                out.append(
+                    "<attributes><divisions>4</divisions>"
+                    "<key><fifths>0</fifths></key>"
+                    "<time><beats>4</beats><beat-type>4</beat-type></time>"
+                    "<clef><sign>percussion</sign></clef></attributes>\n"
+                    '<direction placement="above"><direction-type><metronome>'
+                    f"<beat-unit>quarter</beat-unit><per-minute>{self.bpm:.0f}</per-minute>"
+                    f'</metronome></direction-type><sound tempo="{self.bpm:.2f}"/></direction>\n'
+                )
+
+            cursor = start
+            while next_chord < len(chord_starts) and chord_starts[next_chord] < stop:
+                position = chord_starts[next_chord]
+                next_chord += 1
+                for duration, note_type, dotted in _split_duration(position - cursor):
+                    rest(duration, note_type, dotted)
+                end = stop
+                if next_chord < len(chord_starts):
+                    end = min(end, chord_starts[next_chord])
+                # The chord takes the longest notatable value, rests fill the gap
+                parts = _split_duration(end - position)
+                duration, note_type, dotted = parts[0]
+                for i, instrument in enumerate(chords[position]):
+                    note, step, octave, notehead = DRUM_NOTATION[instrument]
+                    out.append(
+                        f"<note>{'<chord/>' if i else ''}<unpitched>"
+                        f"<display-step>{step}</display-step>"
+                        f"<display-octave>{octave}</display-octave></unpitched>"
+                        f"<duration>{duration}</duration>"
+                        f'<instrument id="P1-I{note}"/><voice>1</voice>'
+                        f"<type>{note_type}</type>{'<dot/>' if dotted else ''}"
+                        f"<stem>up</stem>"
+                        f"{f'<notehead>{notehead}</notehead>' if notehead else ''}</note>\n"
+                    )
+                for duration, note_type, dotted in parts[1:]:
+                    rest(duration, note_type, dotted)
+                cursor = end
+            for duration, note_type, dotted in _split_duration(stop - cursor):
+                rest(duration, note_type, dotted)
+            out.append("</measure>\n")
+
+        out.append("</part>\n</score-partwise>\n")
+        return "".join(out)
+
+    def save_to_musicxml(self, output_path: str):
+        """
+        Saves the score to a MusicXML file.
+        """
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(self.to_musicxml())
+        print(f"Score saved to MusicXML file: {output_path}")
+
+
+class PracticeScoreWriter:
+    """
+    Writes classified onsets as a score of the e-drum practice app.
+
+    The score is JSON with 'metadata' (title, artist, bpm, duration in ms,
+    difficulty) and 'notes', a list of {"time": <ms>, "note": <GM note>}
+    sorted by time, as in e-drum-practice-app/scores/basic_rock.json.
+    Notes are formatted in chunks straight from arrays, so long tracks are
+    written without building the whole document in memory.
+    """
+
+    def __init__(
+        self,
+        classified_onsets: List[Dict[str, Any]],
+        bpm: float,
+        title: str = "Transcription",
+        duration_ms: Optional[int] = None,
+    ):
+        """
+        Initializes the writer with the necessary data.
+
+        Args:
+            classified_onsets: A list of dicts, e.g., [{'time': 1.23, 'instrument': 'kick'}, ...]
+            bpm: The estimated beats per minute of the track.
+            title: Title shown by the practice app.
+            duration_ms: Length of the chart, by default up to the end of the measure of the last note.
+        """
+        self.classified_onsets = classified_onsets
+        self.bpm = bpm
+        self.title = title
+        self.duration_ms = duration_ms
+
+    def _notes(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Converts the onsets to practice app notes.
+        Hits of the same instrument in the same millisecond are merged.
+
+        Returns:
+            A tuple of (times in ms, GM note numbers), sorted by time then note.
+        """
+        times, notes = [], []
+        for onset in self.classified_onsets:
+            notation = DRUM_NOTATION.get(onset["instrument"])
+            if notation is None:
+                print(
+                    f"Warning: Unknown instrument '{onset['instrument']}' found. Skipping."
+                )
+                continue
+            times.append(onset["time"])
+            notes.append(notation[0])
+        times = np.maximum(np.rint(np.asarray(times, dtype=float) * 1000), 0)
+        pairs = np.unique(
+            np.stack([times.astype(np.int64), np.asarray(notes, dtype=np.int64)]),
+            axis=1,
+        )
+        return pairs[0], pairs[1]
+
+    def iter_json(self) -> Iterator[str]:
+        """
+        Yields the score document in chunks.
+        """
+        times, notes = self._notes()
+        duration_ms = self.duration_ms
+        if duration_ms is None:
+            measure_ms = 4 * 60000.0 / self.bpm
+            last = times[-1] if len(times) else 0
+            duration_ms = int((last // measure_ms + 1) * measure_ms)
+        metadata = {
+            "title": self.title,
+            "artist": "Transcription",
+            "bpm": round(float(self.bpm), 2),
+            "duration": int(duration_ms),
+            "difficulty": "Unrated",
+        }
+        metadata_json = json.dumps(metadata, indent=2).replace("\n", "\n  ")
+        yield f'{{\n  "metadata": {metadata_json},\n  "notes": ['
+        for i in range(0, len(times), PRACTICE_CHUNK_NOTES):
+            chunk = zip(
+                times[i : i + PRACTICE_CHUNK_NOTES].tolist(),
+                notes[i : i + PRACTICE_CHUNK_NOTES].tolist(),
+            )
+            yield ("," if i else "") + ",".join(
+                f'\n    {{ "time": {time}, "note": {note} }}' for time, note in chunk
+            )
+        yield "\n  ]\n}\n" if len(times) else "]\n}\n"
+
+    def save(self, output_path: str):
+        """
+        Saves the score to a JSON file.
+        """
+
+        def write(f):
+            for chunk in self.iter_json():
+                f.write(chunk.encode("utf-8"))
+
+        write_atomic(output_path, write)
+        print(f"Practice score saved to JSON file: {output_path}")
 
 
 class ScoreGenerator:
+    """
+    Converts a MIDI file to a score with music21.
+    Slower than DrumScoreBuilder, kept as a fallback for arbitrary MIDI files.
+    """
+
     def __init__(self, midi_path: str):
         """
         Initializes the generator with the path to the MIDI file.
@@ -12,6 +309,8 @@ class ScoreGenerator:
         """
         self.midi_path = midi_path
         try:
+            from music21 import converter
+
             self.score = converter.parse(self.midi_path)
             print(f"Successfully parsed MIDI file: {self.midi_path}")
         except Exception as e:
@@ -40,8 +339,6 @@ if __name__ == "__main__":
     output_xml = "output/test_beat.xml"
 
     # Check if the input file exists first
-    import os
-
     if os.path.exists(input_midi):
         generator = ScoreGenerator(input_midi)
         generator.save_to_musicxml(output_xml)
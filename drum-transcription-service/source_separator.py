@@ -1,41 +1,217 @@
-# Isolates the drum track from an audio file using Spleeter.
+# Isolates the drum track from an audio file using Spleeter, or a fast
+# harmonic/percussive separation.
+import threading
+from typing import Callable, Iterator, Optional
+
+import librosa
 import numpy as np
-from spleeter.separator import Separator
-from spleeter.audio.adapter import AudioAdapter
 
 # Import configuration
 import config
 
-# Initialize the Spleeter separator.
-# This will download the pre-trained model on its first run.
-# We use the 4-stem model which includes drums.
-separator = Separator("spleeter:4stems")
-audio_adapter = AudioAdapter.default()
+# The Spleeter separator is created on first use, since loading TensorFlow and
+# the model is slow and not every run needs separation.
+_separator = None
+_separator_lock = threading.Lock()
+# Spleeter feeds every call through shared predictor state, so calls from
+# concurrent threads (e.g. the transcription server) are serialized.
+_separate_lock = threading.Lock()
+
+
+def get_separator():
+    """
+    Returns the shared Spleeter separator, creating it on first use.
+    This will download the pre-trained model on its first run.
+    We use the 4-stem model which includes drums.
+    """
+    global _separator
+    with _separator_lock:
+        if _separator is None:
+            from spleeter.separator import Separator
+
+            _separator = Separator("spleeter:4stems")
+        return _separator
+
+
+def _separate_window(window: np.ndarray) -> np.ndarray:
+    """
+    Separates the drums of a stereo window of shape [samples, 2].
+
+    Returns:
+        The mono drum waveform, as long as the window.
+    """
+    separator = get_separator()
+    with _separate_lock:
+        prediction = separator.separate(window)
+    # Convert the drum stem to mono by taking the mean of the channels.
+    drums = np.mean(prediction["drums"], axis=1, dtype=np.float32)
+    if len(drums) < len(window):
+        drums = np.pad(drums, (0, len(window) - len(drums)))
+    return drums[: len(window)]
+
+
+def _median_filter(magnitude: np.ndarray, size: int, axis: int) -> np.ndarray:
+    """
+    Median-filters a spectrogram along one axis.
+
+    Same result as scipy.ndimage.median_filter in 'reflect' mode with a
+    one-dimensional kernel, but the windows of a block of rows are sorted
+    together with np.partition, which is several times faster.
+
+    Args:
+        magnitude: Spectrogram of shape [n_bins, n_frames].
+        size: Odd kernel length.
+        axis: 1 to filter along time, 0 to filter along frequency.
+
+    Returns:
+        The filtered spectrogram.
+    """
+    # Filter along the first axis of a contiguous array, 64 columns at a time
+    data = np.ascontiguousarray(magnitude if axis == 0 else magnitude.T)
+    half = size // 2
+    padded = np.pad(data, ((half, half), (0, 0)), mode="symmetric")
+    filtered = np.empty_like(data)
+    for start in range(0, data.shape[1], 64):
+        windows = np.lib.stride_tricks.sliding_window_view(
+            padded[:, start : start + 64], size, axis=0
+        )
+        filtered[:, start : start + 64] = np.partition(windows, half, axis=-1)[
+            ..., half
+        ]
+    return filtered if axis == 0 else filtered.T
+
+
+def percussive_component(waveform: np.ndarray) -> np.ndarray:
+    """
+    Extracts the percussive component of a mono waveform by median-filtering
+    harmonic/percussive separation (HPSS).
+
+    Percussive energy is smooth along frequency and harmonic energy along
+    time, so each STFT bin is kept in proportion to how much more percussive
+    than harmonic it looks.
+
+    Returns:
+        The percussive waveform, as long as the input.
+    """
+    stft = librosa.stft(waveform, n_fft=config.N_FFT, hop_length=config.HOP_LENGTH)
+    magnitude = np.abs(stft)
+    harmonic = _median_filter(magnitude, config.HPSS_KERNEL_SIZE, axis=1)
+    percussive = _median_filter(magnitude, config.HPSS_KERNEL_SIZE, axis=0)
+    mask = librosa.util.softmask(percussive, config.HPSS_MARGIN * harmonic, power=2)
+    return librosa.istft(
+        stft * mask, hop_length=config.HOP_LENGTH, length=len(waveform)
+    ).astype(np.float32)
+
+
+def _percussive_window(window: np.ndarray) -> np.ndarray:
+    """
+    Separates the drums of a stereo window of shape [samples, 2] with HPSS.
+
+    Returns:
+        The mono drum waveform, as long as the window.
+    """
+    return percussive_component(np.mean(window, axis=1, dtype=np.float32))
+
+
+# Functions separating a [samples, 2] window into mono drums, by backend name
+SEPARATION_BACKENDS = {
+    "spleeter": _separate_window,
+    "hpss": _percussive_window,
+}
+
+
+def iter_separated_drums(
+    waveform: np.ndarray,
+    sr: int,
+    chunk_seconds: float = config.SEPARATION_CHUNK_SECONDS,
+    overlap_seconds: float = config.SEPARATION_OVERLAP_SECONDS,
+    separate_window: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+) -> Iterator[np.ndarray]:
+    """
+    Separates the drum track window by window.
 
+    Overlapping windows are separated independently and crossfaded with
+    complementary sine/cosine-squared fades, so that only one window is in
+    flight and memory does not grow with the song length.
 
-def separate_drums(waveform: np.ndarray, sr: int) -> np.ndarray:
+    Args:
+        waveform: The input audio waveform (mono or stereo).
+        sr: The sample rate of the input waveform.
+        chunk_seconds: Length of the separated windows.
+        overlap_seconds: Length of the crossfade between consecutive windows.
+        separate_window: Function separating a [samples, 2] window into mono drums.
+
+    Yields:
+        Consecutive segments of the mono drum waveform.
+    """
+    separate_window = separate_window or _separate_window
+    chunk = int(chunk_seconds * sr)
+    overlap = int(overlap_seconds * sr)
+    if overlap >= chunk:
+        raise ValueError("The overlap must be shorter than the chunk length.")
+    hop = chunk - overlap
+
+    fade = np.sin(0.5 * np.pi * (np.arange(overlap) + 0.5) / overlap) ** 2
+    fade_in = fade.astype(np.float32)
+    fade_out = (1.0 - fade).astype(np.float32)
+
+    n_samples = len(waveform)
+    pending = None  # Faded-out tail of the previous window
+    for start in range(0, max(n_samples - overlap, 1), hop):
+        window = waveform[start : start + chunk]
+        # Spleeter expects stereo input
+        if window.ndim == 1:
+            window = np.stack([window, window], axis=-1)
+        drums = separate_window(window)
+
+        if pending is not None:
+            drums[:overlap] *= fade_in
+            drums[:overlap] += pending
+        if start + chunk >= n_samples:
+            yield drums
+            return
+        pending = drums[hop:] * fade_out
+        yield drums[:hop]
+
+
+def separate_drums(
+    waveform: np.ndarray,
+    sr: int,
+    chunk_seconds: Optional[float] = config.SEPARATION_CHUNK_SECONDS,
+    overlap_seconds: float = config.SEPARATION_OVERLAP_SECONDS,
+    backend: str = config.SEPARATION_BACKEND,
+) -> np.ndarray:
     """
     Separates the drum track from a given waveform.
 
     Args:
         waveform: The input audio waveform (mono or stereo).
         sr: The sample rate of the input waveform.
+        chunk_seconds: Length of the separated windows, None to separate the whole waveform at once.
+        overlap_seconds: Length of the crossfade between consecutive windows.
+        backend: "spleeter" for the 4-stem model, "hpss" for the fast
+            harmonic/percussive separation (percussion only, less clean).
 
     Returns:
         The isolated drum waveform as a mono NumPy array.
     """
-    # Spleeter expects a specific sample rate, but our loader ensures this.
-    # If the input waveform is mono, we need to convert it to stereo for Spleeter.
-    if waveform.ndim == 1:
-        waveform = np.stack([waveform, waveform], axis=-1)
-
-    # Perform the separation
-    prediction = separator.separate(waveform)
+    if backend not in SEPARATION_BACKENDS:
+        raise ValueError(f"Unknown separation backend: {backend!r}")
+    separate_window = SEPARATION_BACKENDS[backend]
 
-    # Extract the drum stem and convert it to mono by taking the mean of the channels.
-    drum_stem_stereo = prediction["drums"]
-    drum_stem_mono = np.mean(drum_stem_stereo, axis=1)
+    # Spleeter expects a specific sample rate, but our loader ensures this.
+    if chunk_seconds is None or len(waveform) <= int(chunk_seconds * sr):
+        if waveform.ndim == 1:
+            waveform = np.stack([waveform, waveform], axis=-1)
+        return separate_window(waveform)
 
+    drum_stem_mono = np.empty(len(waveform), dtype=np.float32)
+    position = 0
+    for segment in iter_separated_drums(
+        waveform, sr, chunk_seconds, overlap_seconds, separate_window
+    ):
+        drum_stem_mono[position : position + len(segment)] = segment
+        position += len(segment)
     return drum_stem_mono
 
 
@@ -0,0 +1,192 @@
+# Records the cost of transcription stages and writes performance traces.
+import json
+import os
+import platform
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+# Bump when the layout of the JSON report changes.
+TRACE_VERSION = 3
+
+
+def _current_rss() -> Optional[int]:
+    """Resident set size of this process in bytes, None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _megabytes(size: Optional[int]) -> Optional[float]:
+    return None if size is None else round(size / 2**20, 2)
+
+
+class StageTracer:
+    """
+    Records wall time, CPU time and memory of pipeline stages.
+
+    CPU time is that of the whole process, so it includes the worker threads
+    of numerical libraries; stages must not run concurrently in one process.
+    Memory is the peak resident set size during a stage, sampled from a
+    background thread, the resident set size when it ends and its change
+    over the stage, all None where it cannot be read. Stages may attach
+    counts (onsets, audio seconds, ...) to their record, and stages served
+    from a cache are recorded with `cached` set.
+    """
+
+    def __init__(self, sample_interval: float = 0.005):
+        """
+        Args:
+            sample_interval: Seconds between two memory samples.
+        """
+        self.sample_interval = sample_interval
+        self.stages: List[Dict[str, Any]] = []
+        self._origin = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Dict[str, Any]]:
+        """
+        Measures the enclosed block as stage `name`.
+
+        Yields:
+            A dict of counts, filled in by the stage.
+        """
+        counts: Dict[str, Any] = {}
+        rss = _current_rss()
+        peak = [rss]
+        done = threading.Event()
+
+        def _sample():
+            while not done.wait(self.sample_interval):
+                peak[0] = max(peak[0], _current_rss() or 0)
+
+        sampler = threading.Thread(target=_sample, daemon=True)
+        if rss is not None:
+            sampler.start()
+        start, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield counts
+        finally:
+            wall, cpu = time.perf_counter() - start, time.process_time() - cpu
+            end_rss = _current_rss()
+            if rss is not None:
+                done.set()
+                sampler.join()
+                peak[0] = max(peak[0], end_rss or 0)
+            self._record(name, start, wall, cpu, rss, end_rss, peak[0], counts)
+
+    def cached_stage(self, name: str, start: float):
+        """
+        Records stage `name` as served from a cache.
+
+        Args:
+            name: Stage name.
+            start: time.perf_counter() when loading the cached output started.
+        """
+        wall = time.perf_counter() - start
+        self._record(name, start, wall, None, None, _current_rss(), None, {}, True)
+
+    def _record(
+        self,
+        name: str,
+        start: float,
+        wall: float,
+        cpu: Optional[float],
+        rss: Optional[int],
+        end_rss: Optional[int],
+        peak_rss: Optional[int],
+        counts: Dict[str, Any],
+        cached: bool = False,
+    ):
+        self.stages.append(
+            {
+                "name": name,
+                "start_s": round(start - self._origin, 6),
+                "wall_s": round(wall, 6),
+                "cpu_s": None if cpu is None else round(cpu, 6),
+                "peak_rss_mb": _megabytes(peak_rss),
+                "rss_mb": _megabytes(end_rss),
+                "rss_delta_mb": (
+                    None
+                    if rss is None or end_rss is None
+                    else _megabytes(end_rss - rss)
+                ),
+                "cached": cached,
+                "thread": threading.get_native_id(),
+                "counts": counts,
+            }
+        )
+
+    def report(
+        self, audio_seconds: Optional[float] = None, **metadata: Any
+    ) -> Dict[str, Any]:
+        """
+        Summarizes the recorded stages.
+
+        Args:
+            audio_seconds: Duration of the transcribed audio, used for real-time factors.
+            metadata: Extra fields of the report (input path, settings, ...).
+
+        Returns:
+            The report, with the real-time factor (wall time / audio duration)
+            of every stage and of the whole run.
+        """
+        stages = []
+        for record in self.stages:
+            record = dict(record)
+            if audio_seconds:
+                record["real_time_factor"] = round(record["wall_s"] / audio_seconds, 6)
+            stages.append(record)
+        wall = time.perf_counter() - self._origin
+        return {
+            "version": TRACE_VERSION,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+            },
+            **metadata,
+            "audio_seconds": audio_seconds,
+            "wall_s": round(wall, 6),
+            "real_time_factor": (
+                round(wall / audio_seconds, 6) if audio_seconds else None
+            ),
+            "stages": stages,
+        }
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """
+        Converts the recorded stages to the Chrome trace event format,
+        viewable in chrome://tracing or Perfetto.
+        """
+        pid = os.getpid()
+        events = [
+            {
+                "name": record["name"],
+                "ph": "X",
+                "ts": round(record["start_s"] * 1e6, 1),
+                "dur": round(record["wall_s"] * 1e6, 1),
+                "pid": pid,
+                "tid": record["thread"],
+                "args": {
+                    "cpu_s": record["cpu_s"],
+                    "peak_rss_mb": record["peak_rss_mb"],
+                    "rss_mb": record["rss_mb"],
+                    "rss_delta_mb": record["rss_delta_mb"],
+                    "cached": record["cached"],
+                    **record["counts"],
+                },
+            }
+            for record in self.stages
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def write_json(path: str, data: Dict[str, Any]):
+    """Writes a trace or report as JSON."""
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, default=str)
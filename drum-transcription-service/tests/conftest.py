@@ -0,0 +1,7 @@
+# Makes the service modules importable from the tests, as when run from the
+# service directory.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,38 @@
+import os
+import tempfile
+import unittest
+
+from artifact_cache import write_atomic
+
+
+class TestWriteAtomic(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "score.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_replaces_file(self):
+        write_atomic(self.path, lambda f: f.write(b"old"))
+        write_atomic(self.path, lambda f: f.write(b"new"))
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), b"new")
+        self.assertEqual(os.listdir(self.directory.name), ["score.json"])
+
+    def test_failed_write_keeps_previous_file(self):
+        write_atomic(self.path, lambda f: f.write(b"old"))
+
+        def write(f):
+            f.write(b"partial")
+            raise RuntimeError("disk full")
+
+        with self.assertRaises(RuntimeError):
+            write_atomic(self.path, write)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), b"old")
+        self.assertEqual(os.listdir(self.directory.name), ["score.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+
+import librosa
+import numpy as np
+
+import audio_processor
+import config
+
+
+def reference_features(waveform, sr, onset_timestamps):
+    """librosa.feature.mfcc on the window of every onset separately."""
+    window_samples = int((config.ONSET_WINDOW_MS / 1000) * sr)
+    features = []
+    for timestamp in onset_timestamps:
+        start = max(0, int(timestamp * sr) - window_samples // 2)
+        audio_slice = waveform[start : start + window_samples]
+        mfccs = librosa.feature.mfcc(y=audio_slice, sr=sr, n_mfcc=config.N_MFCC)
+        features.append(np.mean(mfccs, axis=1))
+    return np.array(features)
+
+
+class TestExtractFeaturesForOnsets(unittest.TestCase):
+    def setUp(self):
+        sr = config.TARGET_SR
+        rng = np.random.default_rng(0)
+        # Noise with a decaying envelope every 0.25 s over quiet background noise
+        envelope = np.exp(-(np.arange(2 * sr) % (sr // 4)) / 500.0) + 1e-3
+        self.waveform = (rng.standard_normal(2 * sr) * envelope).astype(np.float32)
+        self.sr = sr
+
+    def assert_matches_reference(self, onset_timestamps):
+        features = audio_processor.extract_features_for_onsets(
+            self.waveform, self.sr, onset_timestamps
+        )
+        expected = reference_features(self.waveform, self.sr, onset_timestamps)
+        self.assertEqual(features.shape, (len(onset_timestamps), config.N_MFCC))
+        np.testing.assert_allclose(features, expected, rtol=0, atol=1e-3)
+
+    def test_matches_librosa_per_window(self):
+        duration = len(self.waveform) / self.sr
+        self.assert_matches_reference(
+            np.array(
+                [
+                    0.0,  # First sample
+                    0.01,  # Window clipped at the start
+                    0.25,
+                    0.6,
+                    1.0001,
+                    duration - 0.04,  # Window clipped at the end
+                    (len(self.waveform) - 1) / self.sr,  # Last sample
+                    duration,
+                ]
+            )
+        )
+
+    def test_several_batches(self):
+        rng = np.random.default_rng(1)
+        count = 2 * config.FEATURE_BATCH_SIZE + 3
+        onset_timestamps = np.sort(rng.uniform(0, len(self.waveform) / self.sr, count))
+        self.assert_matches_reference(onset_timestamps)
+
+    def test_no_onsets(self):
+        features = audio_processor.extract_features_for_onsets(
+            self.waveform, self.sr, np.array([])
+        )
+        self.assertEqual(features.shape, (0, config.N_MFCC))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import wait
+from unittest import mock
+
+import mido
+import numpy as np
+import soundfile as sf
+
+import create_dataset
+from create_dataset import PackedDataset, build_packed_dataset
+
+
+def write_pair(directory, name, notes, seconds=1.0):
+    """Writes a noise take and a MIDI file hitting `notes` every 0.2 s."""
+    audio_path = os.path.join(directory, name + ".wav")
+    midi_path = os.path.join(directory, name + ".mid")
+    rng = np.random.default_rng(len(notes))
+    sr = create_dataset.TARGET_SR
+    sf.write(audio_path, rng.standard_normal(int(seconds * sr)) * 0.1, sr)
+    midi = mido.MidiFile()
+    track = mido.MidiTrack()
+    midi.tracks.append(track)
+    ticks = int(mido.second2tick(0.2, midi.ticks_per_beat, 500000))
+    for i, note in enumerate(notes):
+        track.append(
+            mido.Message(
+                "note_on", note=note, velocity=100, time=0 if i == 0 else ticks
+            )
+        )
+    midi.save(midi_path)
+    return audio_path, midi_path
+
+
+def reverse_completion(futures):
+    """Yields the futures in the reverse order of submission."""
+    wait(futures)
+    return reversed(list(futures))
+
+
+class TestBuildPackedDataset(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.pairs = [
+            write_pair(self.directory.name, "a", [42, 42, 38]),
+            write_pair(self.directory.name, "b", [36, 42]),
+            (os.path.join(self.directory.name, "missing.wav"), "missing.mid"),
+            write_pair(self.directory.name, "c", [38, 36, 36, 42]),
+        ]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def build(self, name):
+        output_dir = os.path.join(self.directory.name, name)
+        counts = build_packed_dataset(self.pairs, output_dir, max_workers=2)
+        return counts, PackedDataset(output_dir)
+
+    def test_order_does_not_depend_on_completion(self):
+        counts, dataset = self.build("in_order")
+        with mock.patch.object(create_dataset, "as_completed", reverse_completion):
+            reversed_counts, reversed_dataset = self.build("reversed")
+
+        self.assertEqual(counts, {"hihat": 4, "snare": 2, "kick": 3})
+        self.assertEqual(reversed_counts, counts)
+        self.assertEqual(dataset.label_names, ["hihat", "snare", "kick"])
+        self.assertEqual(reversed_dataset.label_names, dataset.label_names)
+        np.testing.assert_array_equal(dataset.source_ids, [0, 0, 0, 1, 1, 3, 3, 3, 3])
+        for field in ("offsets", "lengths", "label_ids", "source_ids"):
+            np.testing.assert_array_equal(
+                getattr(reversed_dataset, field), getattr(dataset, field)
+            )
+        for i in range(len(dataset)):
+            np.testing.assert_array_equal(reversed_dataset[i], dataset[i])
+
+
+if __name__ == "__main__":
+    unittest.main()
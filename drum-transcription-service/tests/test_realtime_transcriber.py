@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import soundfile as sf
+
+import audio_processor
+import config
+from realtime_transcriber import (
+    StreamingTranscriber,
+    iter_file_blocks,
+    transcribe_stream,
+)
+
+
+class StubClassifier:
+    """Labels every hit as a kick."""
+
+    def classify_features(self, times, features):
+        return [{"time": float(time), "instrument": "kick"} for time in times]
+
+
+def click_track(seconds=6.0, sr=config.TARGET_SR, seed=0):
+    """Noise bursts of random level at irregular intervals."""
+    rng = np.random.default_rng(seed)
+    waveform = np.zeros(int(seconds * sr), dtype=np.float32)
+    length = int(0.03 * sr)
+    decay = np.exp(-np.arange(length) / 300.0)
+    time = 0.1
+    while time < seconds - 0.2:
+        start = int(time * sr)
+        burst = rng.uniform(0.2, 1.0) * decay * rng.standard_normal(length)
+        waveform[start : start + length] += burst.astype(np.float32)
+        time += rng.uniform(0.15, 0.6)
+    return waveform
+
+
+def stream_times(blocks):
+    transcriber = StreamingTranscriber(StubClassifier())
+    hits = list(transcribe_stream(blocks, transcriber))
+    return np.array([hit["time"] for hit in hits]), hits, transcriber
+
+
+class TestStreamingTranscriber(unittest.TestCase):
+    def setUp(self):
+        self.waveform = click_track()
+        self.sr = config.TARGET_SR
+
+    def blocks(self, block_size):
+        for start in range(0, len(self.waveform), block_size):
+            yield self.waveform[start : start + block_size]
+
+    def test_hits_do_not_depend_on_block_size(self):
+        expected, _, _ = stream_times(self.blocks(512))
+        self.assertGreater(len(expected), 10)
+        for block_size in (333, 4096, len(self.waveform)):
+            times, _, _ = stream_times(self.blocks(block_size))
+            np.testing.assert_array_equal(times, expected)
+
+    def test_quiet_start_does_not_depend_on_block_size(self):
+        # A loud hit late in the stream must not change the earlier decisions
+        self.waveform[: len(self.waveform) // 2] *= 0.01
+        expected, _, _ = stream_times(self.blocks(512))
+        for block_size in (333, 4096):
+            times, _, _ = stream_times(self.blocks(block_size))
+            np.testing.assert_array_equal(times, expected)
+
+    def test_file_blocks_match_offline_onsets(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "clicks.wav")
+            sf.write(path, self.waveform, self.sr)
+            offline = audio_processor.detect_onsets(*audio_processor.load_audio(path))
+            for block_size in (333, 512, 4096):
+                times, _, _ = stream_times(iter_file_blocks(path, block_size))
+                np.testing.assert_allclose(times, offline, atol=1e-9)
+
+    def test_hits_are_emitted_within_latency_after_their_time(self):
+        block_size = 512
+        _, hits, transcriber = stream_times(self.blocks(block_size))
+        for hit in hits:
+            self.assertGreaterEqual(hit["detected_at"], hit["time"])
+        # The peak is at most latency_seconds plus one block behind; backtracking
+        # to the start of a click moves the time back by less than an FFT frame
+        bound = transcriber.latency_seconds + (block_size + config.N_FFT) / self.sr
+        self.assertLess(max(hit["detected_at"] - hit["time"] for hit in hits), bound)
+
+
+if __name__ == "__main__":
+    unittest.main()
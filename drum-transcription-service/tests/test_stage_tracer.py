@@ -0,0 +1,44 @@
+import time
+import unittest
+
+import numpy as np
+
+from stage_tracer import TRACE_VERSION, StageTracer, _current_rss
+
+
+class TestStageTracer(unittest.TestCase):
+    def test_stage_records_peak_memory(self):
+        tracer = StageTracer()
+        with tracer.stage("allocate") as counts:
+            block = np.ones(64 * 2**20 // 8)
+            counts["bytes"] = block.nbytes
+            time.sleep(10 * tracer.sample_interval)
+            del block
+        record = tracer.stages[0]
+        self.assertEqual(record["counts"], {"bytes": 64 * 2**20})
+        self.assertFalse(record["cached"])
+        self.assertGreaterEqual(record["cpu_s"], 0.0)
+        if _current_rss() is None:
+            self.assertIsNone(record["peak_rss_mb"])
+        else:
+            # The block is freed before the stage ends but counts in its peak
+            self.assertGreaterEqual(record["peak_rss_mb"] - record["rss_mb"], 32)
+
+    def test_cached_stage_is_listed(self):
+        tracer = StageTracer()
+        with tracer.stage("load"):
+            pass
+        tracer.cached_stage("separation", tracer._origin)
+        report = tracer.report(audio_seconds=10.0)
+        self.assertEqual(report["version"], TRACE_VERSION)
+        self.assertEqual(
+            [(stage["name"], stage["cached"]) for stage in report["stages"]],
+            [("load", False), ("separation", True)],
+        )
+        self.assertIsNone(report["stages"][1]["cpu_s"])
+        events = tracer.chrome_trace()["traceEvents"]
+        self.assertTrue(events[1]["args"]["cached"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import tempfile
+import unittest
+
+from transcribe import collect_batch_jobs
+
+
+class TestCollectBatchJobs(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_dir = os.path.join(self.directory.name, "takes")
+        for relative in (
+            "song.wav",
+            "song.mp3",
+            "intro.flac",
+            "live/song.wav",
+            "notes.txt",
+        ):
+            path = os.path.join(self.input_dir, relative)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, "wb").close()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def outputs(self, jobs):
+        return {
+            os.path.relpath(input_path, self.input_dir): os.path.relpath(
+                output_path, "out"
+            )
+            for input_path, output_path in jobs
+        }
+
+    def test_input_dir(self):
+        jobs = collect_batch_jobs("out", input_dir=self.input_dir)
+        self.assertEqual(
+            self.outputs(jobs),
+            {
+                "intro.flac": "intro.xml",
+                "live/song.wav": "live/song.xml",
+                "song.mp3": "song.mp3.xml",
+                "song.wav": "song.wav.xml",
+            },
+        )
+
+    def test_manifest_lists_each_file_once(self):
+        manifest = os.path.join(self.input_dir, "batch.txt")
+        with open(manifest, "w") as f:
+            f.write("song.wav\n./song.wav  # again\n\nintro.flac\n")
+        jobs = collect_batch_jobs("out", manifest=manifest, extension=".json")
+        self.assertEqual(
+            self.outputs(jobs), {"intro.flac": "intro.json", "song.wav": "song.json"}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import os
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from transcription_server import BatchingClassifier, create_app, resolve_input_path
+
+
+class CountingModel:
+    """Labels each feature vector by the sign of its first value."""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def predict(self, features):
+        self.batch_sizes.append(len(features))
+        return np.where(features[:, 0] > 0, "kick", "snare")
+
+
+class StubClassifier:
+    def __init__(self, model):
+        self.model = model
+        self.model_path = "stub.pkl"
+
+
+class StubWorker:
+    def __init__(self):
+        self.classifier = SimpleNamespace(predict_calls=0)
+        self.paths = []
+
+    def transcribe(self, input_path, separation):
+        self.paths.append(input_path)
+        return {"bpm": 120.0}
+
+
+class TestResolveInputPath(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        base = os.path.realpath(self.directory.name)
+        self.root = os.path.join(base, "root")
+        self.outside = os.path.join(base, "outside.wav")
+        os.makedirs(os.path.join(self.root, "takes"))
+        for path in (os.path.join(self.root, "takes", "a.wav"), self.outside):
+            open(path, "wb").close()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_paths_under_root(self):
+        expected = os.path.join(self.root, "takes", "a.wav")
+        self.assertEqual(resolve_input_path("takes/a.wav", self.root), expected)
+        self.assertEqual(
+            resolve_input_path("takes/../takes/a.wav", self.root), expected
+        )
+        self.assertEqual(resolve_input_path(expected, self.root), expected)
+
+    def test_parent_directory_escape(self):
+        self.assertIsNone(resolve_input_path("../outside.wav", self.root))
+        self.assertIsNone(resolve_input_path("takes/../../outside.wav", self.root))
+
+    def test_absolute_path_outside_root(self):
+        self.assertIsNone(resolve_input_path(self.outside, self.root))
+        self.assertIsNone(resolve_input_path("/etc/passwd", self.root))
+
+    def test_symlink_escape(self):
+        os.symlink(self.outside, os.path.join(self.root, "link.wav"))
+        os.symlink(os.path.dirname(self.root), os.path.join(self.root, "parent"))
+        self.assertIsNone(resolve_input_path("link.wav", self.root))
+        self.assertIsNone(resolve_input_path("parent/outside.wav", self.root))
+
+    def test_root_prefix_is_not_enough(self):
+        os.makedirs(self.root + "2")
+        self.assertIsNone(resolve_input_path("../root2", self.root))
+
+
+class TestBatchingClassifier(unittest.TestCase):
+    def test_concurrent_calls_share_one_predict(self):
+        model = CountingModel()
+        calls = [np.full((n, 3), sign) for n, sign in ((3, 1.0), (5, -1.0), (2, 1.0))]
+        # The batch is classified as soon as all onsets are queued
+        classifier = BatchingClassifier(
+            StubClassifier(model), max_batch_onsets=10, batch_delay=30.0
+        )
+        results = [None] * len(calls)
+
+        def classify(i):
+            times = np.arange(len(calls[i])) * 0.5
+            results[i] = classifier.classify_features(times, calls[i])
+
+        threads = [threading.Thread(target=classify, args=(i,)) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+        classifier.close()
+
+        self.assertEqual(model.batch_sizes, [10])
+        self.assertEqual(classifier.predict_calls, 1)
+        for features, hits in zip(calls, results):
+            expected = "kick" if features[0, 0] > 0 else "snare"
+            self.assertEqual(
+                [hit["instrument"] for hit in hits], [expected] * len(features)
+            )
+            self.assertEqual(
+                [hit["time"] for hit in hits], list(np.arange(len(features)) * 0.5)
+            )
+
+    def test_large_calls_are_split_into_batches(self):
+        model = CountingModel()
+        classifier = BatchingClassifier(
+            StubClassifier(model), max_batch_onsets=4, batch_delay=0.0
+        )
+        hits = classifier.classify_features(np.zeros(6), np.ones((6, 3)))
+        hits += classifier.classify_features(np.zeros(3), np.ones((3, 3)))
+        classifier.close()
+        self.assertEqual(len(hits), 9)
+        self.assertEqual(model.batch_sizes, [6, 3])
+
+
+class TestTranscriptionsRoute(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = os.path.realpath(self.directory.name)
+        open(os.path.join(self.root, "a.wav"), "wb").close()
+        self.worker = StubWorker()
+        self.client = create_app(self.worker, self.root).test_client()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_json_body_must_be_an_object(self):
+        for body in (5, ["x"], "a.wav"):
+            response = self.client.post("/transcriptions", json=body)
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.worker.paths, [])
+
+    def test_named_files(self):
+        response = self.client.post("/transcriptions", json={"path": "a.wav"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.worker.paths, [os.path.join(self.root, "a.wav")])
+        response = self.client.post("/transcriptions", json={"path": "../a.wav"})
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post("/transcriptions", json={"path": "b.wav"})
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
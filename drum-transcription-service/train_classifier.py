@@ -2,8 +2,14 @@
 # This script scans a directory of labeled audio samples (created by create_dataset.py),
 # extracts features, trains a scikit-learn model, and saves it to a file.
 
+import argparse
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
 import joblib
+import librosa
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
@@ -12,56 +18,318 @@ from sklearn.metrics import accuracy_score
 # Import project modules
 import config
 import audio_processor
+from artifact_cache import file_digest, write_atomic
+from create_dataset import (
+    PACKED_INDEX_FILENAME,
+    PACKED_SAMPLES_FILENAME,
+    PackedDataset,
+)
 
 # --- Configuration ---
 DATASET_DIR = "dataset"
 MODEL_OUTPUT_PATH = config.CLASSIFIER_MODEL_PATH
+# Cached features live next to the samples they were computed from.
+FEATURE_CACHE_DIRNAME = ".feature_cache"
+# Bump when the clip feature extraction changes.
+FEATURE_CACHE_VERSION = 1
+
+
+def extract_clip_features(file_path: str) -> np.ndarray:
+    """
+    Computes the feature vector of a labeled sample.
+
+    We treat the whole short clip as the feature window.
+
+    Returns:
+        The mean MFCC vector of the clip.
+    """
+    waveform, sr = audio_processor.load_audio(file_path)
+    return waveform_features(waveform, sr)
+
+
+def waveform_features(waveform: np.ndarray, sr: int) -> np.ndarray:
+    """
+    Computes the mean MFCC vector of a clip already loaded at the target rate.
+    """
+    mfccs = librosa.feature.mfcc(y=waveform, sr=sr, n_mfcc=config.N_MFCC)
+    return np.mean(mfccs, axis=1).astype(np.float32)
+
+
+def _feature_signature(source: Optional[str] = None) -> Dict:
+    """Settings the cached features depend on, and the dataset they come from if fixed."""
+    signature = {
+        "version": FEATURE_CACHE_VERSION,
+        "sample_rate": config.TARGET_SR,
+        "n_mfcc": config.N_MFCC,
+    }
+    if source is not None:
+        signature["source"] = source
+    return signature
 
 
-def load_data_from_directory(directory: str):
+class FeatureCache:
     """
-    Loads all .wav files from subdirectories of the given directory.
+    On-disk cache of clip features.
+
+    Features are stored as one packed array (features.npy) with an index
+    (index.json) mapping each sample path to its row, label, size and mtime.
+    A sample whose size or mtime changed is recomputed.
+    """
+
+    def __init__(self, cache_dir: str, source: Optional[str] = None):
+        """
+        Args:
+            cache_dir: Directory holding the packed features and the index.
+            source: Digest of the dataset the features come from; a cache
+                written for another digest is discarded.
+        """
+        self.cache_dir = cache_dir
+        self.source = source
+        self.features_path = os.path.join(cache_dir, "features.npy")
+        self.index_path = os.path.join(cache_dir, "index.json")
+
+    def load(self) -> Tuple[Dict[str, Dict], np.ndarray]:
+        """
+        Reads the cache.
+
+        Returns:
+            A tuple of (entries by relative path, packed feature array).
+            Both are empty if the cache is missing, stale or corrupt.
+        """
+        empty = ({}, np.empty((0, config.N_MFCC), dtype=np.float32))
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+            features = np.load(self.features_path)
+        except (OSError, ValueError):
+            return empty
+        entries = index.get("entries", {})
+        if index.get("signature") != _feature_signature(self.source) or len(
+            features
+        ) != len(entries):
+            return empty
+        return entries, features
+
+    def save(self, entries: Dict[str, Dict], features: np.ndarray) -> None:
+        """
+        Replaces the cache content.
+
+        Args:
+            entries: Index entries by relative path, their 'row' pointing into features.
+            features: Packed feature array.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        write_atomic(self.features_path, lambda f: np.save(f, features))
+        index = {"signature": _feature_signature(self.source), "entries": entries}
+        write_atomic(
+            self.index_path, lambda f: f.write(json.dumps(index, indent=1).encode())
+        )
+
+
+def scan_dataset(directory: str) -> List[Tuple[str, str, os.stat_result]]:
+    """
+    Lists the labeled .wav samples of the dataset.
     The subdirectory name is used as the label.
+
+    Returns:
+        A sorted list of (relative path, label, stat) tuples.
+    """
+    samples = []
+    for instrument_label in sorted(os.listdir(directory)):
+        instrument_dir = os.path.join(directory, instrument_label)
+        if instrument_label.startswith(".") or not os.path.isdir(instrument_dir):
+            continue
+        for entry in sorted(os.scandir(instrument_dir), key=lambda e: e.name):
+            if entry.name.endswith(".wav") and entry.is_file():
+                rel_path = os.path.join(instrument_label, entry.name)
+                samples.append((rel_path, instrument_label, entry.stat()))
+    return samples
+
+
+def load_data_from_directory(
+    directory: str, max_workers: Optional[int] = None, use_cache: bool = True
+):
     """
-    features = []
-    labels = []
+    Loads the features and labels of all .wav files in subdirectories of the given directory.
+    The subdirectory name is used as the label.
+
+    Features are cached in the dataset directory, so only new or modified
+    samples are processed; those are spread over a process pool.
 
+    Args:
+        directory: Dataset directory.
+        max_workers: Worker processes computing features (None for one per CPU).
+        use_cache: Whether to read cached features.
+    """
     print(f"Scanning directory: {directory}")
+    samples = scan_dataset(directory)
+    cache = FeatureCache(os.path.join(directory, FEATURE_CACHE_DIRNAME))
+    cached_entries, cached_features = cache.load() if use_cache else ({}, None)
 
-    for instrument_label in os.listdir(directory):
-        instrument_dir = os.path.join(directory, instrument_label)
-        if os.path.isdir(instrument_dir):
-            print(f"  - Loading samples for: {instrument_label}")
-            for filename in os.listdir(instrument_dir):
-                if filename.endswith(".wav"):
-                    file_path = os.path.join(instrument_dir, filename)
+    features = np.empty((len(samples), config.N_MFCC), dtype=np.float32)
+    entries = {}
+    missing = []
+    for row, (rel_path, label, stat) in enumerate(samples):
+        entry = {
+            "row": row,
+            "label": label,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+        cached = cached_entries.get(rel_path)
+        if cached is not None and all(
+            cached[key] == entry[key] for key in ("label", "size", "mtime_ns")
+        ):
+            features[row] = cached_features[cached["row"]]
+        else:
+            missing.append(row)
+        entries[rel_path] = entry
+
+    print(f"  - {len(samples) - len(missing)} cached, {len(missing)} to process")
+    if missing:
+        paths = [os.path.join(directory, samples[row][0]) for row in missing]
+        workers = min(max_workers or os.cpu_count() or 1, len(paths))
+        if workers == 1:
+            computed = [extract_clip_features(path) for path in paths]
+        else:
+            # Chunks amortise inter-process overhead over many short clips
+            chunksize = max(1, len(paths) // (4 * workers))
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                computed = list(
+                    executor.map(extract_clip_features, paths, chunksize=chunksize)
+                )
+        features[missing] = computed
+
+    if missing or len(entries) != len(cached_entries):
+        cache.save(entries, features)
+
+    labels = np.array([label for _, label, _ in samples])
+    return features, labels
+
+
+def _packed_features(dataset_dir: str, start: int, stop: int) -> np.ndarray:
+    """Computes the features of slices [start, stop) of a packed dataset in a worker."""
+    dataset = PackedDataset(dataset_dir)
+    return np.array(
+        [
+            waveform_features(dataset[i], dataset.sample_rate)
+            for i in range(start, stop)
+        ],
+        dtype=np.float32,
+    ).reshape(-1, config.N_MFCC)
+
+
+def packed_dataset_digest(dataset_dir: str) -> str:
+    """
+    Identifies the content of a packed dataset.
+    The index is hashed; the samples file, which every build rewrites, is
+    identified by its size and modification time.
+    """
+    stat = os.stat(os.path.join(dataset_dir, PACKED_SAMPLES_FILENAME))
+    index_digest = file_digest(os.path.join(dataset_dir, PACKED_INDEX_FILENAME))
+    return f"{index_digest}:{stat.st_size}:{stat.st_mtime_ns}"
 
-                    # Load audio and extract features
-                    waveform, sr = audio_processor.load_audio(file_path)
 
-                    # We treat the whole short clip as the feature
-                    mfccs = librosa.feature.mfcc(
-                        y=waveform, sr=sr, n_mfcc=config.N_MFCC
-                    )
-                    feature_vector = np.mean(mfccs, axis=1)
+def load_data_from_packed(
+    dataset_dir: str, max_workers: Optional[int] = None, use_cache: bool = True
+):
+    """
+    Loads the features and labels of a packed dataset built by create_dataset.py.
 
-                    features.append(feature_vector)
-                    labels.append(instrument_label)
+    Workers memory-map the samples themselves, so slices are read in place
+    and never copied between processes. Features are cached in the dataset
+    directory until the packed dataset is rebuilt.
 
-    return np.array(features), np.array(labels)
+    Args:
+        dataset_dir: Directory holding the packed dataset.
+        max_workers: Worker processes computing features (None for one per CPU).
+        use_cache: Whether to read cached features.
+    """
+    dataset = PackedDataset(dataset_dir)
+    if dataset.sample_rate != config.TARGET_SR:
+        raise ValueError(
+            f"Packed dataset is sampled at {dataset.sample_rate} Hz, "
+            f"expected {config.TARGET_SR} Hz."
+        )
+    print(f"Loaded packed dataset with {len(dataset)} slices: {dataset_dir}")
+
+    cache = FeatureCache(
+        os.path.join(dataset_dir, FEATURE_CACHE_DIRNAME),
+        source=packed_dataset_digest(dataset_dir),
+    )
+    if use_cache:
+        entries, features = cache.load()
+        if len(entries) == len(dataset):
+            print(f"  - {len(dataset)} cached, 0 to process")
+            return features, dataset.labels
+
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(dataset)))
+    bounds = np.linspace(0, len(dataset), 4 * workers + 1).astype(int)
+    ranges = [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+    if workers == 1:
+        chunks = [_packed_features(dataset_dir, a, b) for a, b in ranges]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunks = list(
+                executor.map(
+                    _packed_features,
+                    [dataset_dir] * len(ranges),
+                    [a for a, _ in ranges],
+                    [b for _, b in ranges],
+                )
+            )
+    features = (
+        np.concatenate(chunks)
+        if chunks
+        else np.empty((0, config.N_MFCC), dtype=np.float32)
+    )
+    # Slices are keyed by their position in the packed dataset
+    entries = {
+        str(i): {"row": i, "label": str(label)}
+        for i, label in enumerate(dataset.labels)
+    }
+    cache.save(entries, features)
+    return features, dataset.labels
 
 
 def main():
     """Main function to run the training process."""
+    parser = argparse.ArgumentParser(description="Train the instrument classifier.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Processes used to compute features (default: one per CPU).",
+    )
+    parser.add_argument(
+        "--rebuild-cache",
+        action="store_true",
+        help="Recompute the features of every sample.",
+    )
+    parser.add_argument(
+        "--dataset",
+        type=str,
+        default=DATASET_DIR,
+        help="Dataset directory, either per-label .wav folders or a packed dataset.",
+    )
+    args = parser.parse_args()
+
     print("--- Starting Instrument Classifier Training ---")
 
     # 1. Load the dataset
-    if not os.path.exists(DATASET_DIR):
-        print(f"Error: Dataset directory not found at '{DATASET_DIR}'")
+    if not os.path.exists(args.dataset):
+        print(f"Error: Dataset directory not found at '{args.dataset}'")
         print("Please run 'create_dataset.py' first to generate the training samples.")
         return
 
-    features, labels = load_data_from_directory(DATASET_DIR)
+    if os.path.exists(os.path.join(args.dataset, PACKED_INDEX_FILENAME)):
+        features, labels = load_data_from_packed(
+            args.dataset, max_workers=args.workers, use_cache=not args.rebuild_cache
+        )
+    else:
+        features, labels = load_data_from_directory(
+            args.dataset, max_workers=args.workers, use_cache=not args.rebuild_cache
+        )
 
     if len(features) == 0:
         print("No features were loaded. Is the dataset directory empty?")
@@ -99,7 +367,4 @@ def main():
 
 
 if __name__ == "__main__":
-    # Need to import librosa here because it's used in the feature extraction part
-    import librosa
-
     main()
@@ -1,14 +1,473 @@
 # Main entry point for the drum transcription service.
 import argparse
+import functools
+import json
+import multiprocessing
 import os
 import time
+import traceback
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
 
 # Import core modules
+import config
 import audio_processor
 import source_separator
+from artifact_cache import ArtifactCache, file_digest, stage_key
 from instrument_classifier import InstrumentClassifier
 from midi_generator import MidiGenerator
-from score_generator import ScoreGenerator
+from score_generator import DrumScoreBuilder, PracticeScoreWriter, ScoreGenerator
+from stage_tracer import StageTracer, write_json
+
+# Audio files picked up when transcribing a directory
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".flac", ".ogg", ".m4a", ".aiff")
+# Output formats and the extension of their score files
+OUTPUT_FORMATS = {"musicxml": ".xml", "practice": ".json"}
+
+
+@functools.lru_cache(maxsize=None)
+def _model_digest(model_path: str, size: int, mtime_ns: int) -> str:
+    """Digest of a classifier file, computed once per file version."""
+    return file_digest(model_path)
+
+
+def analyse_file(
+    input_path: str,
+    classifier: InstrumentClassifier,
+    cache: ArtifactCache,
+    tracer: Optional[StageTracer] = None,
+    separation: str = config.SEPARATION_BACKEND,
+) -> Tuple[List[Dict[str, Any]], float]:
+    """
+    Runs the analysis stages of the pipeline on one audio file.
+
+    The outputs of the analysis stages (drum stem, onsets, features,
+    classified onsets, BPM) are cached under keys derived from the input file
+    content and the stage settings. A stage runs only if its output is not
+    cached and a later stage needs it, so a rerun resumes from the first
+    invalidated stage.
+
+    Args:
+        input_path: Path to the input audio file.
+        classifier: Loaded instrument classifier.
+        cache: Cache of stage outputs.
+        tracer: Records the stages that run and those loaded from the cache.
+        separation: Drum separation backend, "spleeter" or the faster "hpss".
+
+    Returns:
+        A tuple of (classified onsets, estimated BPM).
+    """
+    tracer = tracer or StageTracer()
+
+    # Keys chain the input digest with the settings of each stage
+    separation_config = {
+        "sample_rate": config.TARGET_SR,
+        "chunk_seconds": config.SEPARATION_CHUNK_SECONDS,
+        "overlap_seconds": config.SEPARATION_OVERLAP_SECONDS,
+    }
+    if separation == "spleeter":
+        separation_config["model"] = "spleeter:4stems"
+    else:
+        separation_config.update(
+            backend=separation,
+            kernel_size=config.HPSS_KERNEL_SIZE,
+            margin=config.HPSS_MARGIN,
+            n_fft=config.N_FFT,
+            hop_length=config.HOP_LENGTH,
+        )
+    separation_key = stage_key("separation", file_digest(input_path), separation_config)
+    spectrogram_config = {"n_fft": config.N_FFT, "hop_length": config.HOP_LENGTH}
+    onsets_key = stage_key(
+        "onsets", separation_key, dict(spectrogram_config, backtrack=True)
+    )
+    features_key = stage_key(
+        "features",
+        onsets_key,
+        {
+            "window_ms": config.ONSET_WINDOW_MS,
+            "n_mfcc": config.N_MFCC,
+            "n_fft": config.N_FFT,
+            "hop_length": config.HOP_LENGTH,
+        },
+    )
+    model_stat = os.stat(classifier.model_path)
+    model_digest = _model_digest(
+        classifier.model_path, model_stat.st_size, model_stat.st_mtime_ns
+    )
+    classification_key = stage_key(
+        "classification", features_key, {"model": model_digest}
+    )
+    bpm_key = stage_key("bpm", separation_key, spectrogram_config)
+
+    def fetch(stage, key, compute):
+        """Fetches a stage output, recording it as cached unless it was computed."""
+        computed = False
+
+        def run():
+            nonlocal computed
+            computed = True
+            return compute()
+
+        start = time.perf_counter()
+        value = cache.fetch(stage, key, run)
+        if not computed:
+            tracer.cached_stage(stage, start)
+        return value
+
+    def load():
+        with tracer.stage("load") as counts:
+            print("\n[Stage 1/6] Loading audio file...")
+            waveform, sr = audio_processor.load_audio(input_path)
+            counts["audio_seconds"] = round(len(waveform) / sr, 3)
+        print(f"Audio loaded successfully. Duration: {len(waveform)/sr:.2f} seconds.")
+        return waveform
+
+    def separate():
+        waveform = load()
+        with tracer.stage("separation") as counts:
+            print("\n[Stage 2/6] Separating drum track (this may take a while)...")
+            drum_waveform = source_separator.separate_drums(
+                waveform, config.TARGET_SR, backend=separation
+            )
+            counts["audio_seconds"] = round(len(waveform) / config.TARGET_SR, 3)
+            counts["backend"] = separation
+        print("Drum track separated.")
+        return drum_waveform
+
+    # Each stage is computed at most once, and only when a later stage needs it
+    @functools.lru_cache(maxsize=None)
+    def drum_waveform():
+        return fetch("separation", separation_key, separate)
+
+    # Shares the spectrogram of the drum stem between onsets and tempo
+    @functools.lru_cache(maxsize=None)
+    def analysis():
+        return audio_processor.AudioAnalysis(drum_waveform(), config.TARGET_SR)
+
+    @functools.lru_cache(maxsize=None)
+    def onset_timestamps():
+        def detect():
+            drum_analysis = analysis()
+            with tracer.stage("onsets") as counts:
+                print("\n[Stage 3/6] Detecting drum onsets...")
+                onsets = drum_analysis.onsets()
+                counts["onsets"] = len(onsets)
+            print(f"Detected {len(onsets)} potential onsets.")
+            return onsets
+
+        return fetch("onsets", onsets_key, detect)
+
+    @functools.lru_cache(maxsize=None)
+    def feature_vectors():
+        def extract():
+            drum_analysis, onsets = analysis(), onset_timestamps()
+            with tracer.stage("features") as counts:
+                features = drum_analysis.features(onsets)
+                counts["onsets"] = len(onsets)
+            return features
+
+        return fetch("features", features_key, extract)
+
+    def classify():
+        onsets, features = onset_timestamps(), feature_vectors()
+        with tracer.stage("classification") as counts:
+            print("\n[Stage 4/6] Classifying instruments...")
+            onsets = classifier.classify_features(onsets, features)
+            counts["onsets"] = len(onsets)
+        print("Instrument classification complete.")
+        return onsets
+
+    def estimate_bpm():
+        drum_analysis = analysis()
+        with tracer.stage("bpm"):
+            return drum_analysis.bpm()
+
+    classified_onsets = fetch("classification", classification_key, classify)
+    bpm = fetch("bpm", bpm_key, estimate_bpm)
+    return classified_onsets, bpm
+
+
+def transcribe_file(
+    input_path: str,
+    output_path: str,
+    classifier: InstrumentClassifier,
+    cache: ArtifactCache,
+    tracer: Optional[StageTracer] = None,
+    output_format: str = "musicxml",
+    separation: str = config.SEPARATION_BACKEND,
+) -> None:
+    """
+    Runs the transcription pipeline on one audio file.
+    See analyse_file for the caching of the analysis stages.
+
+    Args:
+        input_path: Path to the input audio file.
+        output_path: Path for the output score file.
+        classifier: Loaded instrument classifier.
+        cache: Cache of stage outputs.
+        tracer: Records the cost of every stage that runs.
+        output_format: "musicxml" for a MIDI file and a MusicXML score,
+            "practice" for a score of the e-drum practice app (JSON).
+        separation: Drum separation backend, "spleeter" or the faster "hpss".
+    """
+    tracer = tracer or StageTracer()
+
+    # --- Create output directory if it doesn't exist ---
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+        print(f"Created output directory: {output_dir}")
+
+    classified_onsets, bpm = analyse_file(
+        input_path, classifier, cache, tracer, separation
+    )
+
+    if output_format == "practice":
+        # The practice app plays the onsets directly, no MIDI or notation needed
+        with tracer.stage("practice_score") as counts:
+            print("\n[Stage 5/6] Writing practice app score...")
+            print(f"Estimated BPM: {bpm:.2f}")
+            writer = PracticeScoreWriter(
+                classified_onsets,
+                bpm,
+                title=os.path.splitext(os.path.basename(input_path))[0],
+                duration_ms=int(audio_processor.audio_duration(input_path) * 1000),
+            )
+            writer.save(output_path)
+            counts["notes"] = len(classified_onsets)
+        return
+
+    # --- Stage 5: MIDI Generation ---
+    with tracer.stage("midi") as counts:
+        print("\n[Stage 5/6] Generating MIDI file...")
+        print(f"Estimated BPM: {bpm:.2f}")
+        midi_generator = MidiGenerator(classified_onsets, bpm)
+        # Save the intermediate MIDI file
+        midi_output_path = os.path.splitext(output_path)[0] + ".mid"
+        midi_generator.save_to_file(midi_output_path)
+        counts["notes"] = len(classified_onsets)
+
+    # --- Stage 6: Score Generation ---
+    with tracer.stage("score") as counts:
+        print("\n[Stage 6/6] Generating final score file...")
+        if config.SCORE_BACKEND == "music21":
+            score_generator = ScoreGenerator(midi_output_path)
+            score_generator.save_to_musicxml(output_path)
+        else:
+            DrumScoreBuilder(classified_onsets, bpm).save_to_musicxml(output_path)
+        counts["backend"] = config.SCORE_BACKEND
+
+
+def save_traces(
+    tracer: StageTracer, input_path: str, output_path: str, chrome: bool = False
+) -> str:
+    """
+    Writes the performance report of a transcription next to its score.
+
+    Args:
+        tracer: Tracer of the transcription.
+        input_path: Path to the input audio file.
+        output_path: Path of the output score file.
+        chrome: Whether to also write the stages in Chrome trace format.
+
+    Returns:
+        The path of the JSON report.
+    """
+    report = tracer.report(
+        audio_seconds=round(audio_processor.audio_duration(input_path), 3),
+        input=input_path,
+        output=output_path,
+        sample_rate=config.TARGET_SR,
+        score_backend=config.SCORE_BACKEND,
+    )
+    stem = os.path.splitext(output_path)[0]
+    write_json(stem + ".trace.json", report)
+    if chrome:
+        write_json(stem + ".chrome_trace.json", tracer.chrome_trace())
+    return stem + ".trace.json"
+
+
+# Per-process state of batch workers, set up once by _init_worker
+_worker_classifier: Optional[InstrumentClassifier] = None
+_worker_cache: Optional[ArtifactCache] = None
+_worker_trace: Optional[str] = None
+
+
+def _init_worker(model_path: str, cache_dir: Optional[str], trace: Optional[str]):
+    """Loads the models of a batch worker, kept for all the files it processes."""
+    global _worker_classifier, _worker_cache, _worker_trace
+    _worker_classifier = InstrumentClassifier(model_path)
+    _worker_cache = ArtifactCache(cache_dir)
+    _worker_trace = trace
+
+
+def _transcribe_job(
+    input_path: str,
+    output_path: str,
+    output_format: str = "musicxml",
+    separation: str = config.SEPARATION_BACKEND,
+) -> Dict[str, Any]:
+    """Transcribes one file of a batch, reporting failures instead of raising."""
+    start_time = time.time()
+    result = {"input": input_path, "output": output_path, "ok": False, "error": None}
+    try:
+        if _worker_classifier is None or _worker_classifier.model is None:
+            raise RuntimeError("Classifier model could not be loaded.")
+        tracer = StageTracer()
+        transcribe_file(
+            input_path,
+            output_path,
+            _worker_classifier,
+            _worker_cache,
+            tracer,
+            output_format,
+            separation,
+        )
+        if _worker_trace:
+            result["trace"] = save_traces(
+                tracer, input_path, output_path, chrome=_worker_trace == "chrome"
+            )
+        result["ok"] = True
+    except Exception:
+        result["error"] = traceback.format_exc(limit=3)
+    result["seconds"] = round(time.time() - start_time, 3)
+    return result
+
+
+def collect_batch_jobs(
+    output_dir: str,
+    input_dir: Optional[str] = None,
+    manifest: Optional[str] = None,
+    extension: str = ".xml",
+) -> List[Tuple[str, str]]:
+    """
+    Lists the files of a batch and the score path of each.
+
+    A score is named after its input file without the audio extension, except
+    when several inputs differ only by their extension (song.wav and
+    song.mp3): their scores keep it (song.wav.xml and song.mp3.xml) so they
+    do not overwrite each other.
+
+    Args:
+        output_dir: Directory receiving the scores, mirroring the input layout.
+        input_dir: Directory searched recursively for audio files.
+        manifest: Text file listing one audio path per line ('#' starts a comment).
+        extension: Extension of the score files.
+
+    Returns:
+        A list of (input path, output score path) tuples.
+    """
+    if input_dir is not None:
+        inputs = []
+        for root, _, filenames in os.walk(input_dir):
+            inputs.extend(
+                os.path.join(root, filename)
+                for filename in filenames
+                if filename.lower().endswith(AUDIO_EXTENSIONS)
+            )
+        base_dir = input_dir
+    else:
+        with open(manifest) as f:
+            lines = [line.split("#", 1)[0].strip() for line in f]
+        manifest_dir = os.path.dirname(os.path.abspath(manifest))
+        inputs = [os.path.join(manifest_dir, line) for line in lines if line]
+        base_dir = os.path.commonpath(inputs) if inputs else manifest_dir
+        if inputs and os.path.isfile(base_dir):
+            base_dir = os.path.dirname(base_dir)
+
+    relatives = {
+        input_path: os.path.relpath(input_path, base_dir)
+        for input_path in map(os.path.normpath, inputs)
+    }
+    stems = Counter(
+        os.path.normcase(os.path.splitext(relative)[0])
+        for relative in relatives.values()
+    )
+    jobs = []
+    for input_path, relative in sorted(relatives.items()):
+        stem = os.path.splitext(relative)[0]
+        if stems[os.path.normcase(stem)] > 1:
+            stem = relative
+        jobs.append((input_path, os.path.join(output_dir, stem + extension)))
+    return jobs
+
+
+def transcribe_batch(
+    jobs: List[Tuple[str, str]],
+    model_path: str = config.CLASSIFIER_MODEL_PATH,
+    cache_dir: Optional[str] = config.ARTIFACT_CACHE_DIR,
+    max_workers: Optional[int] = None,
+    trace: Optional[str] = None,
+    output_format: str = "musicxml",
+    separation: str = config.SEPARATION_BACKEND,
+) -> Dict[str, Any]:
+    """
+    Transcribes many files on a process pool.
+
+    Every worker loads the classifier once, and the Spleeter model on first
+    use, then processes files until the batch is done. A failing file is
+    reported in the summary without stopping the batch.
+
+    Args:
+        jobs: (input path, output score path) tuples.
+        model_path: Path to the classifier model.
+        cache_dir: Directory of the stage artifact cache, None to disable it.
+        max_workers: Worker processes (None for one per CPU).
+        trace: "json" to write a performance report next to every score,
+            "chrome" to also write a Chrome trace, None for neither.
+        output_format: Format of the scores (see transcribe_file).
+        separation: Drum separation backend, "spleeter" or the faster "hpss".
+
+    Returns:
+        A summary with the result of every file.
+    """
+    start_time = time.time()
+    results = []
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(jobs)))
+    # Spawned workers do not inherit TensorFlow or BLAS thread state
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(model_path, cache_dir, trace),
+    ) as executor:
+        futures = {
+            executor.submit(
+                _transcribe_job, input_path, output_path, output_format, separation
+            ): (
+                input_path,
+                output_path,
+            )
+            for input_path, output_path in jobs
+        }
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except BrokenProcessPool as e:
+                # A worker died (e.g. out of memory), its pending files fail
+                input_path, output_path = futures[future]
+                result = {
+                    "input": input_path,
+                    "output": output_path,
+                    "ok": False,
+                    "error": f"Worker process died: {e}",
+                    "seconds": None,
+                }
+            results.append(result)
+            status = "done" if result["ok"] else "FAILED"
+            print(f"[{len(results)}/{len(jobs)}] {status}: {result['input']}")
+
+    failed = [result for result in results if not result["ok"]]
+    return {
+        "total": len(jobs),
+        "succeeded": len(jobs) - len(failed),
+        "failed": len(failed),
+        "workers": workers,
+        "seconds": round(time.time() - start_time, 3),
+        "results": sorted(results, key=lambda result: result["input"]),
+    }
 
 
 def main():
@@ -16,69 +475,137 @@ def main():
     parser = argparse.ArgumentParser(
         description="Transcribe drum patterns from an audio file."
     )
-    parser.add_argument(
+    inputs = parser.add_mutually_exclusive_group(required=True)
+    inputs.add_argument(
         "--input",
         type=str,
-        required=True,
         help="Path to the input audio file (e.g., song.mp3).",
     )
+    inputs.add_argument(
+        "--input-dir",
+        type=str,
+        help="Transcribe every audio file under this directory.",
+    )
+    inputs.add_argument(
+        "--manifest",
+        type=str,
+        help="Transcribe the audio files listed in this text file, one per line.",
+    )
     parser.add_argument(
         "--output",
         type=str,
         required=True,
-        help="Path for the output score file (e.g., score.xml).",
+        help="Path for the output score file (e.g., score.xml or score.json), "
+        "or the output directory in batch mode.",
+    )
+    parser.add_argument(
+        "--format",
+        choices=sorted(OUTPUT_FORMATS),
+        default="musicxml",
+        help="'musicxml' writes a MIDI file and a MusicXML score, 'practice' "
+        "writes a JSON score for the e-drum practice app.",
+    )
+    parser.add_argument(
+        "--separation",
+        choices=sorted(source_separator.SEPARATION_BACKENDS),
+        default=config.SEPARATION_BACKEND,
+        help="Drum separation backend: 'spleeter' is more accurate, "
+        "'hpss' is much faster and needs no TensorFlow.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes in batch mode (default: one per CPU).",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=config.ARTIFACT_CACHE_DIR,
+        help="Directory caching the outputs of the analysis stages.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Recompute every stage without reading or writing the cache.",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="Write the wall time, CPU time and peak memory of every stage "
+        "to <output>.trace.json (stages loaded from the cache are marked as "
+        "cached; use --no-cache to time every stage).",
+    )
+    parser.add_argument(
+        "--chrome-trace",
+        action="store_true",
+        help="With --trace, also write the stages to <output>.chrome_trace.json "
+        "for chrome://tracing or Perfetto.",
     )
     args = parser.parse_args()
 
     start_time = time.time()
+    cache_dir = None if args.no_cache else args.cache_dir
+    trace = ("chrome" if args.chrome_trace else "json") if args.trace else None
 
-    # --- Create output directory if it doesn't exist ---
-    output_dir = os.path.dirname(args.output)
-    if output_dir and not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-        print(f"Created output directory: {output_dir}")
-
-    # --- Stage 1: Audio Loading ---
-    print("\n[Stage 1/6] Loading audio file...")
-    try:
-        waveform, sr = audio_processor.load_audio(args.input)
-    except Exception as e:
-        print(f"Failed to load audio. Error: {e}")
+    if args.input is None:
+        jobs = collect_batch_jobs(
+            args.output,
+            args.input_dir,
+            args.manifest,
+            extension=OUTPUT_FORMATS[args.format],
+        )
+        if not jobs:
+            print("No audio files to transcribe.")
+            return
+        print(f"Transcribing {len(jobs)} files...")
+        summary = transcribe_batch(
+            jobs,
+            cache_dir=cache_dir,
+            max_workers=args.workers,
+            trace=trace,
+            output_format=args.format,
+            separation=args.separation,
+        )
+        os.makedirs(args.output, exist_ok=True)
+        report_path = os.path.join(args.output, "batch_report.json")
+        with open(report_path, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(
+            f"\nBatch complete: {summary['succeeded']}/{summary['total']} succeeded "
+            f"in {summary['seconds']:.2f} seconds."
+        )
+        for result in summary["results"]:
+            if not result["ok"]:
+                print(f"  - Failed: {result['input']}")
+        print(f"Report saved to: {report_path}")
         return
-    print(f"Audio loaded successfully. Duration: {len(waveform)/sr:.2f} seconds.")
-
-    # --- Stage 2: Source Separation ---
-    print("\n[Stage 2/6] Separating drum track (this may take a while)...")
-    drum_waveform = source_separator.separate_drums(waveform, sr)
-    print("Drum track separated.")
-
-    # --- Stage 3: Onset Detection ---
-    print("\n[Stage 3/6] Detecting drum onsets...")
-    onset_timestamps = audio_processor.detect_onsets(drum_waveform, sr)
-    print(f"Detected {len(onset_timestamps)} potential onsets.")
 
-    # --- Stage 4: Instrument Classification ---
-    print("\n[Stage 4/6] Classifying instruments...")
     classifier = InstrumentClassifier()
     if not classifier.model:
         print("Cannot proceed without a trained classifier model.")
         return
-    classified_onsets = classifier.classify_onsets(drum_waveform, sr, onset_timestamps)
-    print("Instrument classification complete.")
 
-    # --- Stage 5: MIDI Generation ---
-    print("\n[Stage 5/6] Generating MIDI file...")
-    bpm = audio_processor.estimate_bpm(drum_waveform, sr)
-    print(f"Estimated BPM: {bpm:.2f}")
-    midi_generator = MidiGenerator(classified_onsets, bpm)
-    # Save the intermediate MIDI file
-    midi_output_path = os.path.splitext(args.output)[0] + ".mid"
-    midi_generator.save_to_file(midi_output_path)
-
-    # --- Stage 6: Score Generation ---
-    print("\n[Stage 6/6] Generating final score file...")
-    score_generator = ScoreGenerator(midi_output_path)
-    score_generator.save_to_musicxml(args.output)
+    cache = ArtifactCache(cache_dir)
+    tracer = StageTracer()
+    try:
+        transcribe_file(
+            args.input,
+            args.output,
+            classifier,
+            cache,
+            tracer,
+            args.format,
+            args.separation,
+        )
+    except Exception as e:
+        print(f"Failed to transcribe audio. Error: {e}")
+        return
+    if trace:
+        trace_path = save_traces(
+            tracer, args.input, args.output, chrome=trace == "chrome"
+        )
+        print(f"Performance trace saved to: {trace_path}")
 
     end_time = time.time()
     print(f"\nTranscription complete! Total time: {end_time - start_time:.2f} seconds.")
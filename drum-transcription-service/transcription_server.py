@@ -0,0 +1,350 @@
+# Resident transcription worker serving transcriptions over local HTTP.
+# The classifier and the Spleeter model stay loaded between requests, so the
+# practice app can request transcriptions interactively.
+import argparse
+import os
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from flask import Flask, jsonify, request
+
+# Import project modules
+import config
+import source_separator
+from artifact_cache import ArtifactCache
+from instrument_classifier import InstrumentClassifier
+from score_generator import DRUM_NOTATION
+from transcribe import AUDIO_EXTENSIONS, analyse_file
+
+
+class BatchingClassifier:
+    """
+    Classifier shared by concurrent transcriptions.
+
+    classify_features calls from different threads are queued, and a single
+    thread classifies the onsets of all queued calls with one predict call,
+    so concurrent jobs share the per-call overhead of the model.
+    """
+
+    def __init__(
+        self,
+        classifier: InstrumentClassifier,
+        max_batch_onsets: int = config.SERVER_MAX_BATCH_ONSETS,
+        batch_delay: float = config.SERVER_BATCH_DELAY,
+    ):
+        """
+        Args:
+            classifier: Loaded instrument classifier.
+            max_batch_onsets: Largest number of onsets classified in one predict call.
+            batch_delay: Seconds to wait for more calls before classifying a batch.
+        """
+        self.model = classifier.model
+        self.model_path = classifier.model_path
+        self.max_batch_onsets = max_batch_onsets
+        self.batch_delay = batch_delay
+        self.predict_calls = 0
+        self._pending: List[Tuple[np.ndarray, Future]] = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def classify_features(
+        self, onset_timestamps: np.ndarray, feature_vectors: np.ndarray
+    ) -> List[Dict[str, Any]]:
+        """
+        Classifies onsets whose feature vectors were already extracted.
+        Blocks until the batch holding them has been classified.
+
+        Returns:
+            A list of dictionaries, e.g., [{'time': 0.5, 'instrument': 'kick'}, ...]
+        """
+        if len(feature_vectors) == 0:
+            return []
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Classifier is closed.")
+            self._pending.append((np.asarray(feature_vectors), future))
+            self._condition.notify()
+        predicted_labels = future.result()
+        return [
+            {"time": timestamp, "instrument": label}
+            for timestamp, label in zip(onset_timestamps, predicted_labels)
+        ]
+
+    def _next_batch(self) -> List[Tuple[np.ndarray, Future]]:
+        """Waits for queued calls and takes those classified together."""
+        with self._condition:
+            while not self._pending and not self._closed:
+                self._condition.wait()
+            # Give concurrent jobs a moment to join the batch
+            deadline = time.monotonic() + self.batch_delay
+            while not self._closed:
+                remaining = deadline - time.monotonic()
+                queued = sum(len(features) for features, _ in self._pending)
+                if remaining <= 0 or queued >= self.max_batch_onsets:
+                    break
+                self._condition.wait(remaining)
+            batch, size = [], 0
+            while self._pending and (
+                not batch or size + len(self._pending[0][0]) <= self.max_batch_onsets
+            ):
+                features, future = self._pending.pop(0)
+                batch.append((features, future))
+                size += len(features)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            try:
+                predicted = self.model.predict(
+                    np.concatenate([features for features, _ in batch])
+                )
+                self.predict_calls += 1
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            split_points = np.cumsum([len(features) for features, _ in batch])[:-1]
+            for (_, future), labels in zip(batch, np.split(predicted, split_points)):
+                future.set_result(labels)
+
+    def close(self):
+        """Classifies the queued calls and stops the batching thread."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+
+
+def compact_onsets(
+    classified_onsets: List[Dict[str, Any]], bpm: float
+) -> Dict[str, Any]:
+    """
+    Packs classified onsets into parallel arrays sorted by time.
+
+    Returns:
+        A dict with the BPM, onset times in milliseconds, and for every onset
+        the index of its instrument in 'instruments', whose GM note numbers
+        are listed in 'notes'.
+    """
+    instruments = sorted({onset["instrument"] for onset in classified_onsets})
+    instrument_ids = {instrument: i for i, instrument in enumerate(instruments)}
+    onsets = sorted(classified_onsets, key=lambda onset: onset["time"])
+    return {
+        "bpm": round(float(bpm), 2),
+        "instruments": instruments,
+        "notes": [
+            DRUM_NOTATION[instrument][0] if instrument in DRUM_NOTATION else None
+            for instrument in instruments
+        ],
+        "time_ms": [int(round(float(onset["time"]) * 1000)) for onset in onsets],
+        "instrument": [instrument_ids[onset["instrument"]] for onset in onsets],
+    }
+
+
+class TranscriptionWorker:
+    """
+    Keeps the models loaded and transcribes audio files on request.
+    """
+
+    def __init__(
+        self,
+        model_path: str = config.CLASSIFIER_MODEL_PATH,
+        cache_dir: Optional[str] = config.ARTIFACT_CACHE_DIR,
+        max_jobs: int = config.SERVER_MAX_JOBS,
+        preload_separator: bool = config.SEPARATION_BACKEND == "spleeter",
+    ):
+        """
+        Args:
+            model_path: Path to the classifier model.
+            cache_dir: Directory of the stage artifact cache, None to disable it.
+            max_jobs: Transcriptions analysed concurrently; others wait their turn.
+            preload_separator: Whether to load the Spleeter model now rather than on the first request.
+        """
+        classifier = InstrumentClassifier(model_path)
+        if classifier.model is None:
+            raise RuntimeError(f"Classifier model could not be loaded: {model_path}")
+        self.classifier = BatchingClassifier(classifier)
+        self.cache = ArtifactCache(cache_dir)
+        self._slots = threading.BoundedSemaphore(max_jobs)
+        if preload_separator:
+            print("Loading the separation model...")
+            source_separator.get_separator()
+
+    def transcribe(
+        self, input_path: str, separation: str = config.SEPARATION_BACKEND
+    ) -> Dict[str, Any]:
+        """
+        Transcribes one audio file.
+
+        Args:
+            input_path: Path to the input audio file.
+            separation: Drum separation backend, "spleeter" or the faster "hpss".
+
+        Returns:
+            The compact classified onsets (see compact_onsets) and the processing time.
+        """
+        start_time = time.time()
+        with self._slots:
+            classified_onsets, bpm = analyse_file(
+                input_path, self.classifier, self.cache, separation=separation
+            )
+        result = compact_onsets(classified_onsets, bpm)
+        result["seconds"] = round(time.time() - start_time, 3)
+        return result
+
+    def close(self):
+        """Stops the batching thread."""
+        self.classifier.close()
+
+
+def resolve_input_path(path: str, input_root: str) -> Optional[str]:
+    """
+    Resolves a file path sent by a client.
+
+    Returns:
+        The real path of the file if it lies under input_root, None otherwise.
+    """
+    root = os.path.realpath(input_root)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        return None
+    return resolved
+
+
+def create_app(
+    worker: TranscriptionWorker, input_root: Optional[str] = config.SERVER_INPUT_ROOT
+) -> Flask:
+    """
+    Creates the HTTP interface of a worker.
+
+    POST /transcriptions takes a multipart upload with the audio in the
+    'audio' field or, when input_root is set, a JSON body {"path": "<file>"}
+    naming a file under input_root. An optional 'separation' field (JSON or
+    form) picks the separation backend.
+
+    Args:
+        worker: Worker transcribing the requests.
+        input_root: Directory clients may name files in, None to accept uploads only.
+    """
+    app = Flask(__name__)
+
+    @app.get("/health")
+    def health():
+        return jsonify(
+            {"status": "ok", "predict_calls": worker.classifier.predict_calls}
+        )
+
+    @app.post("/transcriptions")
+    def transcriptions():
+        body = request.get_json(silent=True)
+        if body is None:
+            body = {}
+        elif not isinstance(body, dict):
+            return jsonify({"error": "Expected a JSON object."}), 400
+        separation = (
+            body.get("separation")
+            or request.form.get("separation")
+            or config.SEPARATION_BACKEND
+        )
+        if separation not in source_separator.SEPARATION_BACKENDS:
+            return (
+                jsonify({"error": f"Unknown separation backend: {separation!r}"}),
+                400,
+            )
+
+        upload = request.files.get("audio")
+        if upload is not None:
+            suffix = os.path.splitext(upload.filename or "")[1].lower()
+            if suffix not in AUDIO_EXTENSIONS:
+                return jsonify({"error": f"Unsupported audio format: {suffix!r}"}), 400
+            with tempfile.TemporaryDirectory() as temp_dir:
+                input_path = os.path.join(temp_dir, "upload" + suffix)
+                upload.save(input_path)
+                return _transcribe(input_path, separation)
+
+        path = body.get("path")
+        if not path:
+            return jsonify({"error": "Expected an 'audio' upload or a 'path'."}), 400
+        if input_root is None:
+            return jsonify({"error": "Paths are not accepted, upload the audio."}), 403
+        input_path = resolve_input_path(path, input_root)
+        if input_path is None:
+            return jsonify({"error": f"Path outside the input root: {path}"}), 403
+        if not os.path.isfile(input_path):
+            return jsonify({"error": f"File not found: {path}"}), 404
+        return _transcribe(input_path, separation)
+
+    def _transcribe(input_path: str, separation: str):
+        try:
+            return jsonify(worker.transcribe(input_path, separation))
+        except Exception as e:
+            traceback.print_exc()
+            return jsonify({"error": str(e)}), 500
+
+    return app
+
+
+def main():
+    """Starts the transcription server."""
+    parser = argparse.ArgumentParser(
+        description="Serve drum transcriptions from a resident worker."
+    )
+    parser.add_argument("--host", type=str, default=config.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVER_PORT)
+    parser.add_argument(
+        "--max-jobs",
+        type=int,
+        default=config.SERVER_MAX_JOBS,
+        help="Transcriptions analysed concurrently.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=config.ARTIFACT_CACHE_DIR,
+        help="Directory caching the outputs of the analysis stages.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Recompute every stage without reading or writing the cache.",
+    )
+    parser.add_argument(
+        "--input-root",
+        type=str,
+        default=config.SERVER_INPUT_ROOT,
+        help="Directory requests may name files in (default: uploads only).",
+    )
+    args = parser.parse_args()
+
+    try:
+        worker = TranscriptionWorker(
+            cache_dir=None if args.no_cache else args.cache_dir,
+            max_jobs=args.max_jobs,
+        )
+    except RuntimeError as e:
+        print(f"Cannot start the transcription server: {e}")
+        return
+
+    print(f"Transcription server listening on http://{args.host}:{args.port}")
+    try:
+        # Threads let concurrent requests share classifier batches
+        create_app(worker, args.input_root).run(
+            host=args.host, port=args.port, threaded=True
+        )
+    finally:
+        worker.close()
+
+
+if __name__ == "__main__":
+    main()
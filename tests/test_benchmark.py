@@ -0,0 +1,57 @@
+import unittest
+import json
+import numpy as np
+from unittest import mock
+from app.benchmark import StageTimer, run_benchmark, synthetic_take
+
+
+class TestStageTimer(unittest.TestCase):
+    def test_records_stages(self):
+        timer = StageTimer()
+        with timer.stage('allocate'):
+            data = np.ones(4 * 2 ** 20)
+            data.sum()
+        with timer.stage('noop'):
+            pass
+        self.assertEqual(list(timer.stages), ['allocate', 'noop'])
+        for stage in timer.stages.values():
+            self.assertGreaterEqual(stage['wall_s'], 0.0)
+            self.assertGreater(stage['peak_rss_mb'], 0.0)
+
+    def test_records_failed_stage(self):
+        timer = StageTimer()
+        with self.assertRaises(RuntimeError):
+            with timer.stage('broken'):
+                raise RuntimeError("boom")
+        self.assertIn('broken', timer.stages)
+
+    def test_rss_unavailable(self):
+        timer = StageTimer()
+        with mock.patch('app.benchmark._current_rss', return_value=None):
+            with timer.stage('no_proc'):
+                pass
+        self.assertIsNone(timer.stages['no_proc']['peak_rss_mb'])
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_synthetic_take(self):
+        take = synthetic_take(1.0, sample_rate=8000)
+        self.assertEqual(take['drums'].shape, (8000,))
+        self.assertEqual(take['guitar'].shape, (8000,))
+        self.assertGreater(np.abs(take['drums']).max(), 0.0)
+
+    def test_run_benchmark(self):
+        report = run_benchmark('debug', durations=[0.5], batch_sizes=[1, 2])
+        self.assertEqual(len(report['pipeline']), 1)
+        pipeline = report['pipeline'][0]
+        self.assertEqual(list(pipeline['stages']), ['process_input', 'generate_music', 'save_output'])
+        self.assertGreater(pipeline['tokens_per_sec'], 0.0)
+        self.assertEqual([run['batch_size'] for run in report['batched_generation']], [1, 2])
+        for run in report['batched_generation']:
+            self.assertGreater(run['tokens_per_sec'], 0.0)
+        # Report must be machine-readable
+        self.assertEqual(json.loads(json.dumps(report)), report)
+
+
+if __name__ == '__main__':
+    unittest.main()
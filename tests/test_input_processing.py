@@ -1,17 +1,87 @@
+import asyncio
 import unittest
-from app.input_processing import process_input
+import numpy as np
+from app.input_processing import AudioInputProcessor, IterableSource, RingBuffer, process_input
 
 class TestInputProcessing(unittest.TestCase):
     def test_process_input(self):
-        drum_input = "test_drum"
+        sr = 44100
+        t = np.arange(sr) / sr
+        drum_input = np.zeros(sr, dtype=np.float32)
+        for start in range(0, sr, sr // 4):
+            drum_input[start:start + 2000] = np.sin(2 * np.pi * 60 * t[:2000]) * np.exp(-t[:2000] * 30)
+        guitar_input = (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
         piano_input = "test_piano"
-        guitar_input = "test_guitar"
-        result = process_input(drum_input, piano_input, guitar_input)
-        self.assertEqual(result, {
-            "drum": drum_input,
-            "piano": piano_input,
-            "guitar": guitar_input
-        })
+        result = process_input(drum_input, guitar_input, piano_input)
+        self.assertEqual(set(result), {"drums", "guitar", "piano"})
+        self.assertEqual(set(result["drums"]), {"kick", "snare", "hihat"})
+        self.assertEqual(set(result["guitar"]), {"pitches", "beats"})
+        self.assertEqual(result["piano"], piano_input)
+
+class TestDrumClassification(unittest.TestCase):
+    def setUp(self):
+        self.processor = AudioInputProcessor()
+        self.rng = np.random.RandomState(0)
+
+    def hit(self, component):
+        t = np.arange(int(0.15 * 44100)) / 44100
+        if component == 'kick':
+            sound = np.sin(2 * np.pi * 60 * t)
+        elif component == 'snare':
+            sound = 0.5 * np.sin(2 * np.pi * 190 * t) + 0.3 * self.rng.randn(len(t))
+        else:
+            sound = np.diff(self.rng.randn(len(t) + 3), n=3) / 4
+        return sound * np.exp(-t * 30)
+
+    def test_process_drums_classifies_components(self):
+        audio = np.zeros(44100 * 5)
+        expected = {'kick': [], 'snare': [], 'hihat': []}
+        for i in range(9):
+            component = ['kick', 'snare', 'hihat'][i % 3]
+            start = 0.25 + 0.5 * i
+            hit = self.hit(component)
+            audio[int(start * 44100):int(start * 44100) + len(hit)] += hit
+            expected[component].append(start)
+        result = self.processor.process_drums(audio)
+        for component, times in expected.items():
+            self.assertEqual(len(result[component]), len(times))
+            np.testing.assert_allclose(result[component], times, atol=0.03)
+
+    def test_classify_without_onsets(self):
+        power = np.ones((1025, 10))
+        self.assertEqual(len(self.processor.classify_drum_hits(power, np.array([]))), 0)
+
+
+class TestStreamingCapture(unittest.TestCase):
+    def setUp(self):
+        self.processor = AudioInputProcessor(sample_rate=8000, chunk_size=256)
+        self.audio = np.sin(np.arange(8000 * 2) * 0.01).astype(np.float32)
+
+    def test_ring_buffer_overrun_keeps_unread_chunks(self):
+        buffer = RingBuffer(chunk_size=4, capacity=2)
+        buffer.write(np.arange(10, dtype=np.float32))
+        self.assertEqual(buffer.overruns, 1)
+        np.testing.assert_array_equal(buffer.read(), [0, 1, 2, 3])
+        np.testing.assert_array_equal(buffer.read(), [4, 5, 6, 7])
+        self.assertIsNone(buffer.read())
+
+    def test_stream_from_array_source(self):
+        source = IterableSource.from_array(self.audio, 1000)
+        with self.processor.stream_recording(duration=1.5, source=source) as stream:
+            chunks = list(stream)
+        self.assertTrue(all(len(chunk) <= 256 for chunk in chunks))
+        np.testing.assert_allclose(np.concatenate(chunks), self.audio[:12000])
+
+    def test_stream_async_iteration(self):
+        source = IterableSource.from_array(self.audio, 256)
+
+        async def collect():
+            with self.processor.stream_recording(source=source) as stream:
+                return [chunk async for chunk in stream]
+
+        chunks = asyncio.run(collect())
+        np.testing.assert_allclose(np.concatenate(chunks), self.audio)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+import torch
+from audiocraft.models.lm import LMModel
+from audiocraft.modules.codebooks_patterns import DelayedPatternProvider
+from audiocraft.modules.conditioners import ConditionFuser, ConditioningProvider
+
+
+def build_lm(**kwargs):
+    torch.manual_seed(0)
+    fuser = ConditionFuser({'cross': [], 'prepend': [], 'sum': [], 'input_interpolate': []})
+    lm = LMModel(
+        DelayedPatternProvider(n_q=4), ConditioningProvider({}), fuser,
+        n_q=4, card=32, dim=16, num_heads=4, num_layers=2, custom=True, causal=True, **kwargs
+    )
+    return lm.eval()
+
+
+def streaming_logits(lm, sequence, chunks, kv_cache_steps=None):
+    lm.transformer.set_kv_cache(kv_cache_steps)
+    logits = []
+    try:
+        with torch.no_grad(), lm.streaming():
+            start = 0
+            for size in chunks:
+                logits.append(lm(sequence[..., start:start + size], conditions=[], condition_tensors={}))
+                start += size
+    finally:
+        lm.transformer.set_kv_cache(None)
+    return torch.cat(logits, dim=2)
+
+
+class TestPreallocatedKVCache(unittest.TestCase):
+    def setUp(self):
+        generator = torch.Generator().manual_seed(1)
+        self.sequence = torch.randint(0, 32, (2, 4, 24), generator=generator)
+        # A multi-step first call, like a prompt, then one step at a time.
+        self.chunks = [5] + [1] * 19
+
+    def assert_matches_concatenation(self, lm, chunks=None):
+        chunks = chunks or self.chunks
+        expected = streaming_logits(lm, self.sequence, chunks)
+        cached = streaming_logits(lm, self.sequence, chunks, kv_cache_steps=len(chunks) - 1)
+        self.assertEqual(cached.shape, expected.shape)
+        torch.testing.assert_close(cached, expected, rtol=0, atol=1e-5)
+
+    def test_full_context(self):
+        self.assert_matches_concatenation(build_lm())
+
+    def test_rope_offsets(self):
+        self.assert_matches_concatenation(build_lm(positional_embedding='rope'))
+
+    def test_ring_wraparound(self):
+        # The ring holds past_context + 1 steps and wraps several times over the sequence.
+        lm = build_lm(positional_embedding='rope', past_context=3)
+        self.assert_matches_concatenation(lm, [3] + [1] * 21)
+        lm.transformer.set_kv_cache(4)
+        with torch.no_grad(), lm.streaming():
+            lm(self.sequence[..., :5], conditions=[], condition_tensors={})
+            attention = lm.transformer.layers[0].self_attn
+            self.assertEqual(attention._streaming_state['cache_keys'].shape[1], 4)
+        lm.transformer.set_kv_cache(None)
+
+    def test_ring_first_step_longer_than_context(self):
+        # Concatenation loses the rope offset of keys trimmed in the first step, compare to a full pass instead.
+        lm = build_lm(positional_embedding='rope', past_context=3)
+        with torch.no_grad():
+            expected = lm(self.sequence, conditions=[], condition_tensors={})
+        cached = streaming_logits(lm, self.sequence, self.chunks, kv_cache_steps=len(self.chunks) - 1)
+        torch.testing.assert_close(cached, expected, rtol=0, atol=1e-5)
+
+    def test_cache_grows_past_reserved_steps(self):
+        lm = build_lm()
+        expected = streaming_logits(lm, self.sequence, self.chunks)
+        cached = streaming_logits(lm, self.sequence, self.chunks, kv_cache_steps=2)
+        torch.testing.assert_close(cached, expected, rtol=0, atol=1e-5)
+
+    def test_generate_resets_cache_on_error(self):
+        lm = build_lm()
+
+        def callback(step, total):
+            raise RuntimeError("cancelled")
+
+        with self.assertRaises(RuntimeError):
+            lm.generate(num_samples=1, max_gen_len=8, callback=callback)
+        attention = lm.transformer.layers[0].self_attn
+        self.assertIsNone(attention._kv_cache_steps)
+        self.assertEqual(attention._streaming_state, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import numpy as np
+import librosa
+from app.live_analysis import IncrementalGuitarAnalyzer, IncrementalOnsetAnalyzer
+
+
+class TestIncrementalOnsetAnalyzer(unittest.TestCase):
+    def setUp(self):
+        self.sample_rate = 22050
+        self.clicks = np.arange(0.5, 12, 0.5)
+        self.audio = librosa.clicks(times=self.clicks, sr=self.sample_rate, length=self.sample_rate * 12)
+
+    def analyze(self, chunk_size):
+        analyzer = IncrementalOnsetAnalyzer(sample_rate=self.sample_rate)
+        onsets = []
+        for start in range(0, len(self.audio), chunk_size):
+            onsets.extend(analyzer.process(self.audio[start:start + chunk_size]))
+        return analyzer, np.array(onsets)
+
+    def test_onsets_match_clicks(self):
+        analyzer, onsets = self.analyze(1024)
+        self.assertEqual(len(onsets), len(self.clicks))
+        np.testing.assert_allclose(onsets, self.clicks, atol=0.05)
+        self.assertEqual(list(analyzer.onset_times), list(onsets))
+
+    def test_chunk_size_does_not_change_result(self):
+        _, small = self.analyze(256)
+        _, large = self.analyze(5000)
+        np.testing.assert_allclose(small, large)
+        # Longer than the envelope history
+        _, whole = self.analyze(len(self.audio))
+        np.testing.assert_allclose(small, whole)
+
+    def test_running_tempo(self):
+        analyzer, _ = self.analyze(1024)
+        self.assertAlmostEqual(analyzer.tempo, 120.0, delta=5.0)
+
+    def test_reset(self):
+        analyzer, _ = self.analyze(1024)
+        analyzer.reset()
+        self.assertEqual(analyzer.n_frames, 0)
+        self.assertEqual(list(analyzer.onset_times), [])
+
+    def test_onset_history_is_bounded(self):
+        analyzer = IncrementalOnsetAnalyzer(sample_rate=self.sample_rate, max_onsets=5)
+        onsets = []
+        for start in range(0, len(self.audio), 1024):
+            onsets.extend(analyzer.process(self.audio[start:start + 1024]))
+        self.assertEqual(len(onsets), len(self.clicks))
+        self.assertEqual(list(analyzer.onset_times), onsets[-5:])
+
+
+class TestIncrementalGuitarAnalyzer(unittest.TestCase):
+    def setUp(self):
+        self.sample_rate = 22050
+        t = np.arange(self.sample_rate * 2) / self.sample_rate
+        self.audio = np.where(t < 1.0, np.sin(2 * np.pi * 220 * t), np.sin(2 * np.pi * 330 * t)).astype(np.float32)
+
+    def test_pitches_match_piptrack(self):
+        analyzer = IncrementalGuitarAnalyzer(sample_rate=self.sample_rate)
+        pitches = []
+        for start in range(0, len(self.audio), 1000):
+            analyzer.process(self.audio[start:start + 1000])
+            pitches.append(analyzer.frame_pitches)
+        pitches = np.concatenate(pitches)
+
+        expected, magnitudes = librosa.piptrack(y=self.audio, sr=self.sample_rate, fmin=150.0, fmax=4000.0)
+        expected = expected[magnitudes.argmax(axis=0), np.arange(expected.shape[1])]
+        # The last frames only exist once the padded end of the take is known
+        np.testing.assert_allclose(pitches, expected[:len(pitches)], rtol=1e-3)
+        self.assertAlmostEqual(analyzer.pitch, 330.0, delta=5.0)
+
+        analyzer.reset()
+        analyzer.process(self.audio)
+        np.testing.assert_allclose(analyzer.frame_pitches, pitches)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+import numpy as np
+from app.mixing import Mixer, resample
+
+
+class TestMixer(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.music = rng.randn(1, 1, 32000).astype(np.float32)
+        self.drums = rng.randn(1, 1, 8000).astype(np.float32)
+
+    def test_blockwise_mix_matches_whole_resampling(self):
+        mixer = Mixer(44100, block_size=1000)
+        mixer.add(self.music, 32000, gain=0.7).add(self.drums, 16000, gain=0.3)
+        expected = 0.7 * resample(self.music[0], 32000, 44100)
+        drums = 0.3 * resample(self.drums[0], 16000, 44100)
+        expected[:, :drums.shape[1]] += drums
+        np.testing.assert_allclose(mixer.mix(), expected, atol=1e-5)
+
+    def test_length_alignment(self):
+        mixer = Mixer(44100).add(self.drums, 16000)
+        self.assertEqual(mixer.length, 22050)
+        padded = mixer.mix(length=30000)
+        self.assertEqual(padded.shape, (1, 30000))
+        self.assertFalse(padded[:, 22050:].any())
+        self.assertEqual(mixer.mix(length=1000).shape, (1, 1000))
+
+    def test_blocks_cover_mix(self):
+        mixer = Mixer(44100, channels=2, block_size=4096).add(self.music, 32000)
+        blocks = [block.copy() for block in mixer.blocks()]
+        self.assertTrue(all(block.shape[1] <= 4096 for block in blocks))
+        np.testing.assert_allclose(np.concatenate(blocks, axis=1), mixer.mix())
+
+    def test_channel_mapping(self):
+        stereo = np.stack([np.ones(100), -np.ones(100)])
+        mono = Mixer(100).add(stereo, 100).mix()
+        np.testing.assert_allclose(mono, np.zeros((1, 100)))
+        spread = Mixer(100, channels=2).add(np.ones(100), 100, gain=0.5).mix()
+        np.testing.assert_allclose(spread, np.full((2, 100), 0.5))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import torch
+from app.model_registry import ModelKey, ModelRegistry
+
+
+class FakeModel:
+    def __init__(self, size):
+        self.lm = torch.nn.Linear(size, 1, bias=False)
+        self.compression_model = torch.nn.Identity()
+
+
+class TestModelRegistry(unittest.TestCase):
+    def setUp(self):
+        self.loads = []
+
+        def loader(name, device):
+            self.loads.append(name)
+            return FakeModel(int(name))
+
+        # Linear(n, 1) in float32 holds 4 * n bytes
+        self.registry = ModelRegistry(memory_budget_bytes=4 * 150, loaders={'musicgen': loader})
+
+    def test_model_loaded_once(self):
+        key = ModelKey('musicgen', '100')
+        with self.registry.lease(key) as first:
+            pass
+        with self.registry.lease(key) as second:
+            pass
+        self.assertIs(first, second)
+        self.assertEqual(self.loads, ['100'])
+
+    def test_lru_eviction_over_budget(self):
+        small, large = ModelKey('musicgen', '50'), ModelKey('musicgen', '100')
+        other = ModelKey('musicgen', '40')
+        with self.registry.lease(small):
+            pass
+        with self.registry.lease(large):
+            pass
+        self.assertIn(small, self.registry)
+        self.assertIn(large, self.registry)
+        with self.registry.lease(other):
+            pass
+        # The least recently used model is dropped first
+        self.assertNotIn(small, self.registry)
+        self.assertIn(large, self.registry)
+        self.assertLessEqual(self.registry.resident_bytes, 4 * 150)
+
+    def test_acquired_model_not_evicted(self):
+        held, other = ModelKey('musicgen', '100'), ModelKey('musicgen', '120')
+        self.registry.acquire(held)
+        with self.registry.lease(other):
+            pass
+        self.assertIn(held, self.registry)
+        self.assertNotIn(other, self.registry)
+        self.registry.release(held)
+        with self.assertRaises(KeyError):
+            self.registry.release(held)
+
+    def test_dtype_is_part_of_key(self):
+        key = ModelKey('musicgen', '10', dtype=torch.float16)
+        with self.registry.lease(key) as model:
+            self.assertEqual(model.lm.weight.dtype, torch.float16)
+        self.assertNotIn(ModelKey('musicgen', '10'), self.registry)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,15 +1,73 @@
 import unittest
-from app.music_generation import generate_music
+import shutil
+import tempfile
+from unittest import mock
+import numpy as np
+from app.model_registry import ModelRegistry
+from app.music_generation import MusicGenerator, generate_music
+from app.result_cache import ResultCache, set_result_cache
+
 
 class TestMusicGeneration(unittest.TestCase):
     def test_generate_music(self):
         processed_input = {
-            "drum": "test_drum",
             "piano": "test_piano",
-            "guitar": "test_guitar"
         }
-        result = generate_music(processed_input)
-        self.assertIn("Generated music based on", result)
+        result = generate_music(
+            processed_input, model_size='debug', duration=0.5, sample_rate=16000,
+            use_cache=False, audio_model_name='debug'
+        )
+        self.assertEqual(result.shape, (1, 8000))
+        self.assertLessEqual(np.abs(result).max(), 1.0)
+
+class TestAccompaniment(unittest.TestCase):
+    def setUp(self):
+        self.generator = MusicGenerator('debug', audio_model_name='debug', registry=ModelRegistry())
+
+    def tearDown(self):
+        self.generator.close()
+
+    def test_batched_stems_one_call_per_model(self):
+        music_model = self.generator.music_model
+        audio_model = self.generator.audio_model
+        with mock.patch.object(music_model, 'generate', wraps=music_model.generate) as music_gen, \
+                mock.patch.object(audio_model, 'generate', wraps=audio_model.generate) as audio_gen:
+            results = self.generator.generate_accompaniment_batch(
+                [{}, {'drums': {}}], ['rock', 'jazz'], duration=0.2, stems=['drums', 'bass', 'keys']
+            )
+        self.assertEqual(music_gen.call_count, 1)
+        self.assertEqual(len(music_gen.call_args[0][0]), 4)
+        self.assertEqual(audio_gen.call_count, 1)
+        self.assertEqual(audio_gen.call_args[0][0], ["Generate rock style drum pattern"])
+        self.assertEqual(set(results[0]), {'drums', 'bass', 'keys'})
+        self.assertEqual(set(results[1]), {'bass', 'keys'})
+        self.assertEqual(results[1]['bass'].shape[0], 1)
+        self.assertIsInstance(results[0]['drums'], np.ndarray)
+
+
+
+class TestCachedGeneration(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        set_result_cache(ResultCache(self.cache_dir))
+        self.processed_input = {
+            'drums': {'kick': np.array([0.5])},
+            'guitar': {'audio': 0.1 * np.sin(np.arange(22050, dtype=np.float32))},
+        }
+
+    def tearDown(self):
+        set_result_cache(None)
+        shutil.rmtree(self.cache_dir)
+
+    def test_seeded_request_served_from_cache(self):
+        first = generate_music(self.processed_input, 'debug', duration=0.5, seed=3)
+        with mock.patch('app.music_generation.MusicGenerator') as generator:
+            second = generate_music(self.processed_input, 'debug', duration=0.5, seed=3)
+        generator.assert_not_called()
+        np.testing.assert_array_equal(first, second)
+        uncached = generate_music(self.processed_input, 'debug', duration=0.5, seed=3, use_cache=False)
+        np.testing.assert_allclose(first, uncached, atol=1e-6)
+
 
 if __name__ == "__main__":
     unittest.main()
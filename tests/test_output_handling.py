@@ -1,16 +1,85 @@
 import unittest
 import os
-from app.output_handling import save_output
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import soundfile as sf
+from app.output_handling import AudioOutputHandler, save_output, write_atomic
 
 class TestOutputHandling(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.work_dir = tempfile.mkdtemp()
+        os.chdir(self.work_dir)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.work_dir)
+
     def test_save_output(self):
-        generated_music = "test_generated_music"
-        save_output(generated_music)
-        self.assertTrue(os.path.exists("output_music.txt"))
-        with open("output_music.txt", "r") as file:
-            content = file.read()
-        self.assertEqual(content, generated_music)
-        os.remove("output_music.txt")
+        generated_music = 0.5 * np.sin(np.arange(4410) * 0.05)
+        path = save_output(generated_music, filename="output_music.wav")
+        self.assertEqual(path, os.path.join("output", "output_music.wav"))
+        self.assertTrue(os.path.exists(path))
+        content, sample_rate = sf.read(path)
+        self.assertEqual(sample_rate, 44100)
+        self.assertEqual(len(content), len(generated_music))
+
+class TestAudioExport(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.handler = AudioOutputHandler(self.output_dir)
+        # [batch, channels, frames] as returned by generation models
+        self.audio = 0.5 * np.sin(np.arange(8000) * 0.05)[None, None].repeat(2, axis=1)
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def test_save_formats(self):
+        paths = self.handler.save_formats(self.audio, ["wav", "flac", "ogg", "mp3"], "take", 8000)
+        self.assertEqual(set(paths), {"wav", "flac", "ogg", "mp3"})
+        for format, path in paths.items():
+            self.assertEqual(path, os.path.join(self.output_dir, f"take.{format}"))
+            data, sample_rate = sf.read(path)
+            self.assertEqual(sample_rate, 8000)
+            self.assertEqual(data.shape[1], 2)
+        data, _ = sf.read(paths["flac"])
+        np.testing.assert_allclose(data.T, self.audio[0], atol=1e-4)
+
+    def test_concurrent_saves_do_not_clobber(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            paths = list(executor.map(lambda _: self.handler.save_mp3(self.audio, sample_rate=8000), range(8)))
+        self.assertEqual(len(set(paths)), 8)
+        self.assertEqual(sorted(os.listdir(self.output_dir)), sorted(os.path.basename(p) for p in paths))
+
+    def test_file_mode_follows_umask(self):
+        umask = os.umask(0o022)
+        os.umask(umask)
+        path = self.handler.save_mp3(self.audio, sample_rate=8000)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o666 & ~umask)
+
+    def test_file_mode_follows_umask_set_after_import(self):
+        umask = os.umask(0o027)
+        try:
+            path = self.handler.save_mp3(self.audio, sample_rate=8000)
+        finally:
+            os.umask(umask)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o640)
+
+    def test_overwrite_keeps_file_mode(self):
+        path = os.path.join(self.output_dir, "shared.bin")
+        write_atomic(path, b"first")
+        os.chmod(path, 0o640)
+        write_atomic(path, b"second")
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o640)
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b"second")
+
+    def test_unsupported_format(self):
+        with self.assertRaises(ValueError):
+            self.handler.save_formats(self.audio, ["aac"])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from app.result_cache import ResultCache, request_digest
+
+
+class TestRequestDigest(unittest.TestCase):
+    def setUp(self):
+        self.processed_input = {'guitar': {'audio': np.arange(10, dtype=np.float32), 'beats': np.array([1, 2])}}
+
+    def test_digest_is_stable(self):
+        reordered = {'guitar': {'beats': np.array([1, 2]), 'audio': np.arange(10, dtype=np.float32)}}
+        self.assertEqual(
+            request_digest(self.processed_input, model='debug', seed=1),
+            request_digest(reordered, seed=1, model='debug')
+        )
+
+    def test_digest_depends_on_content(self):
+        reference = request_digest(self.processed_input, model='debug', seed=1)
+        changed = {'guitar': {'audio': np.arange(10, dtype=np.float64), 'beats': np.array([1, 2])}}
+        self.assertNotEqual(reference, request_digest(changed, model='debug', seed=1))
+        self.assertNotEqual(reference, request_digest(self.processed_input, model='debug', seed=2))
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.audio = np.zeros((1, 1, 1000), dtype=np.float32)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_put_and_get(self):
+        cache = ResultCache(self.cache_dir)
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', self.audio, np.ones((1, 4, 5), dtype=np.int64), metadata={'prompt': 'rock'})
+        result = cache.get('a')
+        np.testing.assert_array_equal(result['audio'], self.audio)
+        self.assertEqual(result['tokens'].shape, (1, 4, 5))
+
+    def test_index_survives_restart(self):
+        ResultCache(self.cache_dir).put('a', self.audio)
+        cache = ResultCache(self.cache_dir)
+        self.assertIn('a', cache)
+        os.remove(os.path.join(self.cache_dir, 'a.npz'))
+        self.assertNotIn('a', ResultCache(self.cache_dir))
+
+    def test_lru_eviction(self):
+        cache = ResultCache(self.cache_dir)
+        cache.put('a', self.audio)
+        entry_size = cache.total_bytes
+        cache.max_bytes = 2 * entry_size
+        cache.put('b', self.audio)
+        cache.get('a')
+        cache.put('c', self.audio)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, 'b.npz')))
+
+    def test_hits_do_not_write_index(self):
+        cache = ResultCache(self.cache_dir)
+        cache.put('a', self.audio)
+        with mock.patch.object(cache, '_save_index') as save_index:
+            cache.get('a')
+        save_index.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
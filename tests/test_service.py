@@ -0,0 +1,89 @@
+import base64
+import time
+import unittest
+from unittest import mock
+import numpy as np
+from app.model_registry import ModelRegistry
+from app.service import GenerationService, QueueFullError, create_app
+
+
+def wait_for(job, timeout=60.0):
+    deadline = time.time() + timeout
+    while job.status in ('queued', 'running') and time.time() < deadline:
+        time.sleep(0.01)
+    return job
+
+
+class TestGenerationService(unittest.TestCase):
+    def setUp(self):
+        self.service = GenerationService('debug', max_queue_size=4, max_batch_size=3, registry=ModelRegistry())
+
+    def tearDown(self):
+        self.service.stop()
+
+    def test_compatible_jobs_are_batched(self):
+        jobs = [self.service.submit(f"prompt {i}", duration=0.2) for i in range(3)]
+        other = self.service.submit("other", duration=0.4)
+        with mock.patch.object(self.service, '_generate', wraps=self.service._generate) as generate:
+            self.service.start()
+            for job in jobs + [other]:
+                wait_for(job)
+        self.assertEqual([len(call[0][0]) for call in generate.call_args_list], [3, 1])
+        self.assertTrue(all(job.status == 'done' for job in jobs + [other]))
+        self.assertEqual(jobs[0].result.shape[-1], int(0.2 * 32000))
+        self.assertEqual(other.result.shape[-1], int(0.4 * 32000))
+
+    def test_backpressure(self):
+        for i in range(4):
+            self.service.submit(f"prompt {i}")
+        with self.assertRaises(QueueFullError):
+            self.service.submit("one too many")
+
+    def test_failed_job(self):
+        self.service.start()
+        job = wait_for(self.service.submit("melody", melody=np.zeros(1000), melody_sample_rate=32000, duration=0.2))
+        self.assertEqual(job.status, 'failed')
+        self.assertIn("melody conditioning", job.error)
+
+
+class TestServiceApi(unittest.TestCase):
+    def setUp(self):
+        self.service = GenerationService('debug', max_queue_size=1, registry=ModelRegistry()).start()
+        self.client = create_app(self.service).test_client()
+
+    def tearDown(self):
+        self.service.stop()
+
+    def test_submit_poll_download(self):
+        response = self.client.post('/jobs', json={'prompt': 'rock', 'duration': 0.2})
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()['job_id']
+        wait_for(self.service.get_job(job_id))
+        self.assertEqual(self.client.get(f'/jobs/{job_id}').get_json()['status'], 'done')
+        audio = self.client.get(f'/jobs/{job_id}/audio')
+        self.assertEqual(audio.mimetype, 'audio/wav')
+        self.assertEqual(audio.data[:4], b'RIFF')
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.post('/jobs', json={}).status_code, 400)
+        self.assertEqual(self.client.post('/jobs', json={'prompt': 'a', 'seed': 1}).status_code, 400)
+        self.assertEqual(self.client.get('/jobs/unknown').status_code, 404)
+
+    def test_duration_limit(self):
+        for duration in (self.service.max_duration + 1, 0, -1, float('nan'), 'long'):
+            response = self.client.post('/jobs', json={'prompt': 'rock', 'duration': duration})
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.service.queue_size, 0)
+
+    def test_malformed_input(self):
+        self.assertEqual(self.client.post('/jobs', data='not json').status_code, 400)
+        self.assertEqual(self.client.post('/jobs', json=['rock']).status_code, 400)
+        bad_base64 = self.client.post('/jobs', json={'prompt': 'rock', 'melody': 'not base64!'})
+        self.assertEqual(bad_base64.status_code, 400)
+        self.assertIn('melody', bad_base64.get_json()['error'])
+        not_audio = base64.b64encode(b'not audio').decode()
+        self.assertEqual(self.client.post('/jobs', json={'prompt': 'rock', 'melody': not_audio}).status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()